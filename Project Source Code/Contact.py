@@ -7,10 +7,16 @@ The class uses slots for attribute restriction, initializes instances
 with provided information, and defines a string representation.
 '''
 
+# Names of the contact fields, in the order they are stored in the contacts file
+FIELDS = ("first_name", "last_name", "address", "mobile_number", "secondary_number", "email_address", "picture_path")
+
+# Fields which are matched when filtering contacts
+SEARCH_FIELDS = FIELDS[:6]
+
 # Class representing a contact with specific attributes - P2785659 & P2724555
 class Contact:
     # Define slots to restrict attribute creation to these specific attributes - P2785659 & P2724555
-    __slots__ = ("first_name", "last_name", "address", "mobile_number", "secondary_number", "email_address", "picture_path")
+    __slots__ = FIELDS
 
     # Initialise a Contact instance with provided information - P2785659 & P2724555
     def __init__(self, first_name, last_name, address, mobile_number, secondary_number, email_address, picture_path=""):
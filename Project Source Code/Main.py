@@ -5,11 +5,36 @@ This code initializes a Tkinter GUI application for an address book,
 created by authors with the provided IDs, and runs the main event loop.
 '''
 
+import argparse
+import logging
+import sys
 import tkinter as tk
+import instrumentation
 from address_book_app import AddressBookApp
 
 # Main block to run the application
 if __name__ == "__main__":
+    if getattr(sys, 'frozen', False):
+        # Bulk jobs start worker processes, which a compiled executable has to hand off here
+        import multiprocessing
+        multiprocessing.freeze_support()
+
+    # Optional contacts file: contacts.txt by default, or a columnar .abk file which is memory-mapped
+    parser = argparse.ArgumentParser(description="Address Book App")
+    parser.add_argument("contacts_file", nargs="?", default="contacts.txt", help="contacts file to open (.txt or .abk)")
+    # Optional instrumentation: timings of the main operations, optionally under cProfile or tracemalloc, written on exit
+    parser.add_argument("--profile", nargs="?", const="timers", choices=("timers",) + instrumentation.PROFILERS, help="record operation timings for this session")
+    parser.add_argument("--profile-output", default=instrumentation.DEFAULT_OUTPUT, help="file the timings are written to on exit")
+    # Optional sync server sharing changes with other copies of the address book, e.g. http://127.0.0.1:8765
+    parser.add_argument("--sync", metavar="URL", help="sync contacts in the background through this sync server")
+    # Optional compact layout keeping the contacts in columns of arrays rather than one object each, for large books
+    parser.add_argument("--compact", action="store_true", help="keep contacts in a compact table, using less memory")
+    args = parser.parse_args()
+    if args.profile:
+        instrumentation.enable(None if args.profile == "timers" else args.profile, args.profile_output)
+        # Show where the timings were written when the app closes
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     root = tk.Tk()
-    app = AddressBookApp(root)
+    app = AddressBookApp(root, args.contacts_file, sync_url=args.sync, compact=args.compact)
     root.mainloop()
\ No newline at end of file
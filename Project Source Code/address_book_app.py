@@ -12,32 +12,95 @@ annotated as P2785659, P2724555, P2796362, P2836714, and P2839572.
 
 import os
 import sys
+import time
 import tkinter as tk
-from tkinter import PhotoImage, messagebox, simpledialog, filedialog
-from PIL import Image, ImageTk
+from contextlib import nullcontext
+from tkinter import PhotoImage, messagebox
+from background import BackgroundWorker
 from Contact import Contact
-from contact_entry_dialog import ContactEntryDialog
+from contact_journal import ContactJournal
+from contact_store import ContactStore, FIELDS, SEARCH_FIELDS
+from facet_index import FACETS
+import instrumentation
+from async_query import PagedResults
+from live_filter import LiveFilter
+from sqlite_store import SqliteContactStore, is_sqlite
+from thumbnail_cache import ThumbnailCache
+from undo_history import UndoHistory
+from virtual_listbox import VirtualListbox
+
+# Most results shown for a fuzzy filter
+FUZZY_RESULTS = 100
+
+# Commands kept for Undo
+UNDO_DEPTH = 100
+
+# Problems listed after a bulk job; the rest are only counted
+BULK_PROBLEMS_SHOWN = 10
+
+# Milliseconds between syncs with the sync server
+SYNC_INTERVAL = 5000
+
+# Contacts loaded at a time on start-up; the list is redrawn after each chunk, so the first contacts appear straight away
+LOAD_CHUNK_SIZE = 5000
+
+# Modules only needed by some buttons (the contact dialog, file dialogs, import/export and duplicate merging) are
+# imported when first used rather than here, so that the window opens sooner; PIL is likewise only loaded by the
+# thumbnail cache when the first picture is shown
 
 # Class representing the Address Book application 
 class AddressBookApp:
     # Constructor to initialise the application with the root window - P2785659 and P2796362
-    def __init__(self, root):
+    def __init__(self, root, contacts_file="contacts.txt", sync_url=None, compact=False):
         self.root = root
         self.root.title("Address Book App")
-        self.contacts = []
-        self.load_contacts()  # Load contacts on startup - P2796362
+        self.contacts_file = contacts_file  # contacts.txt, a memory-mapped columnar .abk file or a SQLite .db file
+        self.sync_url = sync_url  # Address of a sync server sharing changes with other copies of the address book, if any
+        self.sync_client = None
+        self._sync_id = None
+        if is_sqlite(contacts_file):
+            # SQLite backend: contacts stay in the database, which saves every change itself
+            self.store = SqliteContactStore(contacts_file)
+            self.journal = None
+        else:
+            # GUI-free engine holding all contact state; compact keeps the contacts in a table of arrays, for large books
+            self.store = ContactStore(compact=compact)
+            self.journal = ContactJournal(self.store, contacts_file)  # Append-only log of every change, compacted in the background
+        # Cache of scaled contact pictures, kept in memory and in a .thumbnails folder beside the contacts file
+        self.thumbnails = ThumbnailCache(os.path.join(os.path.dirname(os.path.abspath(contacts_file)), ".thumbnails"))
+        self.workers = BackgroundWorker(self.root)  # Thread pool for picture decoding and file I/O, so the window stays responsive
         self.create_contact_management_ui()
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.newly_added_contact = None  # Variable to store the most recently added contact
+        self.history = None  # Undo/redo history, started once the contacts have loaded so that loading is not undoable
 
-        # Update the contacts listbox after loading contacts - P2796362
-        self.update_contacts_listbox()
+        # Load contacts in the background once the window has been drawn; they stream into the contacts listbox - P2796362
+        self.root.after_idle(self.load_contacts)
 
     # Method to handle the closing of the application - P2785659
     def on_close(self):
-        self.save_contacts()
+        self.save_contacts(on_done=self.exit_application)
+
+    # Method to wait for background jobs, close the store and destroy the main window
+    def exit_application(self):
+        if self._sync_id is not None:
+            self.root.after_cancel(self._sync_id)
+            self._sync_id = None
+        self.workers.shutdown()
+        self.close_store()
+        # Write the timings of this session if instrumentation is on; dump logs where the report was written
+        instrumentation.dump()
         self.root.destroy()
 
+    # Method to stop the journal, or close the database, before the application exits
+    def close_store(self):
+        if self.sync_client is not None:
+            self.sync_client.close()  # Changes not yet sent are kept and sent next time
+        if self.journal is not None:
+            self.journal.close()
+        else:
+            self.store.close()
+
     # Method to create the UI elements for contact management - P2785659, P2724555 & P2796362
     def create_contact_management_ui(self):
         # Logo Image - P2796362
@@ -45,8 +108,8 @@ class AddressBookApp:
             # Running as compiled executable
             logo_path = os.path.join(sys._MEIPASS, "logo.png")
         else:
-            # Running as script
-            logo_path = "C:/IMAT1704-Labs/Assignment - Coursework - Address Book Application/Source Code/Address Book Application/logo.png"
+            # Running as script: the logo sits beside this file
+            logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.png")
 
         logo_image = PhotoImage(file=logo_path)
         
@@ -81,6 +144,32 @@ class AddressBookApp:
         shutdown_button = tk.Button(button_frame, text="Shutdown", command=self.shutdown_application, bg="#795548", fg="white", width=15)
         shutdown_button.grid(row=2, column=1, pady=5, padx=5, sticky="w")
 
+        # Buttons to import and export contacts as CSV or vCard files
+        import_button = tk.Button(button_frame, text="Import Contacts", command=self.import_contacts, bg="#3F51B5", fg="white", width=15)
+        import_button.grid(row=3, column=0, pady=5, padx=5, sticky="w")
+
+        export_button = tk.Button(button_frame, text="Export Contacts", command=self.export_contacts, bg="#9C27B0", fg="white", width=15)
+        export_button.grid(row=3, column=1, pady=5, padx=5, sticky="w")
+
+        # Button to find and merge duplicate contacts
+        merge_button = tk.Button(button_frame, text="Merge Duplicates", command=self.merge_duplicate_contacts, bg="#00BCD4", fg="white", width=15)
+        merge_button.grid(row=4, column=0, pady=5, padx=5, sticky="w")
+
+        # Button to run bulk jobs (checking, tidying, thumbnails) over every contact
+        bulk_button = tk.Button(button_frame, text="Bulk Jobs", command=self.bulk_jobs, bg="#8BC34A", fg="white", width=15)
+        bulk_button.grid(row=4, column=1, pady=5, padx=5, sticky="w")
+
+        # Buttons to undo and redo the last changes, also bound to Ctrl+Z and Ctrl+Y
+        undo_button = tk.Button(button_frame, text="Undo", command=self.undo_last_change, bg="#9E9E9E", fg="white", width=15)
+        undo_button.grid(row=5, column=0, pady=5, padx=5, sticky="w")
+
+        redo_button = tk.Button(button_frame, text="Redo", command=self.redo_last_change, bg="#9E9E9E", fg="white", width=15)
+        redo_button.grid(row=5, column=1, pady=5, padx=5, sticky="w")
+
+        self.root.bind("<Control-z>", lambda event: self.undo_last_change())
+        self.root.bind("<Control-y>", lambda event: self.redo_last_change())
+        self.root.bind("<Control-Shift-Z>", lambda event: self.redo_last_change())
+
         # Create a frame to hold the buttons (Sort Contacts and Filter Contacts) - P2785659
         button_frame = tk.Frame(self.root)
         button_frame.pack(side="bottom", fill="both", expand=True)
@@ -93,16 +182,25 @@ class AddressBookApp:
         filter_button = tk.Button(button_frame, text="Filter Contacts", command=self.filter_contacts, bg="#009688", fg="white", width=15)
         filter_button.pack(side="left", padx=(0, 10), pady=5)
 
-        # Listbox to display the contacts - P2785659
-        self.contacts_listbox = tk.Listbox(self.root, width=25, height=20)
-        self.contacts_listbox.pack(side="left", padx=(10, 0))
-
-        # Create a Scrollbar - P2785659
-        scrollbar = tk.Scrollbar(self.root, orient="vertical", command=self.contacts_listbox.yview)
-        scrollbar.pack(side="left", fill="y", padx=(0, 10))
-
-        # Attach the Scrollbar to the Listbox - P2785659
-        self.contacts_listbox.config(yscrollcommand=scrollbar.set)
+        # Frame holding the search box above the contacts list
+        list_frame = tk.Frame(self.root)
+        list_frame.pack(side="left", fill="y", padx=10)
+
+        # Search box filtering the contacts list as the user types
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(list_frame, textvariable=search_var, width=25)
+        search_entry.pack(side="top", fill="x", pady=(0, 5))
+        self.search_status = tk.Label(list_frame, text="Type to search contacts", anchor="w")
+        self.search_status.pack(side="top", fill="x")
+        if self.sync_url:
+            self.sync_status = tk.Label(list_frame, text="Not synced yet", anchor="w")
+            self.sync_status.pack(side="top", fill="x")
+        self.live_filter = LiveFilter(self.root, self.store, self.show_search_results, workers=self.workers)
+        search_var.trace_add("write", lambda *args: self.live_filter.set_text(search_var.get()))
+
+        # Virtual listbox with its own scrollbar, showing only the visible contacts (or search results) from the store - P2785659
+        self.contacts_listbox = VirtualListbox(list_frame, self.displayed_count, lambda start, stop: self.contact_names(self.displayed_ids(start, stop)), width=25, height=20)
+        self.contacts_listbox.pack(side="top", fill="y", expand=True)
 
     # Method to add a new contact - P2785659
     def add_contact(self):
@@ -113,16 +211,36 @@ class AddressBookApp:
             messagebox.showwarning("Warning", "Please enter contact information before adding a new contact.")
             return None
 
+        # Warn if the phone number or email address already belongs to another contact
+        owners = self.find_owners(contact_info)
+        if owners:
+            names = ", ".join(self.contact_names(owners[:3]))
+            if not messagebox.askyesno("Possible Duplicate", f"{names} already has this phone number or email address. Add this contact anyway?"):
+                return None
+
         new_contact = Contact(*contact_info)
-        self.contacts.append(new_contact)
-        self.contacts = sorted(self.contacts, key=lambda x: x.first_name.lower())  # Sort contacts by first name - P2796362
-        self.update_contacts_listbox()
+        with instrumentation.measure("add"):
+            contact_id = self.store.add(new_contact)  # The store keeps contacts sorted by first name - P2796362
+            if self.live_filter.active:
+                self.live_filter.refresh()  # The new contact is only listed if it matches the search
+            else:
+                self.contacts_listbox.insert_row(self.store.position(contact_id))
         messagebox.showinfo("Success", "Thank you! The new contact has been added successfully.")
         return new_contact
 
+    # Method to return the ids of contacts already having one of the phone numbers or the email address in contact_info
+    def find_owners(self, contact_info):
+        values = dict(zip(FIELDS, contact_info))
+        owners = []
+        for contact_id in self.store.find_by_phone(values["mobile_number"]) + self.store.find_by_phone(values["secondary_number"]) + self.store.find_by_email(values["email_address"]):
+            if contact_id not in owners:
+                owners.append(contact_id)
+        return owners
+
     # Method to get contact information through a dialog - P2785659
     def get_contact_info(self, initial_contact=None):
-        dialog = ContactEntryDialog(self.root, "Add Contact", initial_contact=initial_contact)
+        from contact_entry_dialog import ContactEntryDialog
+        dialog = ContactEntryDialog(self.root, "Add Contact", initial_contact=initial_contact, thumbnail_cache=self.thumbnails, workers=self.workers)
         if not dialog.result:
             return None
 
@@ -132,7 +250,7 @@ class AddressBookApp:
     def view_contacts(self):
         selected_index = self.contacts_listbox.curselection()
         if selected_index:
-            contact_to_view = self.contacts[selected_index[0]]
+            contact_to_view = self.store.get(self.displayed_id(selected_index[0]))
             self.display_contact_details(contact_to_view, view_mode=True)
         else:
             # If no contact is selected, show a message - P2785659
@@ -146,21 +264,22 @@ class AddressBookApp:
             messagebox.showinfo("No Contact Selected", "Please select a contact from the list to edit.")
             return
 
-        contact_to_edit = self.contacts[selected_index[0]]
+        contact_id = self.displayed_id(selected_index[0])
+        contact_to_edit = self.store.get(contact_id)
 
         # Use the ContactEntryDialog for editing - P2785659
-        dialog = ContactEntryDialog(self.root, "Edit Contact", initial_contact=contact_to_edit)
+        from contact_entry_dialog import ContactEntryDialog
+        dialog = ContactEntryDialog(self.root, "Edit Contact", initial_contact=contact_to_edit, thumbnail_cache=self.thumbnails, workers=self.workers)
         updated_contact_info = dialog.result  # Capture the result before destroying the dialog - P2785659
         if updated_contact_info:
             # Update the contact information with the edited details - P2785659
-            contact_to_edit.first_name = updated_contact_info[0]
-            contact_to_edit.last_name = updated_contact_info[1]
-            contact_to_edit.address = updated_contact_info[2]
-            contact_to_edit.mobile_number = updated_contact_info[3]
-            contact_to_edit.secondary_number = updated_contact_info[4]
-            contact_to_edit.email_address = updated_contact_info[5]
-            contact_to_edit.picture_path = updated_contact_info[6]  
-            self.update_contacts_listbox()
+            with instrumentation.measure("edit"):
+                old_position = self.store.position(contact_id)
+                self.store.update(contact_id, updated_contact_info)
+                if self.live_filter.active:
+                    self.live_filter.refresh()  # The edited contact may no longer match the search, or may now match it
+                else:
+                    self.contacts_listbox.move_row(old_position, self.store.position(contact_id))
 
             # Show confirmation message - P2785659
             self.show_confirmation(self.root, contact_to_edit, edit_mode=True, dialog=dialog)
@@ -177,70 +296,466 @@ class AddressBookApp:
         if selected_index:
             confirmation = messagebox.askyesno("Delete Contact", "Are you sure you want to delete this contact?")
             if confirmation:
-                del self.contacts[selected_index[0]]
-                self.update_contacts_listbox()
+                contact_id = self.displayed_id(selected_index[0])
+                with instrumentation.measure("delete"):
+                    self.store.delete(contact_id)
+                    if self.live_filter.active:
+                        self.live_filter.results.remove(contact_id)
+                    self.contacts_listbox.delete_row(selected_index[0])
                 messagebox.showinfo("Success", "Contact has been removed successfully.")
 
     # Method to erase all contact entries - P2785659
     def erase_all_entries(self):
         confirmation = messagebox.askyesno("Confirmation", "Are you sure you want to erase all entries?")
         if confirmation:
-            self.contacts = []
+            self.store.clear()
             self.update_contacts_listbox()
             messagebox.showinfo("Success", "All entries erased.")
 
+    # Method to undo the last change to the contacts
+    def undo_last_change(self):
+        try:
+            label = self.history.undo() if self.history is not None else None
+        except KeyError:
+            # A contact the command changes was deleted since, e.g. by a sync
+            messagebox.showerror("Error", f"Cannot undo {self.history.undo_label()}: a contact it changes no longer exists.")
+            return
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred while undoing {self.history.undo_label()}: {str(e)}")
+            return
+        if label is None:
+            messagebox.showinfo("Undo", "There is nothing to undo.")
+            return
+        self.update_contacts_listbox()
+        self.search_status.config(text=f"Undid {label}")
+
+    # Method to redo the last undone change to the contacts
+    def redo_last_change(self):
+        try:
+            label = self.history.redo() if self.history is not None else None
+        except KeyError:
+            # A contact the command changes was deleted since, e.g. by a sync
+            messagebox.showerror("Error", f"Cannot redo {self.history.redo_label()}: a contact it changes no longer exists.")
+            return
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred while redoing {self.history.redo_label()}: {str(e)}")
+            return
+        if label is None:
+            messagebox.showinfo("Redo", "There is nothing to redo.")
+            return
+        self.update_contacts_listbox()
+        self.search_status.config(text=f"Redid {label}")
+
     # Method to shut down the application - P2785659
     def shutdown_application(self):
         confirmation = messagebox.askokcancel("Shutdown Application", "Are you sure you want to close the application?")
         if confirmation:
-            self.save_contacts()
-            self.root.destroy()
+            self.save_contacts(on_done=self.exit_application)
 
-    # Method to update the contacts listbox with current contact information - P2785659
+    # Method to update the contacts listbox with current contact information, searching again if a search is shown - P2785659
     def update_contacts_listbox(self):
-        self.contacts_listbox.delete(0, tk.END)
-        for contact in self.contacts:
-            self.contacts_listbox.insert(tk.END, str(contact))
-
-    # Method to save contacts to a file - P2836714 
-    def save_contacts(self, file_path="contacts.txt"):
-        try:
-            with open(file_path, "w") as file:
-                for contact in self.contacts:
-                    file.write(f"{contact.first_name},{contact.last_name},{contact.address},{contact.mobile_number},{contact.secondary_number},{contact.email_address},{contact.picture_path}\n")
+        if self.live_filter.active:
+            self.live_filter.refresh()
+        else:
+            self.contacts_listbox.refresh()
+
+    # Method to show the results of the search box; ids is None when the search box is empty
+    def show_search_results(self, ids, done):
+        if ids is None:
+            self.search_status.config(text="Type to search contacts")
+        elif done:
+            self.search_status.config(text=f"{len(ids)} matching contacts")
+        else:
+            self.search_status.config(text=f"Searching... {len(ids)} found")
+        self.contacts_listbox.refresh()
+
+    # Method to return how many contacts the main list shows
+    def displayed_count(self):
+        if self.live_filter.active:
+            return len(self.live_filter.results)
+        return len(self.store)
+
+    # Method to return the ids of the contacts shown in the main list between two positions
+    def displayed_ids(self, start, stop):
+        if self.live_filter.active:
+            return self.live_filter.results[start:stop]
+        return self.store.ids(start, stop)
+
+    # Method to return the id of the contact shown at a position of the main list
+    def displayed_id(self, position):
+        if self.live_filter.active:
+            return self.live_filter.results[position]
+        return self.store.id_at(position)
+
+    # Method to return the listbox text of each contact id
+    def contact_names(self, contact_ids):
+        return [self.store.name(contact_id) for contact_id in contact_ids]
+
+    # Method to save contacts to a file in the background, calling on_done once saving has finished or failed - P2836714 
+    def save_contacts(self, file_path=None, on_done=None):
+        @instrumentation.timed("save")
+        def save():
+            if self.journal is not None and (file_path is None or file_path == self.contacts_file):
+                # Changes are already in the journal, so saving only has to fsync the last batch
+                self.journal.flush()
+            elif file_path is not None:
+                self.store.save(file_path)
+
+        def saved(result):
+            progress_window.destroy()
             messagebox.showinfo("Success", "Contacts saved successfully.")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred while saving contacts: {str(e)}")
+            if on_done:
+                on_done()
 
-    # Method to load contacts from a file - P2839572
-    def load_contacts(self, file_path="contacts.txt"):
-        try:
-            if os.path.exists(file_path):
-                with open(file_path, "r") as file:
-                    for line in file:
-                        data = line.strip().split(",")
-                        new_contact = Contact(*data)
-                        self.contacts.append(new_contact)
-        except Exception as e:
+        def failed(e):
+            progress_window.destroy()
+            messagebox.showerror("Error", f"An error occurred while saving contacts: {str(e)}")
+            if on_done:
+                on_done()
+
+        progress_window, progress = self.show_progress("Saving Contacts")
+        self.workers.submit(save, on_done=saved, on_error=failed)
+
+    # Method to load contacts from a file in the background, updating the contacts listbox once they are loaded - P2839572
+    def load_contacts(self, file_path=None):
+        @instrumentation.timed("load")
+        def load(progress):
+            if self.journal is not None and (file_path is None or file_path == self.contacts_file):
+                # Load the contacts file and replay any changes journaled since it was last compacted
+                self.journal.open(chunk_size=LOAD_CHUNK_SIZE, progress=progress)
+            elif file_path is not None:
+                self.store.load(file_path, chunk_size=LOAD_CHUNK_SIZE, progress=progress)
+
+        # Show each chunk of contacts as soon as it has been added
+        def loading(rows, bytes_done, total_bytes):
+            progress(rows, bytes_done, total_bytes)
+            self.contacts_listbox.refresh()
+
+        def loaded(result):
+            progress_window.destroy()
+            instrumentation.count("contacts_loaded", len(self.store))
+            self.start_history()
+            self.update_contacts_listbox()
+            # Now the contacts are shown, get the filter's index ready so the first search does not wait for it
+            self.workers.submit(self.store.build_search_index)
+            self.start_sync()
+
+        def failed(e):
+            progress_window.destroy()
+            if self.journal is not None and (file_path is None or file_path == self.contacts_file):
+                # Only part of the book was read and the journal is not recording, so carrying on would lose every edit
+                # and could overwrite the contacts file with what was read; close without saving instead
+                messagebox.showerror("Error", f"An error occurred while loading contacts: {str(e)}\n\n"
+                                              "The address book will close without changing the contacts file.")
+                self.exit_application()
+                return
+            self.start_history()
+            self.update_contacts_listbox()
             messagebox.showerror("Error", f"An error occurred while loading contacts: {str(e)}")
 
+        progress_window, progress = self.show_progress("Loading Contacts")
+        self.workers.submit(load, on_done=loaded, on_error=failed, on_progress=loading)
+
+    # Method to start recording changes for Undo, forgetting any earlier history
+    def start_history(self):
+        if self.history is not None:
+            self.history.close()
+        self.history = UndoHistory(self.store, UNDO_DEPTH)
+
+    # Method to run a function changing the contacts so that a single Undo reverses all of its changes
+    def undoable(self, label, function, *args, **kwargs):
+        if self.history is None:
+            return function(*args, **kwargs)
+        with self.history.group(label):
+            return function(*args, **kwargs)
+
+    # Method to start syncing with the sync server in the background, if one was given; only called once the contacts
+    # have loaded in full, as contacts missing from the store would be taken as deleted
+    def start_sync(self):
+        if not self.sync_url or self.sync_client is not None:
+            return
+        from sync_service import SyncClient
+        self.sync_client = SyncClient(self.store, self.sync_url, self.contacts_file + ".sync")
+        self.workers.submit(self.sync_client.open, on_done=lambda waiting: self.sync_contacts(),
+                            on_error=lambda e: self.sync_status.config(text=f"Sync unavailable: {str(e)}"))
+
+    # Method to send changed contacts to the sync server and apply the changes from other copies in the background,
+    # then to do so again after SYNC_INTERVAL
+    def sync_contacts(self):
+        self._sync_id = None
+
+        def synced(received):
+            if received:
+                self.update_contacts_listbox()
+            self.sync_status.config(text=f"Synced at {time.strftime('%H:%M:%S')}" + (f", {received} contacts changed" if received else ""))
+            self._sync_id = self.root.after(SYNC_INTERVAL, self.sync_contacts)
+
+        # Changes from other copies are one step of the undo history
+        def sync_group():
+            return self.history.group("Sync Changes") if self.history is not None else nullcontext()
+
+        self.workers.submit(self.sync_client.sync, sync_group, on_done=synced, on_error=self.sync_failed)
+
+    # Method to show that a sync failed, e.g. because the server is not running, and try again later
+    def sync_failed(self, e):
+        self.sync_status.config(text=f"Sync failed, retrying: {str(e)}")
+        self._sync_id = self.root.after(SYNC_INTERVAL, self.sync_contacts)
+
+    # Method to import contacts from a CSV or vCard file, refreshing the list once at the end
+    def import_contacts(self):
+        from tkinter import filedialog
+        from contact_import_export import import_contacts
+        file_path = filedialog.askopenfilename(title="Import Contacts", filetypes=[("Contact files", "*.csv;*.vcf"), ("CSV files", "*.csv"), ("vCard files", "*.vcf")])
+        if not file_path:
+            return
+
+        def imported(count):
+            progress_window.destroy()
+            self.update_contacts_listbox()
+            messagebox.showinfo("Success", f"{count} contacts have been imported successfully.")
+
+        def failed(e):
+            progress_window.destroy()
+            self.update_contacts_listbox()  # Chunks read before the error have already been added
+            messagebox.showerror("Error", f"An error occurred while importing contacts: {str(e)}")
+
+        progress_window, progress = self.show_progress("Importing Contacts")
+        self.workers.submit(self.undoable, "Import Contacts", import_contacts, self.store, file_path, on_done=imported, on_error=failed, on_progress=progress)
+
+    # Method to export all contacts to a CSV or vCard file
+    def export_contacts(self):
+        from tkinter import filedialog
+        from contact_import_export import export_contacts
+        file_path = filedialog.asksaveasfilename(title="Export Contacts", defaultextension=".csv", filetypes=[("CSV files", "*.csv"), ("vCard files", "*.vcf")])
+        if not file_path:
+            return
+
+        def exported(count):
+            progress_window.destroy()
+            messagebox.showinfo("Success", f"{count} contacts have been exported successfully.")
+
+        def failed(e):
+            progress_window.destroy()
+            messagebox.showerror("Error", f"An error occurred while exporting contacts: {str(e)}")
+
+        progress_window, progress = self.show_progress("Exporting Contacts")
+        self.workers.submit(export_contacts, self.store, file_path, on_done=exported, on_error=failed, on_progress=progress)
+
+    # Method to find groups of duplicate contacts in the background and let the user choose which of them to merge
+    def merge_duplicate_contacts(self):
+        from dedup import find_duplicates
+
+        def found(clusters):
+            progress_window.destroy()
+            if not clusters:
+                messagebox.showinfo("Merge Duplicates", "No duplicate contacts were found.")
+                return
+            self.choose_duplicates(clusters)
+
+        def failed(e):
+            progress_window.destroy()
+            messagebox.showerror("Error", f"An error occurred while looking for duplicates: {str(e)}")
+
+        progress_window, progress = self.show_progress("Finding Duplicates")
+        self.workers.submit(find_duplicates, self.store, on_done=found, on_error=failed)
+
+    # Method to list the groups of possible duplicates found, so the user can tick the groups to merge and pick the
+    # contact each group is merged into before anything is deleted
+    def choose_duplicates(self, clusters):
+        from dedup import merge_duplicates
+
+        merge_window = tk.Toplevel(self.root)
+        merge_window.title("Merge Duplicates")
+        merge_window.grab_set()  # The contacts cannot be changed while the groups are being chosen
+
+        count = sum(len(cluster) for cluster in clusters)
+        merge_label = tk.Label(merge_window, text=f"Found {len(clusters)} groups of possible duplicates covering {count} contacts.\n"
+                                                  "Tick the groups to merge. Each is merged into the contact marked Keep, whose names are kept.")
+        merge_label.grid(row=0, column=0, columnspan=4, pady=10, padx=10)
+
+        ticked = set()  # Positions of the groups to merge
+        selected = None  # Position of the group whose contacts are listed
+
+        # Text of a group in the list, e.g. "[x] John Smith = Jon Smith"
+        def cluster_text(start, stop):
+            return [f"[{'x' if position in ticked else ' '}] " + " = ".join(self.contact_names(clusters[position]))
+                    for position in range(start, min(stop, len(clusters)))]
+
+        # Text of a contact in the group selected, with the details which make it look like a duplicate
+        def member_text(start, stop):
+            cluster = [] if selected is None else clusters[selected]
+            rows = []
+            for position in range(start, min(stop, len(cluster))):
+                contact = self.store.get(cluster[position])
+                details = ", ".join(value for value in (contact.mobile_number, contact.email_address, contact.address) if value)
+                rows.append(f"{'Keep: ' if position == 0 else ''}{contact} ({details})")
+            return rows
+
+        clusters_listbox = VirtualListbox(merge_window, lambda: len(clusters), cluster_text, width=60, height=15)
+        clusters_listbox.grid(row=1, column=0, columnspan=4, pady=5, padx=10)
+
+        members_listbox = VirtualListbox(merge_window, lambda: 0 if selected is None else len(clusters[selected]), member_text, width=60, height=5)
+        members_listbox.grid(row=2, column=0, columnspan=4, pady=5, padx=10)
+
+        # List the contacts of the group selected
+        def show_cluster(event=None):
+            nonlocal selected
+            position = clusters_listbox.curselection()
+            if position and position[0] < len(clusters):
+                selected = position[0]
+                members_listbox.selection_clear()
+                members_listbox.see(0)
+
+        # Tick or untick the group selected
+        def toggle(event=None):
+            if selected is not None:
+                ticked.symmetric_difference_update({selected})
+                clusters_listbox.update_row(selected)
+
+        def tick_all():
+            ticked.update(range(len(clusters)))
+            clusters_listbox.refresh()
+
+        # Merge the group selected into the contact selected in it, ticking the group
+        def keep_selected():
+            position = members_listbox.curselection()
+            if selected is None or not position or position[0] >= len(clusters[selected]):
+                messagebox.showinfo("Merge Duplicates", "Select the contact to keep first.")
+                return
+            cluster = clusters[selected]
+            cluster.insert(0, cluster.pop(position[0]))
+            ticked.add(selected)
+            clusters_listbox.update_row(selected)
+            members_listbox.selection_clear()
+            members_listbox.refresh()
+
+        def merge():
+            if not ticked:
+                messagebox.showinfo("Merge Duplicates", "Tick the groups of duplicates to merge first.")
+                return
+            merge_window.destroy()
+            removed = self.undoable("Merge Duplicates", merge_duplicates, self.store, [clusters[position] for position in sorted(ticked)])
+            self.update_contacts_listbox()
+            messagebox.showinfo("Success", f"{removed} duplicate contacts have been merged.")
+
+        clusters_listbox.bind("<<ListboxSelect>>", show_cluster, add="+")
+        clusters_listbox.bind("<Double-Button-1>", toggle)
+
+        toggle_button = tk.Button(merge_window, text="Tick / Untick", command=toggle, width=15)
+        toggle_button.grid(row=3, column=0, pady=10, padx=5)
+
+        tick_all_button = tk.Button(merge_window, text="Tick All", command=tick_all, width=15)
+        tick_all_button.grid(row=3, column=1, pady=10, padx=5)
+
+        keep_button = tk.Button(merge_window, text="Keep Selected", command=keep_selected, width=15)
+        keep_button.grid(row=3, column=2, pady=10, padx=5)
+
+        merge_button = tk.Button(merge_window, text="Merge Ticked", command=merge, bg="#00BCD4", fg="white", width=15)
+        merge_button.grid(row=3, column=3, pady=10, padx=5)
+
+        cancel_button = tk.Button(merge_window, text="Cancel", command=merge_window.destroy, width=10)
+        cancel_button.grid(row=4, column=0, columnspan=4, pady=5)
+
+    # Method to open a window offering the bulk jobs which run over every contact
+    def bulk_jobs(self):
+        bulk_window = tk.Toplevel(self.root)
+        bulk_window.title("Bulk Jobs")
+
+        bulk_label = tk.Label(bulk_window, text="Run a job over every contact:")
+        bulk_label.grid(row=0, column=0, pady=10, padx=10)
+
+        validate_button = tk.Button(bulk_window, text="Check Emails and Phone Numbers", width=30, command=lambda: self.run_bulk_job("validate", "Check Emails and Phone Numbers", bulk_window))
+        validate_button.grid(row=1, column=0, pady=5, padx=10)
+
+        address_button = tk.Button(bulk_window, text="Tidy Addresses", width=30, command=lambda: self.run_bulk_job("normalise_address", "Tidy Addresses", bulk_window))
+        address_button.grid(row=2, column=0, pady=5, padx=10)
+
+        thumbnail_button = tk.Button(bulk_window, text="Make Picture Thumbnails", width=30, command=lambda: self.run_bulk_job("thumbnails", "Make Picture Thumbnails", bulk_window))
+        thumbnail_button.grid(row=3, column=0, pady=5, padx=10)
+
+        back_button = tk.Button(bulk_window, text="Back", command=bulk_window.destroy, width=10)
+        back_button.grid(row=4, column=0, pady=10, padx=10)
+
+    # Method to run a bulk job across worker processes in the background; its changes are applied together at the end
+    # and can be undone in one step
+    def run_bulk_job(self, job, title, bulk_window):
+        from batch_operations import run_batch
+        bulk_window.destroy()
+
+        def finished(result):
+            progress_window.destroy()
+            self.update_contacts_listbox()
+            lines = [f"{result.processed} contacts processed."]
+            if result.updates:
+                lines.append(f"{result.applied} contacts updated.")
+            if result.conflicts:
+                lines.append(f"{len(result.conflicts)} contacts edited meanwhile were left unchanged.")
+            if result.problems:
+                lines.append(f"{len(result.problems)} problems found:")
+                lines += [f"{self.store.name(contact_id)}: {problem}" for contact_id, problem in result.problems[:BULK_PROBLEMS_SHOWN] if contact_id in self.store]
+                if len(result.problems) > BULK_PROBLEMS_SHOWN:
+                    lines.append("...")
+            messagebox.showinfo(title, "\n".join(lines))
+
+        def failed(e):
+            progress_window.destroy()
+            messagebox.showerror("Error", f"An error occurred while running the bulk job: {str(e)}")
+
+        progress_window, progress = self.show_progress(title)
+        self.workers.submit(self.undoable, title, run_batch, self.store, job, {"cache_dir": self.thumbnails.cache_dir}, on_done=finished, on_error=failed, on_progress=progress)
+
+    # Method to open a small progress window and return it with a progress(rows, bytes_done, total_bytes) callback;
+    # the window holds the input grab, so the contacts cannot be changed while a background job is using them
+    def show_progress(self, title):
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title(title)
+        progress_window.protocol("WM_DELETE_WINDOW", lambda: None)  # Closed by the job when it finishes
+        progress_label = tk.Label(progress_window, text="Working...", width=40)
+        progress_label.pack(padx=10, pady=10)
+        progress_window.grab_set()
+
+        def progress(rows, bytes_done, total_bytes):
+            if total_bytes:
+                progress_label.config(text=f"{rows} contacts ({100 * bytes_done // total_bytes}%)")
+            else:
+                progress_label.config(text=f"{rows} contacts")
+            progress_window.update_idletasks()
+
+        progress_window.update_idletasks()
+        return progress_window, progress
+
     # Method to display contact details with various modes (view, edit) - P2785659 & P2724555
     def display_contact_details(self, contact, view_mode=False, edit_mode=False, dialog=None, details_str=None):
         # Create a new window for displaying the picture and contact details - P2724555
         details_window = tk.Toplevel(self.root)
         details_window.title(f"{contact.first_name} {contact.last_name}'s Details")
 
+        picture_job = None
         if contact.picture_path:
-            # Display the picture if available - P2724555
-            picture = Image.open(contact.picture_path)
-            picture.thumbnail((150, 150))  # Adjust the size as needed
-            picture = ImageTk.PhotoImage(picture)
-
-            # Display the picture in a Label - P2724555 
-            picture_label = tk.Label(details_window, image=picture, text="Picture:")
-            picture_label.image = picture
+            # Display the picture in a Label, with a placeholder until its thumbnail is ready - P2724555 
+            picture_label = tk.Label(details_window, text="Loading picture...")
             picture_label.grid(row=0, column=0, padx=10, pady=5, columnspan=2)
 
+            def show_picture(picture):
+                picture_label.config(image=picture)
+                picture_label.image = picture
+
+            # Use the thumbnail in memory if there is one, otherwise decode it on a worker thread - P2724555
+            picture = self.thumbnails.cached(contact.picture_path)
+            if picture is not None:
+                show_picture(picture)
+            else:
+                picture_job = self.workers.submit(
+                    self.thumbnails.load, contact.picture_path,
+                    on_done=lambda image: show_picture(self.thumbnails.remember(contact.picture_path, image)),
+                    on_error=lambda e: picture_label.config(text="Picture not available"))
+
+        # Close the window, cancelling the picture decoding if it has not finished
+        def close_details():
+            if picture_job is not None:
+                picture_job.cancel()
+            details_window.destroy()
+
         # Display other contact details in the same window - P2785659
         labels = ["First Name", "Last Name", "Address", "Mobile Number", "Secondary Number", "Email Address"]
 
@@ -254,15 +769,15 @@ class AddressBookApp:
                 value_widget.grid(row=row, column=1, padx=10, pady=5, sticky="w")
 
         # Back Button - P2785659
-        back_button = tk.Button(details_window, text="Back", command=details_window.destroy, width=10)
+        back_button = tk.Button(details_window, text="Back", command=close_details, width=10)
         back_button.grid(row=row + 1, column=0, pady=10)
 
         # OK Button - P2785659
-        ok_button = tk.Button(details_window, text="OK", command=details_window.destroy, width=10)
+        ok_button = tk.Button(details_window, text="OK", command=close_details, width=10)
         ok_button.grid(row=row + 1, column=1, pady=10)
         
         # Destroy the details window when the user closes it - P2785659
-        details_window.protocol("WM_DELETE_WINDOW", details_window.destroy)
+        details_window.protocol("WM_DELETE_WINDOW", close_details)
 
     # Sorting Contacts - P2796362 & P2836714 
     def sort_contacts(self):
@@ -280,6 +795,11 @@ class AddressBookApp:
         sort_surname_button = tk.Button(sort_window, text="Last Name Alphabetically", command=lambda: self.sort_and_display("last_name", sort_window))
         sort_surname_button.grid(row=1, column=2, pady=5, padx=5)
 
+        # Buttons for grouped views, each group listed with its number of contacts
+        for column, facet in enumerate(FACETS):
+            group_button = tk.Button(sort_window, text=f"Group by {FACETS[facet][0]}", command=lambda facet=facet: self.group_and_display(facet, sort_window))
+            group_button.grid(row=2, column=column, pady=5, padx=5)
+
         # Back button for initial sorting options - P2836714
         back_button = tk.Button(sort_window, text="Back", command=sort_window.destroy, width=10)
         back_button.grid(row=3, column=1, pady=5, padx=5, sticky="e")
@@ -297,24 +817,32 @@ class AddressBookApp:
         sort_label = tk.Label(sort_option_window, text=f"Sorted by {option.replace('_', ' ').title()} Alphabetically")
         sort_label.grid(row=0, column=0, columnspan=3, pady=10)
 
-        # Sorting the contacts based on the selected option - P2836714
-        if option == "first_name":
-            sorted_contacts = sorted(self.contacts, key=lambda x: x.first_name.lower())
-        elif option == "last_name":
-            sorted_contacts = sorted(self.contacts, key=lambda x: x.last_name.lower())
-        else:
-            # Handle other cases if needed - P2836714
-            sorted_contacts = self.contacts
+        # Sorting the contacts based on the selected option, read page by page from its sorted index - P2836714
+        with instrumentation.measure("sort"):
+            if option in FIELDS:
+                sorted_index = self.store.add_sort_index(option)
+            else:
+                # Handle other cases if needed - P2836714
+                sorted_index = self.store.add_sort_index("first_name")
 
-        # Listbox to display the sorted contacts - P2796362
-        sorted_listbox = tk.Listbox(sort_option_window, width=25, height=20)
+        # Virtual listbox to display the sorted contacts - P2796362
+        sorted_listbox = VirtualListbox(sort_option_window, lambda: len(sorted_index), lambda start, stop: self.contact_names(sorted_index.ids(start, stop)), width=25, height=20)
         sorted_listbox.grid(row=1, column=0, columnspan=3, pady=10)
 
         # Bind double click event to show contact details - P2785659
-        sorted_listbox.bind("<Double-Button-1>", lambda event, window=sort_option_window: self.display_contact_details(sorted_contacts[sorted_listbox.curselection()[0]], view_mode=True))
+        sorted_listbox.bind("<Double-Button-1>", lambda event: self.view_contact_details(sorted_listbox, sorted_index.id_at))
+
+        # Entry to jump to the first contact whose name starts with the text typed, found in the sorted index
+        def jump(event=None):
+            text = jump_entry.get().strip()
+            if text and len(sorted_index):
+                sorted_listbox.jump_to(min(sorted_index.bounds(text)[0], len(sorted_index) - 1))
 
-        for contact in sorted_contacts:
-            sorted_listbox.insert(tk.END, str(contact))
+        jump_label = tk.Label(sort_option_window, text="Jump to:")
+        jump_label.grid(row=2, column=1, pady=5, sticky="w")
+        jump_entry = tk.Entry(sort_option_window, width=10)
+        jump_entry.grid(row=2, column=1, pady=5, sticky="e")
+        jump_entry.bind("<KeyRelease>", jump)
 
         # Back button to go back to the main sorting options - P2796362
         back_button = tk.Button(sort_option_window, text="Back", command=lambda: (sort_option_window.destroy(), self.sort_contacts()), width=10)
@@ -324,6 +852,67 @@ class AddressBookApp:
         ok_button = tk.Button(sort_option_window, text="OK", command=sort_option_window.destroy, width=10)
         ok_button.grid(row=2, column=0, pady=5, padx=5)
 
+    # Method to show the contacts grouped by a facet: each group with its number of contacts, and the contacts of the
+    # selected group; the groups and counts are read from the facet's index, which is kept up to date as contacts change
+    def group_and_display(self, facet, parent):
+        # Close the main sorting options page
+        parent.destroy()
+
+        title = FACETS[facet][0]
+        group_window = tk.Toplevel(self.root)
+        group_window.title(f"Grouped by {title}")
+
+        group_label = tk.Label(group_window, text=f"Grouped by {title}")
+        group_label.grid(row=0, column=0, columnspan=3, pady=10)
+
+        with instrumentation.measure("group"):
+            facet_index = self.store.facet_index(facet)
+        selected_group = None  # Group whose contacts are listed
+
+        # Text of a group in the list, e.g. "Leicester (1,204)"
+        def group_text(start, stop):
+            return [f"{group or f'(No {title.lower()})'} ({count:,})" for group, count in facet_index.groups(start, stop)]
+
+        groups_listbox = VirtualListbox(group_window, facet_index.group_count, group_text, width=25, height=20)
+        groups_listbox.grid(row=1, column=0, pady=10, padx=5)
+
+        members_listbox = VirtualListbox(group_window, lambda: 0 if selected_group is None else facet_index.count(selected_group),
+                                         lambda start, stop: self.contact_names(facet_index.ids(selected_group, start, stop)), width=25, height=20)
+        members_listbox.grid(row=1, column=1, columnspan=2, pady=10, padx=5)
+
+        # List the contacts of the group selected
+        def show_group(event=None):
+            nonlocal selected_group
+            position = groups_listbox.curselection()
+            if position and position[0] < facet_index.group_count():
+                selected_group = facet_index.group_at(position[0])
+                members_listbox.selection_clear()
+                members_listbox.see(0)
+
+        groups_listbox.bind("<<ListboxSelect>>", show_group, add="+")
+        members_listbox.bind("<Double-Button-1>", lambda event: self.view_contact_details(members_listbox, lambda position: facet_index.id_at(selected_group, position)))
+
+        # Entry to jump to the first group starting with the text typed, e.g. a letter
+        def jump(event=None):
+            text = jump_entry.get().strip()
+            if text and facet_index.group_count():
+                groups_listbox.jump_to(min(facet_index.find(text), facet_index.group_count() - 1))
+                show_group()
+
+        jump_label = tk.Label(group_window, text="Jump to:")
+        jump_label.grid(row=2, column=1, pady=5, sticky="w")
+        jump_entry = tk.Entry(group_window, width=10)
+        jump_entry.grid(row=2, column=1, pady=5, sticky="e")
+        jump_entry.bind("<KeyRelease>", jump)
+
+        # Back button to go back to the main sorting options
+        back_button = tk.Button(group_window, text="Back", command=lambda: (group_window.destroy(), self.sort_contacts()), width=10)
+        back_button.grid(row=2, column=2, pady=5, padx=5)
+
+        # OK button to close the window
+        ok_button = tk.Button(group_window, text="OK", command=group_window.destroy, width=10)
+        ok_button.grid(row=2, column=0, pady=5, padx=5)
+
     # Sort Contacts Page - P2796362 & P2836714
     def sort_contacts_page(self, sort_option_window):
         # Destroy the sort option window - P2796362
@@ -351,15 +940,25 @@ class AddressBookApp:
 
         # Entry for user input - P2836714
         filter_entry = tk.Entry(filter_window)
-        filter_entry.grid(row=2, column=0, columnspan=2, pady=5, padx=10)
+        filter_entry.grid(row=2, column=0, pady=5, padx=10, sticky="e")
+
+        # Drop-down to restrict the filter to a single field
+        field_var = tk.StringVar(value="Any Field")
+        field_menu = tk.OptionMenu(filter_window, field_var, "Any Field", *[field.replace("_", " ").title() for field in SEARCH_FIELDS])
+        field_menu.grid(row=2, column=1, pady=5, padx=10, sticky="w")
+
+        # Check box for ranked fuzzy matching of names, which tolerates typos and spelling variants
+        fuzzy_var = tk.BooleanVar(value=False)
+        fuzzy_check = tk.Checkbutton(filter_window, text="Fuzzy name match (e.g. Jonh, Smyth)", variable=fuzzy_var)
+        fuzzy_check.grid(row=3, column=0, columnspan=2, pady=5, padx=10)
 
         # Button to apply filter - P2796362
-        apply_filter_button = tk.Button(filter_window, text="Apply Filter", command=lambda: self.apply_filter(filter_entry.get(), filter_window))
-        apply_filter_button.grid(row=3, column=0, pady=5, padx=5, sticky="e")
+        apply_filter_button = tk.Button(filter_window, text="Apply Filter", command=lambda: self.apply_filter(filter_entry.get(), filter_window, field_var.get(), fuzzy_var.get()))
+        apply_filter_button.grid(row=4, column=0, pady=5, padx=5, sticky="e")
 
         # Button to go back to filter contacts page - P2796362
         back_button = tk.Button(filter_window, text="Back", command=filter_window.destroy)
-        back_button.grid(row=3, column=1, pady=5, padx=5, sticky="w")
+        back_button.grid(row=4, column=1, pady=5, padx=5, sticky="w")
 
     def filter_contacts_page(self, filtered_window):
         # Destroy the filtered window - P2796362
@@ -368,31 +967,32 @@ class AddressBookApp:
         # Re-open the filter contacts page - P2796362
         self.filter_contacts()
 
-    def apply_filter(self, filter_condition, filter_window):
+    def apply_filter(self, filter_condition, filter_window, field="Any Field", fuzzy=False):
         if not filter_condition.strip():  # Check if filter_condition is empty - P2785659
             # Display a message to input filter conditions - P2785659
             messagebox.showinfo("Filter Contacts", "Please input filter conditions.")
             return
 
-        filtered_contacts = [
-            contact for contact in self.contacts
-            if (
-                filter_condition.lower() in str(contact.first_name).lower() or
-                filter_condition.lower() in str(contact.last_name).lower() or
-                filter_condition.lower() in str(contact.address).lower() or
-                filter_condition.lower() in str(contact.mobile_number).lower() or
-                filter_condition.lower() in str(contact.secondary_number).lower() or
-                filter_condition.lower() in str(contact.email_address).lower()
-            )
-        ]
+        scores = None
+        if fuzzy:
+            # Best matching names first, each shown with its score
+            with instrumentation.measure("filter_fuzzy"):
+                results = self.store.fuzzy_query(filter_condition, limit=FUZZY_RESULTS)
+            filtered_ids = [contact_id for contact_id, score in results]
+            scores = dict(results)
+        else:
+            # Match the condition against the chosen field, or every searchable field, ignoring case; the store is
+            # scanned in display order a chunk at a time, only as far as the results list is scrolled
+            fields = SEARCH_FIELDS if field == "Any Field" else (field.lower().replace(" ", "_"),)
+            filtered_ids = self.store.scan_query(filter_condition, fields)
 
         # Destroy the filter window before displaying the filtered results - P2796362
         filter_window.destroy()
 
         # Display filtered contacts in a new window - P2796362
-        self.display_filtered_contacts(filtered_contacts)
+        self.display_filtered_contacts(filtered_ids, scores)
 
-    def display_filtered_contacts(self, filtered_contacts):
+    def display_filtered_contacts(self, filtered_ids, scores=None):
         # Window to show the filtered list - P2836714
         filtered_window = tk.Toplevel(self.root)
         filtered_window.title("Filtered Contacts")
@@ -401,33 +1001,63 @@ class AddressBookApp:
         filtered_label = tk.Label(filtered_window, text="Filtered Contacts:")
         filtered_label.pack(pady=10)
 
-        # Listbox to display the filtered contacts - P2836714
-        filtered_listbox = tk.Listbox(filtered_window, width=25, height=20)
+        # A scan is read chunk by chunk as the list is scrolled towards the end of the matches read so far
+        paged = None
+        if hasattr(filtered_ids, "__next__"):
+            paged = PagedResults(filtered_window, filtered_ids, lambda: show_matches())
+            filtered_ids = paged.ids
+        status_label = tk.Label(filtered_window, text="Searching...")
+        status_label.pack()
+
+        # Virtual listbox to display the filtered contacts - P2836714
+        if paged is not None:
+            row_text = lambda start, stop: self.contact_names(paged.ids_between(start, stop))
+        elif scores is None:
+            row_text = lambda start, stop: self.contact_names(filtered_ids[start:stop])
+        else:
+            row_text = lambda start, stop: [f"{name} ({scores[contact_id]:.0%})" for contact_id, name in zip(filtered_ids[start:stop], self.contact_names(filtered_ids[start:stop]))]
+        filtered_listbox = VirtualListbox(filtered_window, lambda: len(filtered_ids), row_text, width=25, height=20)
         filtered_listbox.pack(side="top", pady=5)
 
-        for contact in filtered_contacts:
-            filtered_listbox.insert(tk.END, str(contact))
+        # Show how many contacts matched, or how many have been read so far
+        def show_matches():
+            if paged is None or paged.done:
+                status_label.config(text=f"{len(filtered_ids)} matching contacts")
+            else:
+                status_label.config(text=f"{len(filtered_ids)} matching contacts so far, scroll for more")
+            filtered_listbox.refresh()
+
+        if paged is None:
+            show_matches()
+
+        # Stop reading matches once the window closes
+        def stop_reading():
+            if paged is not None:
+                paged.cancel()
+
+        filtered_window.protocol("WM_DELETE_WINDOW", lambda: (stop_reading(), filtered_window.destroy()))
 
         # Bind double-click event to view_contact_details function - P2836714
-        filtered_listbox.bind("<Double-Button-1>", lambda event: self.view_contact_details(filtered_listbox))
+        filtered_listbox.bind("<Double-Button-1>", lambda event: self.view_contact_details(filtered_listbox, filtered_ids.__getitem__))
 
         # Add "OK" button to close the window - P2836714
-        ok_button = tk.Button(filtered_window, text="OK", command=filtered_window.destroy, width=10)
+        ok_button = tk.Button(filtered_window, text="OK", command=lambda: (stop_reading(), filtered_window.destroy()), width=10)
         ok_button.pack(side="left", pady=10, padx=5)
 
         # Add "Back" button to go back to filter contacts page - P2836714
-        back_button = tk.Button(filtered_window, text="Back", command=lambda: self.filter_contacts_page(filtered_window), width=10)
+        back_button = tk.Button(filtered_window, text="Back", command=lambda: (stop_reading(), self.filter_contacts_page(filtered_window)), width=10)
         back_button.pack(side="left", pady=10, padx=5)
 
     # Double-Click to View Contact Details - P2785659
-    def view_contact_details(self, sorted_listbox):
+    def view_contact_details(self, sorted_listbox, id_at=None):
         # Get the selected index from the sorted listbox
         selected_index = sorted_listbox.curselection()
 
         # Check if a contact is selected
         if selected_index:
-            # Get the contact from the selected index
-            contact_to_view = self.contacts[selected_index[0]]
+            # Get the contact from the selected index, using the list's own ids when it is not the main list
+            contact_id = (id_at or self.displayed_id)(selected_index[0])
+            contact_to_view = self.store.get(contact_id)
 
             # Display the contact details in view mode
             self.display_contact_details(contact_to_view, view_mode=True)
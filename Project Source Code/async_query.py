@@ -0,0 +1,151 @@
+'''
+Brief Description of what this code does:
+This code gives the contact stores an asyncio-compatible query API.
+stream_query and stream_sorted are async generators which yield the ids
+of matching contacts in order while the store's index is walked a chunk
+at a time, handing control back to the event loop between chunks. A
+broad filter such as "a" over a million contacts therefore gives its
+first results straight away, and stops reading the book as soon as the
+caller stops asking for more. Results are paged with cursors rather
+than offsets: query_page returns up to limit ids together with an
+"after" cursor (the sort key and id of the last one), from which the
+next page carries on even if contacts were added or deleted in between.
+The PagedResults class steps a store scan a chunk at a time from Tk's
+event loop, so the result windows only read the pages which are
+scrolled into view.
+'''
+
+import types
+from contextlib import aclosing
+from Contact import SEARCH_FIELDS
+from instrumentation import measure
+
+# Ids returned by query_page and sorted_page unless another limit is given
+PAGE_SIZE = 100
+
+
+# Function to hand control back to whatever runs the coroutine; under asyncio this is the same bare yield as asyncio.sleep(0)
+@types.coroutine
+def pause():
+    yield
+
+
+# Class holding one page of results
+class Page:
+    __slots__ = ("ids", "after")
+
+    # Initialise a page; after is the cursor to pass for the next page, or None when this is the last page
+    def __init__(self, ids, after):
+        self.ids = ids
+        self.after = after
+
+    # Number of ids on the page
+    def __len__(self):
+        return len(self.ids)
+
+
+# Function to yield the (sort key, contact id) entries from a store scan, at most limit of them, pausing after each chunk
+async def _stream(chunks, limit=None):
+    count = 0
+    try:
+        if limit is not None and limit <= 0:
+            return
+        for entries in chunks:
+            for entry in entries:
+                yield entry
+                count += 1
+                if count == limit:
+                    return
+            await pause()
+    finally:
+        chunks.close()
+
+
+# Function to yield the ids of contacts where any of the fields contains the text, ignoring case, in display order;
+# after is a cursor from a Page. Wrap it in contextlib.aclosing to stop the scan as soon as a loop over it breaks.
+async def stream_query(store, text, fields=SEARCH_FIELDS, limit=None, after=None):
+    async with aclosing(_stream(store.scan_query(text, fields, after), limit)) as entries:
+        async for key, contact_id in entries:
+            yield contact_id
+
+
+# Function to yield the ids of contacts sorted alphabetically by a field, continuing after a cursor from a Page
+async def stream_sorted(store, field, limit=None, after=None):
+    async with aclosing(_stream(store.scan_sorted(field, after), limit)) as entries:
+        async for key, contact_id in entries:
+            yield contact_id
+
+
+# Function to read up to limit entries of a scan into a Page, reading one more to learn whether another page follows
+async def _page(chunks, limit):
+    async with aclosing(_stream(chunks, limit + 1)) as stream:
+        entries = [entry async for entry in stream]
+    if len(entries) > limit:
+        return Page([contact_id for key, contact_id in entries[:limit]], entries[limit - 1])
+    return Page([contact_id for key, contact_id in entries], None)
+
+
+# Function to return one Page of the ids of contacts matching a query in display order, starting after a cursor
+async def query_page(store, text, fields=SEARCH_FIELDS, limit=PAGE_SIZE, after=None):
+    return await _page(store.scan_query(text, fields, after), limit)
+
+
+# Function to return one Page of the ids of contacts sorted alphabetically by a field, starting after a cursor
+async def sorted_page(store, field, limit=PAGE_SIZE, after=None):
+    return await _page(store.scan_sorted(field, after), limit)
+
+
+# Class reading the ids found by a store scan into a list from Tk's event loop, a chunk at a time as the list needs them
+class PagedResults:
+    # Initialise the list and ask for its first page; chunks yields lists of (sort key, contact id) entries in order, as
+    # store.scan_query does, and on_change() is called whenever ids are added or the scan ends
+    def __init__(self, widget, chunks, on_change, page_size=PAGE_SIZE):
+        self.widget = widget  # Any Tk widget, used for its after method
+        self.on_change = on_change
+        self.page_size = page_size
+        self.ids = []  # Ids read so far
+        self.done = False  # True once the scan has ended or been cancelled
+        self._chunks = chunks
+        self._wanted = 0
+        self._step_id = None
+        self.request(page_size)
+
+    # Number of ids read so far
+    def __len__(self):
+        return len(self.ids)
+
+    # Return the ids between two positions, asking for another page when they reach near the end of the ids read so far
+    def ids_between(self, start, stop):
+        self.request(stop + self.page_size)
+        return self.ids[start:stop]
+
+    # Return the id at a position
+    def id_at(self, position):
+        return self.ids[position]
+
+    # Ask for at least count ids to be read; they are read from Tk's event loop, not straight away
+    def request(self, count):
+        self._wanted = max(self._wanted, count)
+        if not self.done and self._step_id is None and len(self.ids) < self._wanted:
+            self._step_id = self.widget.after(1, self._step)
+
+    # Stop reading, closing the scan so it ends
+    def cancel(self):
+        if self._step_id is not None:
+            self.widget.after_cancel(self._step_id)
+            self._step_id = None
+        self._chunks.close()
+        self.done = True
+
+    # Read one chunk of the scan, then let Tk run before the next step
+    def _step(self):
+        self._step_id = None
+        with measure("query_page"):
+            entries = next(self._chunks, None)
+        if entries is None:
+            self.done = True
+        else:
+            self.ids.extend(contact_id for key, contact_id in entries)
+        if entries or self.done:
+            self.on_change()
+        self.request(self._wanted)
@@ -0,0 +1,122 @@
+'''
+Brief Description of what this code does:
+This code defines the BackgroundWorker class, a small thread pool that
+keeps slow work (decoding pictures, loading, saving, importing and
+exporting contacts) off the Tkinter main loop. Jobs run on worker
+threads and their results, errors and progress reports are put on a
+queue, which the main loop drains with root.after, so every callback
+runs on the Tk thread where it is safe to touch widgets. Each submitted
+job returns a BackgroundJob handle that can be cancelled; a cancelled
+job that has not started never runs, and one already running has its
+result discarded.
+'''
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Class representing one job submitted to a BackgroundWorker
+class BackgroundJob:
+    # Initialise a job with the callbacks to run on the Tk thread
+    def __init__(self, worker, on_done=None, on_error=None, on_progress=None):
+        self.worker = worker
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.future = None
+        self._cancelled = threading.Event()
+
+    # Whether the job has been cancelled; long jobs may check this from their worker thread and stop early
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    # Cancel the job so none of its callbacks run
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    # Whether the job has finished running, or was cancelled
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    # Report progress from the worker thread; the arguments are passed to on_progress on the Tk thread
+    def report(self, *args):
+        if self.on_progress is not None and not self.cancelled:
+            self.worker._results.put(("progress", self, args))
+
+
+# Class running jobs on a thread pool and handing their results back to the Tk main loop
+class BackgroundWorker:
+    # Initialise the worker for a Tk root window
+    def __init__(self, root, max_workers=4, poll_interval=50):
+        self.root = root
+        self.poll_interval = poll_interval  # Milliseconds between checks for finished jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="address-book")
+        self._results = queue.Queue()
+        self._active = 0  # Jobs whose final callback has not been delivered yet
+        self._poll_id = None
+
+    # Run function(*args, **kwargs) on a worker thread and return its BackgroundJob; must be called on the Tk thread.
+    # If on_progress is given the function is also passed progress=job.report.
+    def submit(self, function, *args, on_done=None, on_error=None, on_progress=None, **kwargs):
+        job = BackgroundJob(self, on_done, on_error, on_progress)
+        if on_progress is not None:
+            kwargs["progress"] = job.report
+        job.future = self._executor.submit(self._run, job, function, args, kwargs)
+        # A job cancelled before it started never runs _run, so report it from here instead
+        job.future.add_done_callback(lambda future: future.cancelled() and self._results.put(("cancelled", job, None)))
+        self._active += 1
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_interval, self._poll)
+        return job
+
+    # Cancel every job which has not started yet and wait for running jobs to finish; their callbacks are not run
+    def shutdown(self):
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    # Worker-thread wrapper queueing a job's result or error
+    def _run(self, job, function, args, kwargs):
+        if job.cancelled:
+            self._results.put(("cancelled", job, None))
+            return
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            self._results.put(("error", job, e))
+        else:
+            self._results.put(("done", job, result))
+
+    # Deliver queued results to their callbacks on the Tk thread, polling again while jobs are outstanding
+    def _poll(self):
+        self._poll_id = None
+        try:
+            while True:
+                try:
+                    kind, job, value = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                if kind != "progress":
+                    self._active -= 1
+                if not job.cancelled:
+                    self._deliver(kind, job, value)
+        finally:
+            # Keep polling even if a callback raised, so later jobs still report back
+            if self._active > 0:
+                self._poll_id = self.root.after(self.poll_interval, self._poll)
+
+    # Run the callback matching one queued message
+    def _deliver(self, kind, job, value):
+        if kind == "progress":
+            job.on_progress(*value)
+        elif kind == "done" and job.on_done is not None:
+            job.on_done(value)
+        elif kind == "error":
+            if job.on_error is None:
+                raise value
+            job.on_error(value)
@@ -0,0 +1,250 @@
+'''
+Brief Description of what this code does:
+This code runs bulk jobs over every contact in the address book:
+checking email addresses and phone numbers, tidying the layout of
+addresses, and making the thumbnail of every contact picture. The book
+is snapshotted and split into shards which a pool of worker processes
+works through in parallel, so a job over a large book uses every core
+instead of one. Results stream back shard by shard as they finish, with
+progress reported along the way. Changed contacts are only written to
+the store at the end, all together under the store's lock, so the book
+is never seen half updated and a contact edited while the job was
+running is left alone rather than overwritten. Books too small to
+repay starting the worker processes are processed in this process.
+Run as a script it runs a job on a contacts file and reports what it
+found.
+'''
+
+import argparse
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from Contact import FIELDS
+from contact_keys import DEFAULT_COUNTRY_CODE, normalise_email, normalise_phone
+
+# Contacts sent to a worker process at a time
+SHARD_SIZE = 2000
+
+# Shards queued per worker process, so the whole book is never copied into the pool at once
+SHARDS_PER_WORKER = 2
+
+# Contacts below which a job runs in this process instead: spawning the pool takes about half a second, while checking
+# or tidying a contact takes 5-10 us, so the pool only pays off on large books. Thumbnails take far longer per contact.
+MIN_POOL_CONTACTS = {"validate": 50000, "normalise_address": 100000, "thumbnails": 100}
+
+# Words of an address left in lower case unless they start it
+SMALL_WORDS = {"and", "by", "in", "of", "on", "the", "upon"}
+
+_ADDRESS = FIELDS.index("address")
+_MOBILE = FIELDS.index("mobile_number")
+_SECONDARY = FIELDS.index("secondary_number")
+_EMAIL = FIELDS.index("email_address")
+_PICTURE = FIELDS.index("picture_path")
+
+_POSTCODE = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?) ?(\d[A-Z]{2})\b", re.IGNORECASE)
+
+
+# Function to check a contact's email address and phone numbers; returns no new values and a list of problems
+def validate_contact(values, options):
+    country_code = options.get("country_code", DEFAULT_COUNTRY_CODE)
+    problems = []
+    for position, name in ((_MOBILE, "mobile number"), (_SECONDARY, "secondary number")):
+        if values[position].strip() and not normalise_phone(values[position], country_code):
+            problems.append(f"Invalid {name}: {values[position]}")
+    if values[_EMAIL].strip() and not normalise_email(values[_EMAIL]):
+        problems.append(f"Invalid email address: {values[_EMAIL]}")
+    return None, problems
+
+
+# Function to tidy the layout of an address: one space between words, ", " between parts, capitalised words
+# and upper case UK postcodes, e.g. "1 high  street ,leicester le1 7rh" becomes "1 High Street, Leicester LE1 7RH"
+def tidy_address(address):
+    parts = []
+    for part in address.split(","):
+        words = part.split()
+        if not words:
+            continue
+        for position, word in enumerate(words):
+            if word.islower() and (position == 0 or word not in SMALL_WORDS):
+                words[position] = word[0].upper() + word[1:]
+        parts.append(" ".join(words))
+    return _POSTCODE.sub(lambda match: f"{match.group(1).upper()} {match.group(2).upper()}", ", ".join(parts))
+
+
+# Function to tidy a contact's address; returns its new values if the address changed
+def normalise_address(values, options):
+    address = tidy_address(values[_ADDRESS])
+    if address == values[_ADDRESS]:
+        return None, []
+    new_values = list(values)
+    new_values[_ADDRESS] = address
+    return tuple(new_values), []
+
+
+# Function to make sure a contact's picture has an up-to-date thumbnail in options["cache_dir"]
+def make_thumbnail(values, options):
+    picture_path = values[_PICTURE]
+    if not picture_path:
+        return None, []
+    from thumbnail_cache import ThumbnailCache
+    try:
+        ThumbnailCache(options.get("cache_dir", ".thumbnails")).generate(picture_path)
+    except Exception as e:  # OSError for a missing file, PIL's errors for a file which is not a picture
+        return None, [f"Picture could not be read: {picture_path} ({e})"]
+    return None, []
+
+
+# Jobs which can be run over the book, by name
+JOBS = {
+    "validate": validate_contact,
+    "normalise_address": normalise_address,
+    "thumbnails": make_thumbnail,
+}
+
+
+# Class holding the outcome of a batch job
+class BatchResult:
+    # Initialise an empty result for a job
+    def __init__(self, job):
+        self.job = job
+        self.processed = 0
+        self.updates = {}  # Contact id -> (values when the job read them, new values)
+        self.problems = []  # (contact id, description)
+        self.applied = 0
+        self.conflicts = []  # Ids of contacts changed or deleted while the job ran, which were left alone
+
+
+# Function to run a job over one shard of rows; returns (position in the shard, new values, problems) for each
+# contact the job changed or found a problem with. It runs in a worker process.
+def run_shard(job, options, rows):
+    function = JOBS[job]
+    results = []
+    for position, values in enumerate(rows):
+        new_values, problems = function(values, options)
+        if new_values is not None or problems:
+            results.append((position, new_values, problems))
+    return results
+
+
+# Function to run a job over a snapshot of the store and yield (contact id, old values, new values, problems) for each
+# contact the job changed or found a problem with, shard by shard as the workers finish them.
+# progress(contacts_done, contacts_done, total_contacts) is called after each shard; workers defaults to the CPU count,
+# and min_pool_size to the job's MIN_POOL_CONTACTS.
+def stream_batch(store, job, options=None, workers=None, shard_size=SHARD_SIZE, progress=None, min_pool_size=None):
+    if job not in JOBS:
+        raise ValueError(f"Unknown batch job: {job}")
+    yield from _stream_rows(*store.snapshot(), job, options, workers, shard_size, progress, min_pool_size)
+
+
+# Function to run a job over the rows of a snapshot, yielding what stream_batch yields
+def _stream_rows(contact_ids, rows, job, options, workers, shard_size, progress, min_pool_size):
+    options = options or {}
+    shards = [(start, rows[start:start + shard_size]) for start in range(0, len(rows), shard_size)]
+    workers = workers or os.cpu_count() or 1
+    min_pool_size = MIN_POOL_CONTACTS[job] if min_pool_size is None else min_pool_size
+    done = 0
+    if workers == 1 or len(shards) < 2 or len(rows) < min_pool_size:
+        # Not worth starting processes for
+        for start, shard in shards:
+            for position, new_values, problems in run_shard(job, options, shard):
+                yield contact_ids[start + position], shard[position], new_values, problems
+            done += len(shard)
+            if progress:
+                progress(done, done, len(rows))
+        return
+
+    # Processes are spawned rather than forked, as forking copies the app's other threads' locks mid-use
+    executor = ProcessPoolExecutor(min(workers, len(shards)), mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pending = {}
+        next_shard = 0
+        while next_shard < len(shards) or pending:
+            while next_shard < len(shards) and len(pending) < workers * SHARDS_PER_WORKER:
+                start, shard = shards[next_shard]
+                pending[executor.submit(run_shard, job, options, shard)] = (start, shard)
+                next_shard += 1
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                start, shard = pending.pop(future)
+                for position, new_values, problems in future.result():
+                    yield contact_ids[start + position], shard[position], new_values, problems
+                done += len(shard)
+                if progress:
+                    progress(done, done, len(rows))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Function to write a result's updates to the store in one step under its lock; contacts changed since the job read
+# them are skipped and listed in result.conflicts. Returns how many contacts were updated.
+def apply_updates(store, result):
+    with store.lock:
+        changes = []
+        for contact_id, (old_values, new_values) in result.updates.items():
+            if contact_id in store and store.values(contact_id) == old_values:
+                changes.append((contact_id, new_values))
+            else:
+                result.conflicts.append(contact_id)
+        result.applied = store.update_many(changes)
+    return result.applied
+
+
+# Function to run a job over the whole store and return a BatchResult; the changes are applied at the end unless apply is False
+def run_batch(store, job, options=None, apply=True, workers=None, shard_size=SHARD_SIZE, progress=None, min_pool_size=None):
+    if job not in JOBS:
+        raise ValueError(f"Unknown batch job: {job}")
+    result = BatchResult(job)
+    contact_ids, rows = store.snapshot()
+    for contact_id, old_values, new_values, problems in _stream_rows(contact_ids, rows, job, options, workers, shard_size, progress, min_pool_size):
+        if new_values is not None:
+            result.updates[contact_id] = (old_values, new_values)
+        for problem in problems:
+            result.problems.append((contact_id, problem))
+    # The contacts the job read, however many were added or deleted meanwhile
+    result.processed = len(rows)
+    if apply:
+        apply_updates(store, result)
+    return result
+
+
+# Run a batch job on a contacts file and report what it found
+def main():
+    from contact_journal import ContactJournal
+    from contact_store import ContactStore
+
+    parser = argparse.ArgumentParser(description="Run a bulk job over every contact in a contacts file.")
+    parser.add_argument("contacts_file", help="file to process (.txt or .abk)")
+    parser.add_argument("job", choices=sorted(JOBS), help="job to run")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="contacts sent to a worker at a time")
+    parser.add_argument("--min-pool-size", type=int, help="contacts below which the job runs without worker processes (default: depends on the job)")
+    parser.add_argument("--cache-dir", help="thumbnail folder for the thumbnails job (default: .thumbnails beside the contacts file)")
+    parser.add_argument("--apply", action="store_true", help="save the changed contacts back to the file")
+    args = parser.parse_args()
+
+    # Opened through its journal, as the app does, so edits not yet compacted into the file are included and kept
+    store = ContactStore()
+    journal = ContactJournal(store, args.contacts_file)
+    journal.open()
+    try:
+        cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.contacts_file)), ".thumbnails")
+        started = time.perf_counter()
+        result = run_batch(store, args.job, {"cache_dir": cache_dir}, apply=args.apply, workers=args.workers, shard_size=args.shard_size,
+                           min_pool_size=args.min_pool_size)
+        elapsed = time.perf_counter() - started
+        for contact_id, problem in result.problems:
+            print(f"{store.name(contact_id)}: {problem}")
+        print(f"{result.processed} contacts in {elapsed:.2f} s ({result.processed / max(elapsed, 1e-9):.0f} contacts/s), "
+              f"{len(result.problems)} problems, {len(result.updates)} contacts to change")
+        if args.apply and result.applied:
+            journal.compact()
+            print(f"Saved {result.applied} changed contacts")
+    finally:
+        journal.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+'''
+Brief Description of what this code does:
+This code measures how much memory the address book needs per contact
+when contacts are held as a list of Contact objects, as the app used to
+hold them, and when they are held in a compact ContactTable. Next to
+those table-only numbers it reports a whole ContactStore in the normal
+and compact layouts (as the app runs with and without --compact), once
+just loaded and once with every search index built, as the indexes
+take much of the memory of a whole store. Contacts are generated with
+synthetic_contacts and read back from a file, so every layout pays for
+its own strings just as it would when loading a real address book.
+'''
+
+import argparse
+import csv
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Contact import Contact
+from contact_store import ContactStore, normalise_row, write_rows
+from contact_table import ContactTable
+from synthetic_contacts import generate_contacts, parse_count
+
+
+# Function to read the rows of a plain text contacts file
+def read_rows(file_path):
+    with open(file_path, "r", newline="", encoding="utf-8") as file:
+        for data in csv.reader(file):
+            if data:
+                yield normalise_row(data)
+
+
+# Function to build a list of Contact objects
+def build_contact_list(file_path):
+    return [Contact(*row) for row in read_rows(file_path)]
+
+
+# Function to build a ContactTable
+def build_contact_table(file_path):
+    table = ContactTable()
+    for contact_id, row in enumerate(read_rows(file_path)):
+        table[contact_id] = row
+    return table
+
+
+# Function to build a ContactStore, normal or compact, optionally with every search index ready
+def build_store(file_path, compact, indexed):
+    store = ContactStore(compact=compact)
+    store.load(file_path)
+    if indexed:
+        store.query("smith")
+        store.fuzzy_query("smith")
+        store.find_by_phone("0")
+        for facet in store.facet_indexes:
+            store.facet_index(facet)
+    return store
+
+
+# Function to return the bytes allocated while building something, and the thing built
+def measure(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    result = build(*args)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used, result
+
+
+# Run the benchmark and print a table of bytes per contact
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory used per contact by each contact layout.")
+    parser.add_argument("--count", type=parse_count, default=100000, help="number of synthetic contacts, e.g. 10k or 1M")
+    parser.add_argument("--table-only", action="store_true", help="only compare the contact layouts, not whole stores")
+    args = parser.parse_args()
+
+    layouts = [("list of Contact", build_contact_list), ("ContactTable", build_contact_table)]
+    if not args.table_only:
+        layouts += [("ContactStore loaded", lambda path: build_store(path, False, False)),
+                    ("compact ContactStore loaded", lambda path: build_store(path, True, False)),
+                    ("ContactStore indexed", lambda path: build_store(path, False, True)),
+                    ("compact ContactStore indexed", lambda path: build_store(path, True, True))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "contacts.txt")
+        write_rows(file_path, generate_contacts(args.count))
+        print(f"{args.count} contacts")
+        for label, build in layouts:
+            used, result = measure(build, file_path)
+            print(f"{label:<28}{used / 1024 / 1024:>10.1f} MB{used / args.count:>10.0f} bytes per contact")
+            if isinstance(result, ContactStore):
+                result.close()
+            del result
+
+
+if __name__ == "__main__":
+    main()
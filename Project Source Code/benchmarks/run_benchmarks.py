@@ -0,0 +1,361 @@
+'''
+Brief Description of what this code does:
+This code is the benchmark suite of the address book. For each book
+size (10k and 100k contacts by default, 1M on request) it writes a book
+of synthetic contacts and times the address book's main operations.
+The contact store is timed on its own for loading and saving the
+contacts file, searching, adding contacts, the Check Contacts bulk job
+with and without worker processes, and sorting as Sort Contacts does,
+so sorting is also tracked where the app benchmarks cannot run. Then the app itself is started
+on the book and its own methods are timed as the buttons run them:
+refreshing the contacts list, Sort Contacts, Filter Contacts up to the
+first page of results on screen, and adding a contact. The app
+benchmarks need Tk; without a display they run under Xvfb when it is
+installed and are skipped otherwise. Results are written as JSON and
+can be compared with a stored baseline (benchmarks/baseline.json), in
+which case the script fails if any benchmark got slower than the
+allowed tolerance, so regressions show up.
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_query import query_page, sorted_page
+from batch_operations import run_batch
+from Contact import Contact
+from contact_store import ContactStore, SEARCH_FIELDS, write_rows
+from synthetic_contacts import generate_contacts, parse_count
+
+# Where the baseline is kept unless another file is given
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Contacts added per run of the store_add benchmark
+ADD_COUNT = 1000
+
+# Names read by the sort benchmarks, as many as the sorted window's list shows at first
+SORT_WINDOW = 20
+
+# Contacts added per run of the app's add_contact benchmark, which also redraws the list after each one
+APP_ADD_COUNT = 100
+
+# Seconds to wait for the app to load the book or show a window of results
+TIMEOUT = 600
+
+# Searches timed by the filter benchmarks: (name, text, field as chosen in the Filter Contacts window, fuzzy)
+FILTERS = (
+    ("any_field", "smit", "Any Field", False),
+    ("address", "leicester", "Address", False),
+    ("broad", "a", "Any Field", False),
+    ("fuzzy", "jonh smyth", "Any Field", True),
+)
+
+
+# Function to time a function; returns the minimum and median seconds per operation over repeat runs.
+# setup, if given, is called untimed before each run and its result passed to the function.
+def time_runs(function, repeat, setup=None, operations=1):
+    times = []
+    for run in range(repeat):
+        arguments = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        function(*arguments)
+        times.append((time.perf_counter() - start) / operations)
+    return {"min": min(times), "median": statistics.median(times), "runs": repeat, "operations": operations}
+
+
+# Function to time the contact store on its own on a book of contacts, written to directory if it is not there yet
+def store_benchmarks(directory, count, repeat, compact):
+    results = {}
+    text_path = os.path.join(directory, f"contacts-{count}.txt")
+    columnar_path = os.path.join(directory, f"contacts-{count}.abk")
+    if not os.path.exists(text_path):
+        write_rows(text_path, generate_contacts(count))
+
+    # Loading and saving the contacts file
+    store = ContactStore(compact=compact)
+    results["load_contacts_txt"] = time_runs(lambda fresh: fresh.load(text_path), repeat, setup=lambda: ContactStore(compact=compact))
+    store.load(text_path)
+    results["save_contacts_txt"] = time_runs(lambda: store.save(os.path.join(directory, "saved.txt")), repeat)
+    store.save(columnar_path)
+    results["load_contacts_abk"] = time_runs(lambda fresh: (fresh.load(columnar_path), fresh.close()), repeat, setup=lambda: ContactStore(compact=compact))
+
+    # Searching every match, as the search box does, and the first page of a streamed query; the first search builds
+    # the search index and the first fuzzy search the fuzzy index, so they are timed separately
+    results["build_search_index"] = time_runs(lambda: store.query("smit"), 1)
+    results["build_fuzzy_index"] = time_runs(lambda: store.fuzzy_query("smith"), 1)
+    for name, text, field, fuzzy in FILTERS:
+        if fuzzy:
+            results[f"query_{name}"] = time_runs(lambda: store.fuzzy_query(text, limit=100), repeat)
+        else:
+            fields = SEARCH_FIELDS if field == "Any Field" else (field.lower(),)
+            results[f"query_{name}"] = time_runs(lambda: store.query(text, fields), repeat)
+            results[f"query_{name}_first_page"] = time_runs(lambda: asyncio.run(query_page(store, text, fields)), repeat)
+
+    # Adding a contact and finding where it is listed
+    new_contacts = [Contact(*values) for values in generate_contacts(ADD_COUNT, seed=1)]
+
+    def add_contacts():
+        added = []
+        for contact in new_contacts:
+            contact_id = store.add(contact)
+            store.position(contact_id)
+            added.append(contact_id)
+        return added
+
+    times = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        added = add_contacts()
+        times.append((time.perf_counter() - start) / ADD_COUNT)
+        for contact_id in added:
+            store.delete(contact_id)
+    results["store_add"] = {"min": min(times), "median": statistics.median(times), "runs": repeat, "operations": ADD_COUNT}
+
+    # batch_validate: the Check Contacts job in this process and on a pool of worker processes; the pool's start-up
+    # only pays off on large books, below batch_operations.MIN_POOL_CONTACTS the job stays in process
+    results["batch_validate_in_process"] = time_runs(lambda: run_batch(store, "validate", apply=False, workers=1), repeat)
+    if (os.cpu_count() or 1) > 1:
+        results["batch_validate_pool"] = time_runs(lambda: run_batch(store, "validate", apply=False, min_pool_size=0), repeat)
+    else:
+        results["batch_validate_pool"] = "skipped: one CPU"
+
+    # Sort Contacts without its window: building the sorted index of a field which has none yet, reading the first
+    # window of names from an index, reading a page by its cursor, and sorting a field with no index on demand
+    results["build_sort_index"] = time_runs(lambda: store.add_sort_index("address"), 1)
+    results["sort_first_window"] = time_runs(lambda: [store.name(contact_id) for contact_id in store.add_sort_index("last_name").ids(0, SORT_WINDOW)], repeat)
+    results["sorted_page"] = time_runs(lambda: asyncio.run(sorted_page(store, "last_name", SORT_WINDOW)), repeat)
+    results["sort_unindexed"] = time_runs(lambda: store.sorted_ids("email_address", 0, SORT_WINDOW), repeat)
+    return store, results
+
+
+# Function to start Xvfb when there is no display but Xvfb is installed; returns its process, or None
+def start_virtual_display():
+    if os.name != "posix" or sys.platform == "darwin" or os.environ.get("DISPLAY") or not shutil.which("Xvfb"):
+        return None
+    display = ":99"
+    process = subprocess.Popen(["Xvfb", display, "-nolisten", "tcp"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(1)
+    return process
+
+
+# Function to create a hidden Tk root window, or return the reason why Tk cannot be used
+def open_tk():
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:  # ImportError when Python has no Tk, tk.TclError when there is no display
+        return None, str(e) or type(e).__name__
+    root.withdraw()
+    return root, None
+
+
+# Function to run Tk's event loop until a condition holds, failing after TIMEOUT seconds
+def wait_for(root, condition):
+    deadline = time.perf_counter() + TIMEOUT
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"gave up waiting after {TIMEOUT} seconds")
+        root.update()
+
+
+# Function to close every window the app opened over its main window
+def close_windows(root):
+    import tkinter as tk
+    for window in root.winfo_children():
+        if isinstance(window, tk.Toplevel):
+            window.destroy()
+
+
+# Function to check whether a window of filter results shows how many contacts matched
+def results_shown(root):
+    import tkinter as tk
+    return any(isinstance(widget, tk.Label) and "matching contacts" in widget.cget("text")
+               for window in root.winfo_children() if isinstance(window, tk.Toplevel) for widget in window.winfo_children())
+
+
+# Function to start the app on a copy of a contacts file and time its own methods as the buttons run them, each until
+# its window or list has been drawn
+def app_benchmarks(root, text_path, repeat, compact):
+    import address_book_app
+    from address_book_app import AddressBookApp
+
+    # Message boxes would wait for a click, so they are answered straight away
+    address_book_app.messagebox.showinfo = lambda *args, **kwargs: None
+    address_book_app.messagebox.askyesno = lambda *args, **kwargs: True
+    # The app journals its changes beside its contacts file, so it is given a copy of its own
+    directory = tempfile.mkdtemp(prefix="address-book-app-")
+    contacts_file = os.path.join(directory, "contacts.txt")
+    shutil.copyfile(text_path, contacts_file)
+    results = {}
+    window = None
+    try:
+        import tkinter as tk
+        # The app is given a window of its own, which it destroys when it exits
+        window = tk.Toplevel(root)
+        app = AddressBookApp(window, contacts_file, compact=compact)
+        # The history starts once every contact has loaded
+        wait_for(window, lambda: app.history is not None)
+
+        def refresh():
+            app.update_contacts_listbox()
+            window.update_idletasks()
+
+        results["update_contacts_listbox"] = time_runs(refresh, repeat)
+
+        # Sort Contacts: the sorted window, drawn with its first page of names; each run starts from a new window of
+        # options, as Sort Contacts and Filter Contacts open one, which the button then closes
+        def options_window():
+            close_windows(window)
+            return tk.Toplevel(window)
+
+        def sort_and_display(parent):
+            app.sort_and_display("last_name", parent)
+            window.update_idletasks()
+
+        results["sort_and_display"] = time_runs(sort_and_display, repeat, setup=options_window)
+
+        # Filter Contacts: from Apply Filter until the results window shows its first page of matches
+        for name, text, field, fuzzy in FILTERS:
+            def apply_filter(parent):
+                app.apply_filter(text, parent, field, fuzzy)
+                wait_for(window, lambda: results_shown(window))
+                window.update_idletasks()
+
+            results[f"apply_filter_{name}"] = time_runs(apply_filter, repeat, setup=options_window)
+        close_windows(window)
+
+        # Add Contact, once the dialog has been filled in: checking for duplicates, adding and listing the new contact
+        new_contacts = iter(generate_contacts(APP_ADD_COUNT * repeat, seed=1))
+        app.get_contact_info = lambda initial_contact=None: list(next(new_contacts))
+        times = []
+        for run in range(repeat):
+            length = len(app.store)
+            start = time.perf_counter()
+            for added in range(APP_ADD_COUNT):
+                app.add_contact()
+                window.update_idletasks()
+            times.append((time.perf_counter() - start) / APP_ADD_COUNT)
+            for run_back in range(APP_ADD_COUNT):
+                app.undo_last_change()
+            assert len(app.store) == length
+        results["add_contact"] = {"min": min(times), "median": statistics.median(times), "runs": repeat, "operations": APP_ADD_COUNT}
+        app.exit_application()
+        window = None
+    finally:
+        if window is not None:
+            window.destroy()
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+# Function to compare results with a baseline; returns (benchmark, size, baseline seconds, seconds, change) for each
+# benchmark in both, and the list of those slower than the tolerance allows
+def compare(results, baseline, tolerance):
+    rows = []
+    regressions = []
+    for size, benchmarks in results["sizes"].items():
+        for name, result in benchmarks.items():
+            before = baseline.get("sizes", {}).get(size, {}).get(name)
+            if not isinstance(result, dict) or not isinstance(before, dict) or not before.get("min"):
+                continue
+            change = result["min"] / before["min"] - 1
+            row = (name, size, before["min"], result["min"], change)
+            rows.append(row)
+            if change > tolerance:
+                regressions.append(row)
+    return rows, regressions
+
+
+# Function to format seconds for the report
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
+
+
+# Run the benchmarks, write the results and compare them with the baseline
+def main():
+    parser = argparse.ArgumentParser(description="Time the address book's main operations on synthetic books of contacts.")
+    parser.add_argument("--sizes", default="10k,100k", help="comma separated book sizes, e.g. 10k,100k,1M")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark; the fastest is compared")
+    parser.add_argument("--compact", action="store_true", help="use the compact contact table")
+    parser.add_argument("--no-ui", action="store_true", help="skip the benchmarks which need Tk")
+    parser.add_argument("--data-dir", help="folder to keep the generated contacts files in, so later runs can reuse them")
+    parser.add_argument("--output", help="file to write the JSON results to (default: print them)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline, e.g. 0.25 for 25%%")
+    args = parser.parse_args()
+    sizes = [parse_count(size) for size in args.sizes.split(",")]
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "compact": args.compact,
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+    root = display = None
+    if not args.no_ui:
+        display = start_virtual_display()
+        root, reason = open_tk()
+        if root is None:
+            results["ui_skipped"] = reason
+            print(f"Skipping the app benchmarks: {reason}", file=sys.stderr)
+
+    directory = args.data_dir or tempfile.mkdtemp(prefix="address-book-benchmarks-")
+    os.makedirs(directory, exist_ok=True)
+    try:
+        for count in sizes:
+            print(f"Benchmarking {count} contacts...", file=sys.stderr)
+            store, benchmarks = store_benchmarks(directory, count, args.repeat, args.compact)
+            store.close()
+            if root is not None:
+                benchmarks.update(app_benchmarks(root, os.path.join(directory, f"contacts-{count}.txt"), args.repeat, args.compact))
+            results["sizes"][str(count)] = benchmarks
+    finally:
+        if root is not None:
+            root.destroy()
+        if display is not None:
+            display.terminate()
+        if args.data_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            file.write(text + "\n")
+        print(f"Saved the baseline to {args.baseline}", file=sys.stderr)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        rows, regressions = compare(results, baseline, args.tolerance)
+        for name, size, before, now, change in rows:
+            flag = "  REGRESSION" if change > args.tolerance else ""
+            print(f"{name:<26}{size:>9}{format_seconds(before):>12}{format_seconds(now):>12}{change:>+9.0%}{flag}", file=sys.stderr)
+        print(f"{len(regressions)} of {len(rows)} benchmarks slower than the baseline by more than {args.tolerance:.0%}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+'''
+Brief Description of what this code does:
+This code measures how quickly the address book starts. It times
+importing address_book_app with "python -X importtime", lists the
+slowest imports, and checks that PIL is not among them. It then starts
+the app in a fresh process on a synthetic book of contacts and records
+four moments from launch: when the imports finish, when the window is
+first drawn, when the first contacts appear in the list, and when every
+contact has loaded. Results are JSON and are compared with a stored
+baseline in the same way as run_benchmarks.py. Starting the app needs
+Tk; without a display it runs under Xvfb when that is installed, and
+is skipped otherwise.
+'''
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, SOURCE_DIR)
+
+from contact_store import write_rows
+from run_benchmarks import compare, format_seconds, start_virtual_display
+from synthetic_contacts import generate_contacts, parse_count
+
+# Where the baseline is kept unless another file is given
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "startup_baseline.json")
+
+# Direct imports of address_book_app listed in the results, slowest first
+SLOWEST_IMPORTS = 10
+
+# Seconds to wait for the app to load every contact
+TIMEOUT = 600
+
+# Script run in a fresh interpreter: start the app, note the time of each startup moment and print them as JSON
+APP_SCRIPT = """
+import json, sys, time
+source_dir, contacts_file, count = sys.argv[1], sys.argv[2], int(sys.argv[3])
+sys.path.insert(0, source_dir)
+marks = {}
+import tkinter as tk
+from address_book_app import AddressBookApp
+marks["imported"] = time.time()
+root = tk.Tk()
+app = AddressBookApp(root, contacts_file)
+root.update()
+marks["first_paint"] = time.time()
+marks["pil_imported"] = "PIL" in sys.modules
+deadline = time.time() + float(sys.argv[4])
+while time.time() < deadline:
+    root.update()
+    if "first_rows" not in marks and app.contacts_listbox.listbox.size():
+        marks["first_rows"] = time.time()
+    if "first_rows" in marks and len(app.store) >= count:
+        marks["all_contacts"] = time.time()
+        break
+    time.sleep(0.001)
+app.exit_application()
+print(json.dumps(marks))
+"""
+
+
+# Function to summarise a list of timings as run_benchmarks does
+def summarise(times):
+    return {"min": min(times), "median": statistics.median(times), "runs": len(times), "operations": 1}
+
+
+# Function to run "python -X importtime" on address_book_app; returns its cumulative import time in seconds, the
+# (module, seconds) of each module it imports directly, and whether PIL was imported
+def import_time():
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import address_book_app"],
+                            cwd=SOURCE_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    children = []
+    pil_imported = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        name = name.strip()
+        seconds = int(cumulative) / 1e6
+        pil_imported = pil_imported or name.split(".")[0] == "PIL"
+        # A module's own imports are listed just before it, one level deeper
+        if depth == 1:
+            children.append((name, seconds))
+        elif depth == 0:
+            if name == "address_book_app":
+                return seconds, children, pil_imported
+            children = []
+    raise RuntimeError("address_book_app missing from the import times")
+
+
+# Function to start the app in a fresh process and return the seconds from launch to each startup moment
+def launch(contacts_file, count):
+    started = time.time()
+    result = subprocess.run([sys.executable, "-c", APP_SCRIPT, SOURCE_DIR, contacts_file, str(count), str(TIMEOUT)],
+                            cwd=os.path.dirname(contacts_file), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "the app did not start")
+    marks = json.loads(result.stdout.strip().splitlines()[-1])
+    if "all_contacts" not in marks:
+        raise RuntimeError(f"the contacts did not load within {TIMEOUT} seconds")
+    moments = {name: marks[name] - started for name in ("imported", "first_paint", "first_rows", "all_contacts")}
+    return moments, marks["pil_imported"]
+
+
+# Run the startup benchmarks, write the results and compare them with the baseline
+def main():
+    parser = argparse.ArgumentParser(description="Time how quickly the address book starts.")
+    parser.add_argument("--sizes", default="100k", help="comma separated book sizes, e.g. 10k,100k,1M")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark; the fastest is compared")
+    parser.add_argument("--output", help="file to write the JSON results to (default: print them)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline, e.g. 0.25 for 25%%")
+    args = parser.parse_args()
+    sizes = [parse_count(size) for size in args.sizes.split(",")]
+
+    results = {"python": sys.version.split()[0], "repeat": args.repeat, "sizes": {}}
+    try:
+        import_time()  # Warm up, so the timed runs do not include compiling the modules
+        runs = [import_time() for run in range(args.repeat)]
+    except RuntimeError as e:
+        results["import_skipped"] = str(e)
+        print(f"Skipping the import benchmark: {e}", file=sys.stderr)
+        runs = []
+    if runs:
+        total, children, pil_imported = runs[-1]
+        results["slowest_imports"] = [[name, seconds] for name, seconds in sorted(children, key=lambda item: -item[1])[:SLOWEST_IMPORTS]]
+        results["pil_imported"] = pil_imported
+    import_result = summarise([total for total, children, pil_imported in runs]) if runs else None
+
+    display = start_virtual_display()
+    directory = tempfile.mkdtemp(prefix="address-book-startup-")
+    try:
+        for count in sizes:
+            print(f"Starting the app with {count} contacts...", file=sys.stderr)
+            benchmarks = {}
+            if import_result is not None:
+                benchmarks["import_address_book_app"] = import_result
+            contacts_file = os.path.join(directory, f"contacts-{count}.txt")
+            write_rows(contacts_file, generate_contacts(count))
+            try:
+                launches = [launch(contacts_file, count) for run in range(args.repeat)]
+            except RuntimeError as e:
+                results["app_skipped"] = str(e)
+                print(f"Skipping the app startup benchmark: {e}", file=sys.stderr)
+            else:
+                for moment in ("imported", "first_paint", "first_rows", "all_contacts"):
+                    benchmarks[f"launch_to_{moment}"] = summarise([moments[moment] for moments, pil in launches])
+                results["pil_imported_at_first_paint"] = any(pil for moments, pil in launches)
+            results["sizes"][str(count)] = benchmarks
+    finally:
+        if display is not None:
+            display.terminate()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            file.write(text + "\n")
+        print(f"Saved the baseline to {args.baseline}", file=sys.stderr)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        rows, regressions = compare(results, baseline, args.tolerance)
+        for name, size, before, now, change in rows:
+            flag = "  REGRESSION" if change > args.tolerance else ""
+            print(f"{name:<30}{size:>9}{format_seconds(before):>12}{format_seconds(now):>12}{change:>+9.0%}{flag}", file=sys.stderr)
+        print(f"{len(regressions)} of {len(rows)} benchmarks slower than the baseline by more than {args.tolerance:.0%}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+'''
+Brief Description of what this code does:
+This code generates realistic-looking synthetic contacts for the
+benchmarks. Names, streets, towns and email domains are drawn from
+small pools with a skewed distribution, so common values repeat the way
+they do in real address books, and every contact gets its own house
+number, phone numbers and email address. The same seed always gives the
+same contacts. Run as a script it writes a contacts file of any size,
+e.g. "python synthetic_contacts.py 1M big.txt".
+'''
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contact_store import write_rows
+
+FIRST_NAMES = ("James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+               "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+               "Oliver", "Amelia", "Harry", "Isla", "Jack", "Ava", "George", "Emily", "Noah", "Sophia", "Mohammed",
+               "Priya", "Arjun", "Aisha", "Wei", "Mei", "Luca", "Chiara", "Mateo", "Lucia", "Jonathan", "Catherine",
+               "Stephen", "Kathryn", "Steven", "Jon", "Shyam", "Anita", "Tomasz", "Zofia")
+LAST_NAMES = ("Smith", "Jones", "Williams", "Taylor", "Brown", "Davies", "Evans", "Wilson", "Thomas", "Johnson",
+              "Roberts", "Robinson", "Thompson", "Wright", "Walker", "White", "Edwards", "Hughes", "Green", "Hall",
+              "Lewis", "Harris", "Clarke", "Patel", "Jackson", "Wood", "Turner", "Martin", "Cooper", "Hill", "Ward",
+              "Morris", "Moore", "Clark", "Lee", "King", "Baker", "Harrison", "Morgan", "Allen", "James", "Scott",
+              "Phillips", "Watson", "Davis", "Parker", "Price", "Bennett", "Young", "Griffiths", "Mitchell", "Kelly",
+              "Cook", "Carter", "Richardson", "Bailey", "Collins", "Bell", "Shaw", "Murphy", "Miller", "Cox", "Richards",
+              "Khan", "Marshall", "Anderson", "Simpson", "Ellis", "Adams", "Singh", "Begum", "Wilkinson", "Foster",
+              "Chapman", "Powell", "Webb", "Rogers", "Gray", "Mason", "Ali", "Hunt", "Hussain", "Campbell", "Matthews",
+              "Owen", "Palmer", "Holmes", "Mills", "Barnes", "Knight", "Lloyd", "Butler", "Russell", "Barker", "Fisher",
+              "Stevens", "Jenkins", "Murray", "Dixon", "Harvey", "Smyth", "Schmidt", "Nowak", "Kowalski", "Chen")
+STREETS = ("High Street", "Station Road", "Main Street", "Park Road", "Church Road", "Church Street", "London Road",
+           "Victoria Road", "Green Lane", "Manor Road", "Church Lane", "Park Avenue", "The Avenue", "The Crescent",
+           "Queens Road", "New Road", "Grange Road", "Kings Road", "Kingsway", "Windsor Road", "Highfield Road",
+           "Mill Lane", "Alexander Road", "York Road", "St. John's Road", "Main Road", "Broadway", "King Street",
+           "The Green", "Springfield Road", "George Street", "Park Lane", "Victoria Street", "Albert Road")
+TOWNS = ("Leicester", "London", "Birmingham", "Manchester", "Leeds", "Sheffield", "Bristol", "Nottingham", "Coventry",
+         "Bradford", "Liverpool", "Newcastle", "Derby", "Loughborough", "Hinckley", "Oadby", "Wigston", "Market Harborough",
+         "Melton Mowbray", "Coalville", "Northampton", "Peterborough", "Cambridge", "Oxford", "York", "Lincoln")
+DOMAINS = ("gmail.com", "outlook.com", "hotmail.co.uk", "yahoo.co.uk", "icloud.com", "btinternet.com", "dmu.ac.uk",
+           "live.co.uk", "sky.com", "protonmail.com")
+
+
+# Function to pick from a pool with a skewed (Zipf-like) distribution, so the first values are the most common
+def _skewed(rng, pool):
+    return pool[min(int(rng.paretovariate(1.2)) - 1, len(pool) - 1)]
+
+
+# Function to read a number of contacts written like 5000, 10k or 1M
+def parse_count(text):
+    text = str(text).strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    number = float(text[:-1]) if scale > 1 else float(text)
+    if number < 1 or int(number * scale) != number * scale:
+        raise argparse.ArgumentTypeError(f"not a number of contacts: {text!r}")
+    return int(number * scale)
+
+
+# Function to yield count synthetic contacts as value tuples in FIELDS order
+def generate_contacts(count, seed=0):
+    rng = random.Random(seed)
+    for number in range(count):
+        first = _skewed(rng, FIRST_NAMES)
+        last = _skewed(rng, LAST_NAMES)
+        address = f"{rng.randint(1, 300)} {_skewed(rng, STREETS)}, {_skewed(rng, TOWNS)}" if rng.random() < 0.8 else ""
+        mobile = f"07{rng.randint(100, 999)} {rng.randint(100000, 999999)}"
+        secondary = f"0116 {rng.randint(200, 499)} {rng.randint(1000, 9999)}" if rng.random() < 0.3 else ""
+        email = f"{first.lower()}.{last.lower()}{number}@{_skewed(rng, DOMAINS)}" if rng.random() < 0.7 else ""
+        yield (first, last, address, mobile, secondary, email, "")
+
+
+# Write a contacts file of synthetic contacts
+def main():
+    parser = argparse.ArgumentParser(description="Write a file of synthetic contacts for benchmarking.")
+    parser.add_argument("count", type=parse_count, help="number of contacts, e.g. 10k, 100k or 1M")
+    parser.add_argument("destination", help="file to write (.txt or .abk)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+    write_rows(args.destination, generate_contacts(args.count, args.seed))
+    print(f"Wrote {args.count} contacts to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+'''
+Brief Description of what this code does:
+This code reads and writes the binary columnar contacts format (.abk),
+an alternative to the comma separated contacts.txt. Each contact field
+is stored as its own column: an offset table followed by the UTF-8
+bytes of every value. ColumnarFile memory-maps the file so the address
+book can open immediately and decode single values or rows on demand,
+and a column can be searched for a substring in place, without decoding
+it or building an index over it.
+Run as a script it converts between contacts.txt and .abk files.
+'''
+
+import argparse
+import mmap
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_right
+from Contact import FIELDS
+
+# File signature, format version and header layout: magic, version, column count, row count
+MAGIC = b"ABKC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+
+# File extension used for the columnar format
+EXTENSION = ".abk"
+
+
+# Function to check whether a path names a columnar contacts file
+def is_columnar(file_path):
+    return os.path.splitext(file_path)[1].lower() == EXTENSION
+
+
+# Function to write rows (a sequence of value tuples in FIELDS order) to a columnar file
+def write_columnar(file_path, rows):
+    rows = rows if isinstance(rows, (list, tuple)) else list(rows)
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(FIELDS), len(rows)))
+        # Reserve the column directory, then fill it in once every column's position is known
+        directory_position = file.tell()
+        file.write(bytes(8 * len(FIELDS)))
+        column_starts = array("Q")
+        for column in range(len(FIELDS)):
+            _pad_to_eight(file)
+            column_starts.append(file.tell())
+            encoded = [str(row[column]).encode("utf-8") for row in rows]
+            offsets = array("Q", [0])
+            for value in encoded:
+                offsets.append(offsets[-1] + len(value))
+            file.write(offsets.tobytes())
+            file.write(b"".join(encoded))
+        file.seek(directory_position)
+        file.write(column_starts.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, file_path)
+
+
+# Function to pad a file with zero bytes so the next offset table is 8-byte aligned
+def _pad_to_eight(file):
+    padding = -file.tell() % 8
+    if padding:
+        file.write(bytes(padding))
+
+
+# Class giving read-only, lazily decoded access to a memory-mapped columnar contacts file
+class ColumnarFile:
+    # Open and map a columnar file; only the header and column directory are read up front
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{file_path} is empty, not a columnar contacts file")
+        magic, version, columns, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or columns != len(FIELDS):
+            self.close()
+            raise ValueError(f"{file_path} is not a version {VERSION} columnar contacts file")
+        view = memoryview(self._map)
+        directory = view[HEADER.size:HEADER.size + 8 * columns].cast("Q")
+        # For each column: its offset table and the position of its value bytes
+        self._offsets = []
+        self._blobs = []
+        for column in range(columns):
+            start = directory[column]
+            self._offsets.append(view[start:start + 8 * (self.count + 1)].cast("Q"))
+            self._blobs.append(start + 8 * (self.count + 1))
+        directory.release()
+
+    # Number of rows in the file
+    def __len__(self):
+        return self.count
+
+    # Decode one value by row number and column number
+    def value(self, row, column):
+        offsets = self._offsets[column]
+        blob = self._blobs[column]
+        return self._map[blob + offsets[row]:blob + offsets[row + 1]].decode("utf-8")
+
+    # Decode one row as a tuple of values in FIELDS order
+    def row(self, row):
+        return tuple(self.value(row, column) for column in range(len(FIELDS)))
+
+    # Decode a whole column in row order
+    def column(self, column):
+        offsets = self._offsets[column]
+        blob = self._blobs[column]
+        data = self._map
+        return [data[blob + offsets[row]:blob + offsets[row + 1]].decode("utf-8") for row in range(self.count)]
+
+    # Return the numbers, in order, of the rows whose value in a column contains a lower-cased needle, ignoring case.
+    # The column's bytes are searched in place; the bytes search only folds ASCII case, so values holding other
+    # characters are decoded and checked one by one, as is every value the search finds.
+    def search(self, column, needle):
+        if not needle:
+            return list(range(self.count))
+        non_ascii = rb"[\x80-\xff]"
+        pattern = re.escape(needle.encode("utf-8")) + b"|" + non_ascii if needle.isascii() else non_ascii
+        pattern = re.compile(pattern, re.IGNORECASE)
+        offsets = self._offsets[column]
+        blob = self._blobs[column]
+        position, end = blob, blob + offsets[self.count]
+        rows = []
+        while position < end:
+            found = pattern.search(self._map, position, end)
+            if found is None:
+                break
+            row = bisect_right(offsets, found.start() - blob) - 1
+            if needle in self.value(row, column).lower():
+                rows.append(row)
+            # Carry on from the next row, so each row is found at most once
+            position = blob + offsets[row + 1]
+        return rows
+
+    # Unmap and close the file
+    def close(self):
+        for offsets in getattr(self, "_offsets", []):
+            offsets.release()
+        self._offsets = []
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+# Convert a contacts file between the comma separated and columnar formats, chosen by file extension
+def main():
+    from contact_store import ContactStore
+
+    parser = argparse.ArgumentParser(description="Convert contacts between contacts.txt and the columnar .abk format.")
+    parser.add_argument("source", help="file to read (.txt or .abk)")
+    parser.add_argument("destination", help="file to write (.txt or .abk)")
+    args = parser.parse_args()
+
+    store = ContactStore()
+    count = store.load(args.source)
+    store.save(args.destination)
+    store.close()
+    print(f"Converted {count} contacts from {args.source} to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,12 @@ from Contact import Contact  # Import the Contact class from contact.py
 
 # Dialog class for entering or editing contact information - P2785659
 class ContactEntryDialog(tk.simpledialog.Dialog):
-    # Initialise the dialog with a master window, a title, and an optional initial contact
-    def __init__(self, master, title, initial_contact=None):
+    # Initialise the dialog with a master window, a title, an optional initial contact, and an optional thumbnail cache
+    # with the BackgroundWorker which makes thumbnails for it
+    def __init__(self, master, title, initial_contact=None, thumbnail_cache=None, workers=None):
         self.initial_contact = initial_contact
+        self.thumbnail_cache = thumbnail_cache
+        self.workers = workers
         self.picture_path_var = tk.StringVar()  # Initialise picture path variable
         # Call the constructor of the parent class (tk.simpledialog.Dialog)
         super().__init__(master, title)
@@ -69,6 +72,11 @@ class ContactEntryDialog(tk.simpledialog.Dialog):
             self.picture_path_var.set(picture_path)
             self.picture_entry.delete(0, tk.END)
             self.picture_entry.insert(tk.END, picture_path)
+            # Create the thumbnail now on a worker thread, so viewing the contact later does not have to scale the full
+            # picture. Any error (OSError for a missing file, PIL's errors for a file which is not a picture or is too
+            # large to decode) is ignored, and the path is kept as entered.
+            if self.thumbnail_cache is not None and self.workers is not None:
+                self.workers.submit(self.thumbnail_cache.generate, picture_path, on_error=lambda e: None)
             self.lift()  
 
     # Override the apply method to retrieve and store the entered information - P2785659
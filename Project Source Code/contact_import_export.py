@@ -0,0 +1,235 @@
+'''
+Brief Description of what this code does:
+This code streams contacts in and out of CSV and vCard (.vcf) files.
+Rows are read through generators in fixed-size chunks and written one
+at a time, so files of several gigabytes are handled in constant memory,
+and an optional progress callback is told how far through the file the
+work is. Fields are written with proper CSV quoting, so addresses
+containing commas survive a round trip. import_contacts hands the whole
+stream to ContactStore.add_many, which builds its indexes once at the
+end instead of after every row.
+'''
+
+import csv
+import os
+from itertools import chain
+from Contact import FIELDS
+from contact_store import file_encoding
+
+# Column headings used in exported CSV files, in FIELDS order
+HEADINGS = ("First Name", "Last Name", "Address", "Mobile Number", "Secondary Number", "Email Address", "Picture Path")
+
+# Number of rows handed on at a time while streaming
+CHUNK_SIZE = 10000
+
+
+# Function to check whether a path names a vCard file
+def is_vcard(file_path):
+    return os.path.splitext(file_path)[1].lower() in (".vcf", ".vcard")
+
+
+# Function to read CSV rows in chunks; progress(rows, bytes_read, total_bytes) is called after every chunk
+def read_csv(file_path, chunk_size=CHUNK_SIZE, progress=None, header=None):
+    total = os.path.getsize(file_path)
+    count = 0
+    with open(file_path, "r", newline="", encoding=file_encoding(file_path)) as file:
+        reader = csv.reader(file)
+        chunk = []
+        for row in reader:
+            if not any(row):
+                continue
+            if count == 0 and not chunk and (header or (header is None and _is_heading(row))):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                count += len(chunk)
+                yield chunk
+                chunk = []
+                if progress:
+                    progress(count, file.buffer.tell(), total)
+        if chunk:
+            count += len(chunk)
+            yield chunk
+        if progress:
+            progress(count, total, total)
+
+
+# Function to write rows (value tuples in FIELDS order) to a CSV file and return how many were written
+def write_csv(file_path, rows, progress=None, header=True, chunk_size=CHUNK_SIZE):
+    count = 0
+    with open(file_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        if header:
+            writer.writerow(HEADINGS)
+        for values in rows:
+            writer.writerow(values)
+            count += 1
+            if progress and count % chunk_size == 0:
+                progress(count, None, None)
+    if progress:
+        progress(count, None, None)
+    return count
+
+
+# Function to read vCards in chunks of rows in FIELDS order; progress is called as for read_csv
+def read_vcards(file_path, chunk_size=CHUNK_SIZE, progress=None):
+    total = os.path.getsize(file_path)
+    count = 0
+    chunk = []
+    card = None
+    with open(file_path, "r", encoding=file_encoding(file_path)) as file:
+        for line in _unfold(file):
+            name, params, value = _split_property(line)
+            if name == "BEGIN" and value.upper() == "VCARD":
+                card = {"TEL": []}
+            elif card is None:
+                continue
+            elif name == "END" and value.upper() == "VCARD":
+                chunk.append(_card_values(card))
+                card = None
+                if len(chunk) >= chunk_size:
+                    count += len(chunk)
+                    yield chunk
+                    chunk = []
+                    if progress:
+                        progress(count, file.buffer.tell(), total)
+            elif name == "TEL":
+                card["TEL"].append((params, _unescape(value)))
+            elif name in ("N", "ADR"):
+                card.setdefault(name, [_unescape(part) for part in _split_unescaped(value, ";")])
+            elif name == "PHOTO":
+                # Only photos given by location can become a picture path; embedded base64 photos are skipped
+                if not any(param.startswith("ENCODING") for param in params):
+                    card.setdefault(name, value)
+            elif name in ("FN", "EMAIL"):
+                card.setdefault(name, _unescape(value))
+    if chunk:
+        count += len(chunk)
+        yield chunk
+    if progress:
+        progress(count, total, total)
+
+
+# Function to write rows (value tuples in FIELDS order) as vCard 3.0 and return how many were written
+def write_vcards(file_path, rows, progress=None, chunk_size=CHUNK_SIZE):
+    count = 0
+    with open(file_path, "w", newline="\r\n", encoding="utf-8") as file:
+        for first, last, address, mobile, secondary, email, picture in (tuple(values) for values in rows):
+            lines = ["BEGIN:VCARD", "VERSION:3.0", f"N:{_escape(last)};{_escape(first)};;;", f"FN:{_escape(f'{first} {last}'.strip())}"]
+            if address:
+                lines.append(f"ADR:;;{_escape(address)};;;;")
+            if mobile:
+                lines.append(f"TEL;TYPE=CELL:{_escape(mobile)}")
+            if secondary:
+                lines.append(f"TEL;TYPE=HOME:{_escape(secondary)}")
+            if email:
+                lines.append(f"EMAIL:{_escape(email)}")
+            if picture:
+                lines.append(f"PHOTO;VALUE=URI:{picture}")
+            lines.append("END:VCARD")
+            file.write("\n".join(lines) + "\n")
+            count += 1
+            if progress and count % chunk_size == 0:
+                progress(count, None, None)
+    if progress:
+        progress(count, None, None)
+    return count
+
+
+# Function to stream a CSV or vCard file into a store and return how many contacts were imported
+def import_contacts(store, file_path, chunk_size=CHUNK_SIZE, progress=None):
+    reader = read_vcards if is_vcard(file_path) else read_csv
+    # One add_many call over the whole stream, so the indexes are built once at the end
+    return store.add_many(chain.from_iterable(reader(file_path, chunk_size, progress)))
+
+
+# Function to export every contact of a store, in display order, to a CSV or vCard file
+def export_contacts(store, file_path, progress=None):
+    rows = (store.values(contact_id) for contact_id in store.ids())
+    if is_vcard(file_path):
+        return write_vcards(file_path, rows, progress)
+    return write_csv(file_path, rows, progress)
+
+
+# Function to check whether a CSV row is a heading row rather than a contact
+def _is_heading(row):
+    names = {heading.lower() for heading in HEADINGS} | set(FIELDS)
+    return all(cell.strip().lower() in names for cell in row if cell.strip())
+
+
+# Function to join folded vCard lines (continuations start with a space or tab)
+def _unfold(file):
+    current = None
+    for line in file:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+# Function to split a vCard line into its upper-cased property name, its parameters and its value
+def _split_property(line):
+    head, _, value = line.partition(":")
+    name, *params = head.split(";")
+    # Drop a group prefix such as "item1.EMAIL"
+    name = name.rpartition(".")[2].upper()
+    return name, [param.upper() for param in params], value
+
+
+# Function to split a vCard value on a separator which is not escaped with a backslash
+def _split_unescaped(value, separator):
+    parts = [""]
+    escaped = False
+    for char in value:
+        if escaped:
+            parts[-1] += "\\" + char
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == separator:
+            parts.append("")
+        else:
+            parts[-1] += char
+    return parts
+
+
+# Function to escape a vCard text value
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace(",", "\\,").replace(";", "\\;")
+
+
+# Function to undo _escape
+def _unescape(value):
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == "\\":
+            char = next(chars, "")
+            result.append("\n" if char in ("n", "N") else char)
+        else:
+            result.append(char)
+    return "".join(result)
+
+
+# Function to turn the properties collected from one vCard into field values in FIELDS order
+def _card_values(card):
+    last, first = (card.get("N", []) + ["", ""])[:2]
+    if not first and not last and card.get("FN"):
+        first, _, last = card["FN"].partition(" ")
+    address = ", ".join(part for part in card.get("ADR", []) if part)
+    # The mobile number is the first CELL number, or the first number without a type; the next one is the secondary number
+    phones = list(card["TEL"])
+    mobile_index = next((i for i, (params, number) in enumerate(phones) if any("CELL" in param for param in params)), None)
+    if mobile_index is None:
+        mobile_index = next((i for i, (params, number) in enumerate(phones) if not params), None)
+    mobile = phones.pop(mobile_index)[1] if mobile_index is not None else ""
+    secondary = phones[0][1] if phones else ""
+    picture = card.get("PHOTO", "")
+    if picture.startswith("file://"):
+        picture = picture[len("file://"):]
+    return (first, last, address, mobile, secondary, card.get("EMAIL", ""), picture)
@@ -0,0 +1,280 @@
+'''
+Brief Description of what this code does:
+This code defines the ContactJournal class, an append-only change log
+kept next to the contacts file (e.g. contacts.txt.journal). Every add,
+edit and delete made through the ContactStore is written to the journal
+as a JSON line as it happens, and lines are fsynced in batches, so a
+crash loses at most one batch of edits. Saving therefore costs
+O(changes) instead of rewriting the whole book. A background thread
+periodically compacts the journal into the main contacts file.
+
+The first line of the journal records the size and modification time of
+the contacts file it applies to, together with the id each row of that
+file had. On start-up the contacts file is loaded with those ids and the
+remaining lines are replayed on top of it. A "restore" line (an undone
+Erase All) puts back the contacts removed by the last "clear" line
+before it, so undoing an erase does not have to journal every contact.
+Compaction writes the new journal before the new contacts file is
+renamed into place, so a crash at any point leaves a journal which
+matches the contacts file on disk.
+'''
+
+import json
+import logging
+import os
+import threading
+from contact_store import write_rows
+
+logger = logging.getLogger(__name__)
+
+
+# Function to encode a list of ids as [start, stop] runs of consecutive ids
+def encode_ranges(contact_ids):
+    ranges = []
+    for contact_id in contact_ids:
+        if ranges and ranges[-1][1] == contact_id:
+            ranges[-1][1] += 1
+        else:
+            ranges.append([contact_id, contact_id + 1])
+    return ranges
+
+
+# Function to decode [start, stop] runs back into ids; a single run is returned as a range
+def decode_ranges(ranges):
+    if len(ranges) == 1:
+        return range(*ranges[0])
+    return [contact_id for start, stop in ranges for contact_id in range(start, stop)]
+
+
+# Function to count the "clear" changes not yet followed by a "restore" change
+def open_clears(changes):
+    clears = 0
+    for change in changes:
+        if change["op"] == "clear":
+            clears += 1
+        elif change["op"] == "restore" and clears:
+            clears -= 1
+    return clears
+
+
+# Function to describe a contacts file by size and modification time, used to tell whether a journal applies to it
+def file_signature(file_path):
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# Class recording the changes made to a ContactStore in an append-only journal
+class ContactJournal:
+    # Initialise a journal for a store and its contacts file
+    def __init__(self, store, contacts_file, journal_path=None, batch_size=20, flush_interval=1.0, compact_after=1000, compact_interval=30.0):
+        self.store = store
+        self.contacts_file = contacts_file
+        self.journal_path = journal_path or contacts_file + ".journal"
+        self.batch_size = batch_size  # Lines buffered before an fsync
+        self.flush_interval = flush_interval  # Seconds between background fsyncs of a partial batch
+        self.compact_after = compact_after  # Journal lines which trigger a background compaction
+        self.compact_interval = compact_interval  # Seconds between checks for compaction
+        self._file = None
+        self._buffer = []
+        self._lines = 0  # Lines written since the last compaction
+        self._captured = None  # Lines recorded while a compaction is in progress
+        self._clears = 0  # "clear" lines in the journal which a "restore" line could still undo
+        self._cleared = []  # States removed by replayed "clear" lines, for replayed "restore" lines
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._subscribed = False  # True once open has loaded the contacts and started recording changes
+
+    # Load the contacts file into the store, replay the journal on top of it and start recording changes; returns the contact count.
+    # chunk_size and progress are passed on to ContactStore.load, so the contacts can be shown while they load.
+    def open(self, chunk_size=None, progress=None):
+        header, changes = self._read()
+        if header is not None and changes:
+            # Unsaved changes: give the file's rows their recorded ids so the journal lines still refer to the right contacts
+            self.store.load(self.contacts_file, decode_ranges(header["ids"]), chunk_size, progress)
+            for change in changes:
+                self._apply(change)
+            self._cleared = []
+            # Rewrite the journal without any torn line a crash may have left, so new lines append cleanly
+            self._start_journal(header["file"], header["ids"], [json.dumps(change) + "\n" for change in changes])
+        else:
+            # No changes to replay, so load normally and start a fresh journal for the file
+            first_id = self.store.next_id
+            count = self.store.load(self.contacts_file, chunk_size=chunk_size, progress=progress)
+            self._start_journal(file_signature(self.contacts_file), encode_ranges(range(first_id, first_id + count)), [])
+        self.store.subscribe(self.record)
+        self._subscribed = True
+        self._thread = threading.Thread(target=self._run, name="contact-journal", daemon=True)
+        self._thread.start()
+        return len(self.store)
+
+    # Store listener recording one change as a journal line
+    def record(self, action, contact_id, old_values, new_values):
+        change = {"op": action}
+        if contact_id is not None:
+            change["id"] = contact_id
+        if new_values is not None:
+            change["values"] = list(new_values)
+        lines = [json.dumps(change) + "\n"]
+        with self._lock:
+            if action == "clear":
+                self._clears += 1
+            elif action == "restore":
+                if self._clears:
+                    self._clears -= 1
+                else:
+                    # The "clear" line was compacted away, so journal the restored contacts themselves
+                    contact_ids, rows = self.store.snapshot()
+                    lines = [json.dumps({"op": "add", "id": contact_id, "values": list(values)}) + "\n" for contact_id, values in zip(contact_ids, rows)]
+            self._buffer.extend(lines)
+            if self._captured is not None:
+                self._captured.extend(lines)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    # Write buffered lines to the journal and fsync it
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    # Rewrite the contacts file from the store and start a new journal containing only the changes made meanwhile
+    def compact(self):
+        with self._compact_lock:
+            with self.store.lock, self._lock:
+                self._flush_locked()
+                # A mapped columnar contacts file is read from while it is mapped, so it cannot be replaced
+                self.store.release(self.contacts_file)
+                contact_ids, rows = self.store.snapshot()
+                self._captured = []
+                clears, self._clears = self._clears, 0  # Earlier "clear" lines will not be in the new journal
+            # Written beside the contacts file with the same extension, so it is in the same format
+            base, extension = os.path.splitext(self.contacts_file)
+            temp_path = base + ".compacting" + extension
+            try:
+                # The contacts file is written outside the locks, so editing carries on while it is saved
+                write_rows(temp_path, rows)
+                # Renaming keeps a file's size and modification time, so this is the signature once it is in place
+                signature = file_signature(temp_path)
+                with self._lock:
+                    self._flush_locked()
+                    captured = self._captured
+                    self._start_journal(signature, encode_ranges(contact_ids), captured, temp_path)
+                    self._captured = None
+            except BaseException:
+                with self._lock:
+                    self._captured = None
+                    self._clears += clears
+                raise
+
+    # Stop the background thread and fsync any buffered lines; the journal is replayed on the next open
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # A failed open never started recording changes
+        if self._subscribed:
+            self.store.unsubscribe(self.record)
+            self._subscribed = False
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # Return the journal header and its change lines, or (None, []) if there is no journal for the current contacts file
+    def _read(self):
+        # A compaction stopped between replacing the contacts file and the journal leaves the new journal at its temporary path
+        for journal_path in (self.journal_path, self.journal_path + ".tmp"):
+            header, changes = self._read_journal(journal_path)
+            if header is not None:
+                return header, changes
+        return None, []
+
+    # Return the header and change lines of a journal file, or (None, []) if it does not apply to the current contacts file
+    def _read_journal(self, journal_path):
+        if not os.path.exists(journal_path):
+            return None, []
+        with open(journal_path, "r", encoding="utf-8") as file:
+            lines = file.readlines()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return None, []
+        if header.get("file") != file_signature(self.contacts_file):
+            # The contacts file was replaced after this journal was written, so it already holds these changes
+            return None, []
+        changes = []
+        for line in lines[1:]:
+            try:
+                changes.append(json.loads(line))
+            except ValueError:
+                # A torn last line left by a crash mid-write
+                break
+        return header, changes
+
+    # Apply one journal line to the store
+    def _apply(self, change):
+        action = change["op"]
+        if action == "add":
+            self.store.add(change["values"], change["id"])
+        elif action == "update":
+            self.store.update(change["id"], change["values"])
+        elif action == "delete":
+            self.store.delete(change["id"])
+        elif action == "clear":
+            self._cleared.append(self.store.clear())
+        elif action == "restore":
+            self.store.restore(self._cleared.pop())
+
+    # Replace the journal with a header (file signature and id ranges of its rows) and the given change lines. When
+    # compacting, the new contacts file at contacts_temp is put in place only once its journal has been written, so a
+    # crash at any point leaves a journal matching whichever contacts file is there.
+    def _start_journal(self, signature, id_ranges, lines, contacts_temp=None):
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(json.dumps({"file": signature, "ids": id_ranges}) + "\n")
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+        if contacts_temp is not None:
+            try:
+                os.replace(contacts_temp, self.contacts_file)
+            except OSError:
+                # The old contacts file and journal are still in place and still match
+                os.remove(temp_path)
+                raise
+        # Windows cannot replace a file which is open
+        if self._file is not None:
+            self._file.close()
+        os.replace(temp_path, self.journal_path)
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        self._lines = len(lines)
+        self._clears = open_clears(json.loads(line) for line in lines)
+
+    # Write buffered lines to the journal and fsync it; called with the journal lock held
+    def _flush_locked(self):
+        if self._buffer and self._file is not None:
+            self._file.writelines(self._buffer)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._lines += len(self._buffer)
+            self._buffer = []
+
+    # Background loop fsyncing partial batches and compacting once the journal has grown long enough
+    def _run(self):
+        waited = 0.0
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                waited += self.flush_interval
+                if waited >= self.compact_interval:
+                    waited = 0.0
+                    if self._lines >= self.compact_after:
+                        self.compact()
+            except Exception:
+                # E.g. the contacts file is locked by another program; the journal stays valid, so log it and try again later
+                logger.exception("Could not flush or compact the journal %s", self.journal_path)
@@ -0,0 +1,122 @@
+'''
+Brief Description of what this code does:
+This code turns the phone numbers and email addresses typed into the
+address book into normalised lookup keys: phone numbers become
+E.164-style "+<country code><number>" strings ("07700 900123" and
+"+44 7700 900123" give the same key) and email addresses are trimmed
+and lower-cased. KeyIndex keeps hash indexes from these keys to contact
+ids, so finding who owns a number or an email address is a dictionary
+lookup rather than a scan. The contact stores keep it up to date like
+their other indexes.
+'''
+
+import re
+from Contact import FIELDS
+
+# Country calling code assumed for numbers written with a national trunk prefix (a leading 0)
+DEFAULT_COUNTRY_CODE = "44"
+
+# Fields holding phone numbers and email addresses
+PHONE_FIELDS = ("mobile_number", "secondary_number")
+EMAIL_FIELDS = ("email_address",)
+
+# Shortest and longest numbers accepted, counting every digit after the "+" (E.164 allows up to 15)
+MIN_PHONE_DIGITS = 5
+MAX_PHONE_DIGITS = 15
+
+_EXTENSION = re.compile(r"\s*(?:ext\.?|extension|x|#)\s*\d+\s*$", re.IGNORECASE)
+_NON_DIGITS = re.compile(r"\D")
+
+
+# Function to return the E.164-style key of a phone number, or "" if it does not look like a phone number
+def normalise_phone(number, country_code=DEFAULT_COUNTRY_CODE):
+    text = _EXTENSION.sub("", str(number).strip())
+    if not text:
+        return ""
+    international = text.startswith("+")
+    # "+44 (0)20 ..." is a common way of writing a number with its optional trunk prefix
+    text = text.replace("(0)", "")
+    digits = _NON_DIGITS.sub("", text)
+    if not digits:
+        return ""
+    if not international:
+        if digits.startswith("00"):
+            digits = digits[2:]  # International dialling prefix
+        elif digits.startswith("0"):
+            digits = country_code + digits[1:]  # National number with a trunk prefix
+    if not MIN_PHONE_DIGITS <= len(digits) <= MAX_PHONE_DIGITS:
+        return ""
+    return "+" + digits
+
+
+# Function to return the canonical key of an email address, or "" if it does not look like an email address
+def normalise_email(email):
+    text = str(email).strip()
+    if text.lower().startswith("mailto:"):
+        text = text[len("mailto:"):]
+    text = text.strip().strip("<>").lower()
+    local, at, domain = text.rpartition("@")
+    if not at or not local or "." not in domain or any(char.isspace() for char in text):
+        return ""
+    return text
+
+
+# Function to return the normalised phone keys of a contact's values (a tuple in FIELDS order)
+def phone_keys(values, country_code=DEFAULT_COUNTRY_CODE):
+    keys = (normalise_phone(values[FIELDS.index(field)], country_code) for field in PHONE_FIELDS)
+    return {key for key in keys if key}
+
+
+# Function to return the normalised email keys of a contact's values (a tuple in FIELDS order)
+def email_keys(values):
+    keys = (normalise_email(values[FIELDS.index(field)]) for field in EMAIL_FIELDS)
+    return {key for key in keys if key}
+
+
+# Class implementing hash indexes from normalised phone and email keys to contact ids
+class KeyIndex:
+    # Initialise an empty index; country_code is used for numbers written without one
+    def __init__(self, country_code=DEFAULT_COUNTRY_CODE):
+        self.country_code = country_code
+        self.fields = PHONE_FIELDS + EMAIL_FIELDS  # Fields the index depends on
+        self.clear()
+
+    # Add a contact's field values (a tuple in FIELDS order) to the index
+    def add(self, contact_id, values):
+        for key in phone_keys(values, self.country_code):
+            self._phones.setdefault(key, set()).add(contact_id)
+        for key in email_keys(values):
+            self._emails.setdefault(key, set()).add(contact_id)
+
+    # Add many (contact id, values) pairs at once
+    def add_many(self, items):
+        for contact_id, values in items:
+            self.add(contact_id, values)
+
+    # Remove a contact's field values (as they were when added) from the index
+    def remove(self, contact_id, values):
+        for keys, table in ((phone_keys(values, self.country_code), self._phones), (email_keys(values), self._emails)):
+            for key in keys:
+                ids = table.get(key)
+                if ids is not None:
+                    ids.discard(contact_id)
+                    if not ids:
+                        del table[key]
+
+    # Remove many (contact id, values) pairs at once
+    def remove_many(self, items):
+        for contact_id, values in items:
+            self.remove(contact_id, values)
+
+    # Remove everything from the index
+    def clear(self):
+        self._phones = {}  # Phone key -> set of contact ids with that number
+        self._emails = {}  # Email key -> set of contact ids with that address
+
+    # Return the set of ids of contacts with the phone number, however it was written
+    def find_by_phone(self, number):
+        return set(self._phones.get(normalise_phone(number, self.country_code), ()))
+
+    # Return the set of ids of contacts with the email address, ignoring case and surrounding spaces
+    def find_by_email(self, email):
+        return set(self._emails.get(normalise_email(email), ()))
@@ -0,0 +1,683 @@
+'''
+Brief Description of what this code does:
+This code defines the ContactStore class, a GUI-free engine holding
+all contact state for the address book. It can add, update, delete,
+look up, query, sort and iterate contacts, and load them from or save
+them to the contacts file. It does not import tkinter or PIL, so it
+can be driven from batch jobs and benchmarks as well as from
+AddressBookApp, which delegates all of its contact handling to it.
+Books saved in the columnar .abk format are memory-mapped, and Contact
+objects are only created for the rows which are viewed or edited; the
+filter searches the mapped columns directly rather than indexing them.
+'''
+
+import codecs
+import csv
+import locale
+import os
+import threading
+from bisect import bisect_right
+from itertools import islice
+from Contact import Contact, FIELDS, SEARCH_FIELDS
+from columnar_file import ColumnarFile, is_columnar, write_columnar
+from contact_keys import KeyIndex
+from contact_table import CONTACT_TYPES, ContactTable
+from facet_index import FACETS, FacetIndex
+from fuzzy_search import FuzzyIndex
+from ngram_index import NgramIndex, matches
+from sorted_index import SortedIndex, sort_key
+
+# Fields which have a sorted index by default; the first one gives the display order
+SORT_FIELDS = ("first_name", "last_name")
+
+# An index is rebuilt rather than updated contact by contact when more than 1/REBUILD_FRACTION of the book changes at once
+REBUILD_FRACTION = 4
+
+# Contacts deleted at once from which the indexes filter out all of them in one pass, rather than removing each in turn
+BULK_REMOVE = 32
+
+# Rows add_many reads before taking the lock to add them, at least; chunks grow with the book, so the sorted indexes
+# are merged with new rows only a few times however long the stream is
+ADD_CHUNK = 10000
+
+# Contacts checked by scan_query and scan_sorted between the chunks they yield
+SCAN_CHUNK = 2000
+
+# Bytes checked at a time when working out the encoding of a contacts file
+ENCODING_BLOCK = 1 << 20
+
+# Attributes holding the contacts and their indexes, swapped out as a whole by clear and back in by restore
+_STATE_ATTRIBUTES = ("_contacts", "_mapped", "_mapped_base", "_detached", "ngram_index", "fuzzy_index", "key_index",
+                     "sort_indexes", "facet_indexes", "_display_index", "_indexes", "_pending")
+
+
+# Function to turn a Contact into a tuple of field values in FIELDS order
+def contact_values(contact):
+    return tuple(getattr(contact, field) for field in FIELDS)
+
+
+# Function to pad or trim a row read from the contacts file to the number of fields
+def normalise_row(data):
+    data = list(data)[:len(FIELDS)]
+    return data + [""] * (len(FIELDS) - len(data))
+
+
+# Function to return the encoding to read a text contacts file with: UTF-8, as contacts files are saved, or for a file
+# saved by an older version of the app, which used the system's encoding, that encoding (cp1252 where it is UTF-8 anyway).
+# The file is rewritten as UTF-8 the next time it is saved.
+def file_encoding(file_path):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(file_path, "rb") as file:
+        try:
+            for block in iter(lambda: file.read(ENCODING_BLOCK), b""):
+                decoder.decode(block)
+            decoder.decode(b"", final=True)
+            return "utf-8"
+        except UnicodeDecodeError:
+            pass
+    legacy = locale.getpreferredencoding(False)
+    return "cp1252" if codecs.lookup(legacy).name == "utf-8" else legacy
+
+
+# Function to write rows (value tuples in FIELDS order) to a comma separated or columnar (.abk) file,
+# replacing it only once the new file is complete
+def write_rows(file_path, rows):
+    if is_columnar(file_path):
+        write_columnar(file_path, rows)
+        return
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "w", newline="", encoding="utf-8") as file:
+        # Fields holding commas or quotes are quoted, so they no longer break the row apart
+        csv.writer(file).writerows(rows)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, file_path)
+
+
+# Class holding the contacts of an address book without any user interface
+class ContactStore:
+    # Initialise an empty store; contacts are identified by integer ids which stay stable while the store is open.
+    # With compact=True contacts are kept in a ContactTable of arrays instead of one Contact object each.
+    def __init__(self, sort_fields=SORT_FIELDS, compact=False):
+        self.compact = compact
+        self._contacts = ContactTable() if compact else {}
+        self._next_id = 0
+        # Memory-mapped columnar file whose rows have ids from _mapped_base onwards, if one is loaded
+        self._mapped = None
+        self._mapped_base = 0
+        # Ids of mapped rows which have been turned into Contact objects or deleted
+        self._detached = set()
+        # Inverted trigram index answering the substring filter, checking its candidates against the store's values
+        self.ngram_index = NgramIndex(self.values)
+        # Name vocabulary index answering fuzzy and phonetic searches
+        self.fuzzy_index = FuzzyIndex()
+        # Hash indexes from normalised phone numbers and email addresses to contacts
+        self.key_index = KeyIndex()
+        # Sorted indexes by field; contacts are displayed in the order of the first one
+        self.sort_indexes = {field: SortedIndex(field) for field in sort_fields}
+        self._display_index = self.sort_indexes[sort_fields[0]]
+        # Group indexes by facet (surname initial, email domain, town), giving grouped views with a count per group
+        self.facet_indexes = {facet: FacetIndex(facet) for facet in FACETS}
+        # Indexes kept up to date on every change; each has add, add_many, remove and clear
+        self._indexes = [self.ngram_index, self.fuzzy_index, self.key_index, *self.sort_indexes.values(), *self.facet_indexes.values()]
+        # Indexes whose build is deferred until they are first used, so loading only builds the sorted indexes
+        self._pending = {self.ngram_index, self.fuzzy_index, self.key_index, *self.facet_indexes.values()}
+        # Callbacks told about every change, e.g. the journal
+        self._listeners = []
+        # Lock held while the contacts change, so other threads can take consistent snapshots
+        self.lock = threading.RLock()
+
+    # Number of contacts in the store
+    def __len__(self):
+        mapped = self._mapped.count - len(self._detached) if self._mapped is not None else 0
+        return len(self._contacts) + mapped
+
+    # Iterate over the contacts in display order
+    def __iter__(self):
+        for contact_id in self._display_index.ids():
+            yield self.get(contact_id)
+
+    # Check whether a contact id is present in the store
+    def __contains__(self, contact_id):
+        return contact_id in self._contacts or self._mapped_row(contact_id) is not None
+
+    # Id which the next added contact will receive
+    @property
+    def next_id(self):
+        return self._next_id
+
+    # Return the ids of contacts between two positions in display order
+    def ids(self, start=0, stop=None):
+        # Taken under the lock, so a load adding contacts on another thread is never seen half-sorted
+        with self.lock:
+            return self._display_index.ids(start, stop)
+
+    # Return the contact with the given id, creating it from the mapped file on first access
+    def get(self, contact_id):
+        contact = self._contacts.get(contact_id)
+        if contact is None:
+            row = self._mapped_row(contact_id)
+            if row is None:
+                raise KeyError(contact_id)
+            self._contacts[contact_id] = Contact(*self._mapped.row(row))
+            self._detached.add(contact_id)
+            # Re-read it, so a compact store returns a view of its table rather than the copied Contact
+            contact = self._contacts[contact_id]
+        return contact
+
+    # Return a contact's field values as a tuple in FIELDS order, without creating a Contact object
+    def values(self, contact_id):
+        contact = self._contacts.get(contact_id)
+        if contact is not None:
+            return contact_values(contact)
+        row = self._mapped_row(contact_id)
+        if row is None:
+            raise KeyError(contact_id)
+        return self._mapped.row(row)
+
+    # Return the text shown for a contact in lists, matching str(Contact)
+    def name(self, contact_id):
+        values = self.values(contact_id)
+        return f"{values[0]} {values[1]}"
+
+    # Return the id of the contact shown at a position in the display order
+    def id_at(self, position):
+        return self._display_index.id_at(position)
+
+    # Return the contact shown at a position in the display order
+    def contact_at(self, position):
+        return self.get(self.id_at(position))
+
+    # Return the position of a contact in the display order
+    def position(self, contact_id):
+        return self._display_index.position(contact_id)
+
+    # Add a sorted index for another field, built once from the current contacts; under the lock, so contacts added
+    # by another thread while it is built are neither missed nor added twice
+    def add_sort_index(self, field):
+        with self.lock:
+            if field not in self.sort_indexes:
+                index = SortedIndex(field)
+                self.sort_indexes[field] = index
+                self._indexes.append(index)
+                self._pending.add(index)
+            return self._ready(self.sort_indexes[field])
+
+    # Return the index grouping the contacts by a facet named in FACETS, built from the current contacts the first time
+    def facet_index(self, facet):
+        if facet not in self.facet_indexes:
+            raise KeyError(f"Unknown facet: {facet}")
+        with self.lock:
+            return self._ready(self.facet_indexes[facet])
+
+    # Register a callback told about every change as callback(action, contact_id, old_values, new_values)
+    # where action is "add", "update", "delete", "clear" or "restore"; for "clear", old_values is the cleared state
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    # Stop telling a callback about changes
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+
+    # Add a contact (a Contact or a sequence of field values) and return its id; an id may be given when replaying changes
+    def add(self, contact, contact_id=None):
+        if not isinstance(contact, CONTACT_TYPES):
+            contact = Contact(*normalise_row(contact))
+        with self.lock:
+            contact_id = self._new_id(contact_id)
+            self._contacts[contact_id] = contact
+            values = contact_values(contact)
+            self._index_add(contact_id, values)
+            self._notify("add", contact_id, None, values)
+        return contact_id
+
+    # Update the fields of a contact in place; values is a sequence in FIELDS order or a dict of field names
+    def update(self, contact_id, values):
+        if not isinstance(values, dict):
+            values = dict(zip(FIELDS, values))
+        for field in values:
+            if field not in FIELDS:
+                raise KeyError(f"Unknown contact field: {field}")
+        with self.lock:
+            contact = self.get(contact_id)
+            old_values = contact_values(contact)
+            for field, value in values.items():
+                setattr(contact, field, value)
+            new_values = contact_values(contact)
+            self._index_update([(contact_id, old_values, new_values)])
+            self._notify("update", contact_id, old_values, new_values)
+        return contact
+
+    # Update many contacts at once from (contact id, values) pairs and return how many were updated. All of them are
+    # changed under one hold of the lock, so no other thread sees only some of them, and nothing is changed if any id
+    # or field is unknown.
+    def update_many(self, updates):
+        updates = [(contact_id, values if isinstance(values, dict) else dict(zip(FIELDS, values))) for contact_id, values in updates]
+        with self.lock:
+            for contact_id, values in updates:
+                if contact_id not in self:
+                    raise KeyError(contact_id)
+                for field in values:
+                    if field not in FIELDS:
+                        raise KeyError(f"Unknown contact field: {field}")
+            changes = []
+            for contact_id, values in updates:
+                contact = self.get(contact_id)
+                old_values = contact_values(contact)
+                for field, value in values.items():
+                    setattr(contact, field, value)
+                changes.append((contact_id, old_values, contact_values(contact)))
+            self._index_update(changes)
+            if self._listeners:
+                for contact_id, old_values, new_values in changes:
+                    self._notify("update", contact_id, old_values, new_values)
+        return len(changes)
+
+    # Delete a contact and return it
+    def delete(self, contact_id):
+        with self.lock:
+            contact = self.get(contact_id)
+            values = contact_values(contact)  # Read first, as a compact table's view is emptied by the del
+            del self._contacts[contact_id]
+            self._index_remove(contact_id, values)
+            self._notify("delete", contact_id, values, None)
+        return contact
+
+    # Delete many contacts at once and return their values in the same order, e.g. to undo an import; nothing is deleted
+    # if any id is unknown
+    def delete_many(self, contact_ids):
+        contact_ids = list(contact_ids)
+        with self.lock:
+            for contact_id in contact_ids:
+                if contact_id not in self:
+                    raise KeyError(contact_id)
+            removed = []
+            for contact_id in contact_ids:
+                removed.append((contact_id, contact_values(self.get(contact_id))))
+                del self._contacts[contact_id]
+            self._index_remove_many(removed)
+            if self._listeners:
+                for contact_id, values in removed:
+                    self._notify("delete", contact_id, values, None)
+        return [values for contact_id, values in removed]
+
+    # Remove every contact from the store and return the removed contacts and indexes, which restore can put back.
+    # Both only swap references, so erasing a whole book and undoing it take the same time as for a single contact.
+    def clear(self):
+        with self.lock:
+            state = self._swap_state(self._empty_state())
+            self._notify("clear", None, state, None)
+        return state
+
+    # Put back the contacts removed by clear; the store must be empty again
+    def restore(self, state):
+        with self.lock:
+            if len(self):
+                raise ValueError("Cleared contacts can only be restored into an empty contact store")
+            self._swap_state(state)
+            self._notify("restore", None, None, None)
+
+    # Release the memory-mapped file, keeping the rows which were already turned into Contact objects
+    def close(self):
+        with self.lock:
+            if self._mapped is not None:
+                self._mapped.close()
+                self._mapped = None
+                self._detached = set()
+
+    # Return the ids of contacts where any of the fields contains the text, ignoring case, in display order
+    def query(self, text, fields=SEARCH_FIELDS):
+        if not text:
+            return self.ids()
+        needle = text.lower()
+        positions = self.ngram_index.positions(fields)
+        if self._mapped is not None:
+            with self.lock:
+                return sorted(self._mapped_query(needle, positions), key=self._display_index.entry)
+        if len(needle) < self.ngram_index.n:
+            # Too short for a trigram, and likely to match much of the book, so check every contact in display order
+            return [contact_id for contact_id in self.ids() if matches(self.values(contact_id), needle, positions)]
+        with self.lock:
+            found = self._ready(self.ngram_index).search(needle, fields)
+            return sorted(found, key=self._display_index.entry)
+
+    # Build the trigram index behind the filter, e.g. on a worker thread once the contacts are shown, so the first filter
+    # does not have to. The lock is only held to read the contacts and to put the finished index in place; changes made
+    # while it is built are replayed onto it, and it is dropped if the book is erased, restored or reloaded meanwhile.
+    def build_search_index(self):
+        changes = []
+
+        def record(*change):
+            changes.append(change)
+
+        with self.lock:
+            index, mapped = self.ngram_index, self._mapped
+            # A mapped file is filtered by searching its columns, so only a book of Contact objects needs the index
+            if index not in self._pending or mapped is not None:
+                return
+            items = [(contact_id, self.values(contact_id)) for contact_id in self._all_ids()]
+            self.subscribe(record)
+        built = NgramIndex(self.values, index.fields, index.n)
+        try:
+            built.add_many(items)
+        except BaseException:
+            with self.lock:
+                self.unsubscribe(record)
+            raise
+        with self.lock:
+            self.unsubscribe(record)
+            if self.ngram_index is not index or index not in self._pending or self._mapped is not mapped:
+                return
+            for action, contact_id, old_values, new_values in changes:
+                if action in ("clear", "restore"):
+                    return
+                if old_values is not None:
+                    built.remove(contact_id, old_values)
+                if new_values is not None:
+                    built.add(contact_id, new_values)
+            self._indexes[self._indexes.index(index)] = self.ngram_index = built
+            self._pending.discard(index)
+
+    # Yield the (sort key, contact id) entries of contacts where any of the fields contains the text, ignoring case,
+    # in display order from just after the entry after, as one list per chunk_size contacts checked. Lists may be empty,
+    # so a caller can stop or pause between them; the lock is only held while a chunk is checked.
+    def scan_query(self, text, fields=SEARCH_FIELDS, after=None, chunk_size=SCAN_CHUNK):
+        needle = text.lower()
+        entries = None
+        with self.lock:
+            positions = self.ngram_index.positions(fields)
+            if self._mapped is not None:
+                entries = sorted(map(self._display_index.entry, self._mapped_query(needle, positions)))
+            elif len(needle) >= self.ngram_index.n:
+                index = self._ready(self.ngram_index)
+                if index.estimate(needle) * REBUILD_FRACTION <= len(self):
+                    # Few enough matches to find and sort them alone rather than walk the whole display order
+                    entries = sorted(map(self._display_index.entry, index.search(needle, fields)))
+        if entries is not None:
+            start = 0 if after is None else bisect_right(entries, tuple(after))
+            for start in range(start, len(entries), chunk_size):
+                yield entries[start:start + chunk_size]
+            return
+        # Broad queries match much of the book, so contacts are checked as the display order is walked
+        yield from self._scan(self._display_index.field, after, chunk_size, needle or None, positions)
+
+    # Yield the (sort key, contact id) entries of every contact sorted by a field, from just after the entry after,
+    # chunk_size at a time; each chunk is read under the lock and placed by its key, so changes between chunks are safe
+    def scan_sorted(self, field, after=None, chunk_size=SCAN_CHUNK):
+        return self._scan(field, after, chunk_size)
+
+    # Return the contacts matching a query in display order
+    def query_contacts(self, text, fields=SEARCH_FIELDS):
+        return [self.get(contact_id) for contact_id in self.query(text, fields)]
+
+    # Return up to limit (contact id, score) pairs whose names best match the text, allowing typos and spelling variants
+    def fuzzy_query(self, text, limit=10):
+        # Under the lock, as the first search builds the index from every contact while other threads may be adding them
+        with self.lock:
+            return self._ready(self.fuzzy_index).search(text, limit)
+
+    # Return the ids of contacts with a phone number, however it was written, in display order
+    def find_by_phone(self, number):
+        with self.lock:
+            return sorted(self._ready(self.key_index).find_by_phone(number), key=self._display_index.entry)
+
+    # Return the ids of contacts with an email address, ignoring case, in display order
+    def find_by_email(self, email):
+        with self.lock:
+            return sorted(self._ready(self.key_index).find_by_email(email), key=self._display_index.entry)
+
+    # Return the ids of contacts between two positions when sorted alphabetically by a field
+    def sorted_ids(self, field, start=0, stop=None):
+        with self.lock:
+            if field in self.sort_indexes:
+                return self._ready(self.sort_indexes[field]).ids(start, stop)
+            if field not in FIELDS:
+                raise KeyError(f"Unknown contact field: {field}")
+            # Fields without an index are sorted on demand
+            position = FIELDS.index(field)
+            ordered = sorted(self._all_ids(), key=lambda x: (sort_key(self.values(x)[position]), x))
+            return ordered[start:stop]
+
+    # Return all contacts sorted alphabetically by a field
+    def sort(self, field):
+        return [self.get(contact_id) for contact_id in self.sorted_ids(field)]
+
+    # Return one page of contact ids sorted by a field
+    def page(self, field, offset, limit):
+        return self.sorted_ids(field, offset, offset + limit)
+
+    # Return the ids of contacts whose field falls alphabetically between low and high, e.g. surnames from "M" to "N"
+    def range(self, field, low=None, high=None):
+        return self.add_sort_index(field).range(low, high)
+
+    # Load contacts from a comma separated or columnar (.abk) file and return how many were read;
+    # contact_ids optionally gives the id of each row, e.g. when replaying a journal written against the file.
+    # With chunk_size, rows are added that many at a time and progress(rows, bytes_read, total_bytes) is called
+    # after each chunk, so other threads can show the contacts while the rest of the file is read.
+    def load(self, file_path="contacts.txt", contact_ids=None, chunk_size=None, progress=None):
+        if not os.path.exists(file_path):
+            return 0
+        total = os.path.getsize(file_path)
+        if is_columnar(file_path):
+            count = self.load_columnar(file_path, contact_ids)
+            if progress:
+                progress(count, total, total)
+            return count
+        with open(file_path, "r", newline="", encoding=file_encoding(file_path)) as file:
+            rows = (row for row in csv.reader(file) if any(row))
+            if chunk_size is None:
+                count = self.add_many(rows, contact_ids)
+                if progress:
+                    progress(count, total, total)
+                return count
+            contact_ids = iter(contact_ids) if contact_ids is not None else None
+            count = 0
+            for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+                count += self.add_many(chunk, contact_ids)
+                if progress:
+                    progress(count, file.buffer.tell(), total)
+            return count
+
+    # Map a columnar file into an empty store; only the display column is read now, other indexes are built on first use
+    def load_columnar(self, file_path, contact_ids=None):
+        with self.lock:
+            if len(self):
+                raise ValueError("A columnar file can only be loaded into an empty contact store")
+            mapped = ColumnarFile(file_path)
+            if contact_ids is not None and not (isinstance(contact_ids, range) and contact_ids.step == 1):
+                # Mapped rows need consecutive ids, so rows given scattered ids are read into Contact objects instead
+                rows = [mapped.row(row) for row in range(mapped.count)]
+                mapped.close()
+                return self.add_many(rows, contact_ids)
+            self._mapped = mapped
+            self._mapped_base = self._next_id if contact_ids is None else contact_ids.start
+            self._next_id = max(self._next_id, self._mapped_base + mapped.count)
+            contact_ids = range(self._mapped_base, self._mapped_base + mapped.count)
+            self._display_index.add_column(contact_ids, mapped.column(FIELDS.index(self._display_index.field)))
+            self._pending = set(self._indexes) - {self._display_index}
+            return mapped.count
+
+    # Add many contacts or rows, building the indexes once per chunk, and return how many were added. Rows are read and
+    # turned into contacts outside the lock, which is only taken to add each chunk, so a slow stream such as an import
+    # being parsed does not hold up other threads.
+    def add_many(self, rows, contact_ids=None):
+        rows = iter(rows)
+        contact_ids = iter(contact_ids) if contact_ids is not None else None
+        count = 0
+        while True:
+            chunk = [row if isinstance(row, CONTACT_TYPES) else Contact(*normalise_row(row))
+                     for row in islice(rows, max(ADD_CHUNK, len(self) // REBUILD_FRACTION))]
+            if not chunk:
+                return count
+            count += self._add_chunk(chunk, contact_ids)
+
+    # Add a list of contacts under one hold of the lock, giving them ids from an iterator if one is given
+    def _add_chunk(self, contacts, contact_ids):
+        added = []
+        with self.lock:
+            for contact in contacts:
+                contact_id = self._new_id(next(contact_ids) if contact_ids is not None else None)
+                self._contacts[contact_id] = contact
+                added.append((contact_id, contact_values(contact)))
+            for index in self._indexes:
+                if index not in self._pending:
+                    index.add_many(added)
+            if self._listeners:
+                for contact_id, values in added:
+                    self._notify("add", contact_id, None, values)
+        return len(added)
+
+    # Return the ids and values of every contact in display order, taken atomically so it can run beside other threads
+    def snapshot(self):
+        with self.lock:
+            contact_ids = self.ids()
+            return contact_ids, [self.values(contact_id) for contact_id in contact_ids]
+
+    # Save all contacts in display order to a comma separated or columnar (.abk) file
+    def save(self, file_path="contacts.txt"):
+        with self.lock:
+            self.release(file_path)
+            write_rows(file_path, self.snapshot()[1])
+
+    # Stop mapping a columnar file which is about to be replaced, turning its remaining rows into Contact objects first;
+    # Windows cannot replace a file while it is mapped. Does nothing if another file, or none, is mapped.
+    def release(self, file_path):
+        with self.lock:
+            if self._mapped is not None and os.path.abspath(file_path) == os.path.abspath(self._mapped.file_path):
+                for contact_id in list(self._all_ids()):
+                    self.get(contact_id)
+                self.close()
+
+    # Return the contacts and indexes of an empty store
+    def _empty_state(self):
+        sort_indexes = {field: SortedIndex(field) for field in self.sort_indexes}
+        facet_indexes = {facet: FacetIndex(facet) for facet in self.facet_indexes}
+        ngram_index, fuzzy_index, key_index = NgramIndex(self.values), FuzzyIndex(), KeyIndex()
+        return {
+            "_contacts": ContactTable() if self.compact else {},
+            "_mapped": None,
+            "_mapped_base": 0,
+            "_detached": set(),
+            "ngram_index": ngram_index,
+            "fuzzy_index": fuzzy_index,
+            "key_index": key_index,
+            "sort_indexes": sort_indexes,
+            "facet_indexes": facet_indexes,
+            "_display_index": sort_indexes[self._display_index.field],
+            "_indexes": [ngram_index, fuzzy_index, key_index, *sort_indexes.values(), *facet_indexes.values()],
+            "_pending": set(),
+        }
+
+    # Replace the contacts and indexes with another state and return the previous one
+    def _swap_state(self, state):
+        previous = {name: getattr(self, name) for name in _STATE_ATTRIBUTES}
+        for name in _STATE_ATTRIBUTES:
+            setattr(self, name, state[name])
+        return previous
+
+    # Allocate the next contact id, or reserve a given one
+    def _new_id(self, contact_id=None):
+        if contact_id is None:
+            contact_id = self._next_id
+        elif contact_id in self:
+            raise ValueError(f"Contact id {contact_id} is already in use")
+        self._next_id = max(self._next_id, contact_id + 1)
+        return contact_id
+
+    # Tell every listener about a change
+    def _notify(self, action, contact_id, old_values, new_values):
+        for callback in self._listeners:
+            callback(action, contact_id, old_values, new_values)
+
+    # Return the row number in the mapped file of a contact id, or None if the id is not a mapped row
+    def _mapped_row(self, contact_id):
+        if self._mapped is None or contact_id in self._detached:
+            return None
+        row = contact_id - self._mapped_base
+        return row if 0 <= row < self._mapped.count else None
+
+    # Return the set of ids of contacts whose values at the positions contain a lower-cased needle while a file is mapped:
+    # the mapped rows are found by searching the file's columns, and the few Contact objects are checked one by one
+    def _mapped_query(self, needle, positions):
+        found = {contact_id for contact_id in self._contacts if matches(self.values(contact_id), needle, positions)}
+        for position in positions:
+            for row in self._mapped.search(position, needle):
+                contact_id = self._mapped_base + row
+                if contact_id not in self._detached:
+                    found.add(contact_id)
+        return found
+
+    # Iterate over every contact id in no particular order
+    def _all_ids(self):
+        yield from self._contacts
+        if self._mapped is not None:
+            for contact_id in range(self._mapped_base, self._mapped_base + self._mapped.count):
+                if contact_id not in self._detached:
+                    yield contact_id
+
+    # Yield chunks of the entries of a sorted index after a cursor, keeping those whose values at the positions contain
+    # the needle if one is given
+    def _scan(self, field, after, chunk_size, needle=None, positions=()):
+        while True:
+            with self.lock:
+                index = self.add_sort_index(field)
+                start = index.position_after(after)
+                entries = index.entries(start, start + chunk_size)
+                if not entries:
+                    return
+                after = entries[-1]
+                if needle is not None:
+                    entries = [entry for entry in entries if matches(self.values(entry[1]), needle, positions)]
+            yield entries
+
+    # Build an index from every contact if its build was deferred, and return it
+    def _ready(self, index):
+        if index in self._pending:
+            index.clear()
+            index.add_many((contact_id, self.values(contact_id)) for contact_id in self._all_ids())
+            self._pending.discard(index)
+        return index
+
+    # Add a contact's values to every built index
+    def _index_add(self, contact_id, values):
+        for index in self._indexes:
+            if index not in self._pending:
+                index.add(contact_id, values)
+
+    # Move changed contacts, as (contact id, old values, new values), in the built indexes over the fields which changed;
+    # an index touched by a large share of the book is rebuilt in one go instead, which is quicker than moving each contact
+    def _index_update(self, changes):
+        changed_fields = {field for contact_id, old_values, new_values in changes
+                          for field, old, new in zip(FIELDS, old_values, new_values) if old != new}
+        rebuild = len(changes) * REBUILD_FRACTION > len(self)
+        for index in self._indexes:
+            if index in self._pending or changed_fields.isdisjoint(index.fields):
+                continue
+            if rebuild:
+                # Like after loading a columnar file, only the display order is needed straight away
+                self._pending.add(index)
+                if index is self._display_index:
+                    self._ready(index)
+                continue
+            for contact_id, old_values, new_values in changes:
+                if old_values != new_values:
+                    index.remove(contact_id, old_values)
+                    index.add(contact_id, new_values)
+
+    # Remove a contact's values from every built index
+    def _index_remove(self, contact_id, values):
+        for index in self._indexes:
+            if index not in self._pending:
+                index.remove(contact_id, values)
+
+    # Remove deleted contacts, as (contact id, values), from every built index; each index filters out a large batch in
+    # one pass, as removing the contacts one by one would shift its sorted lists once per contact
+    def _index_remove_many(self, removed):
+        for index in self._indexes:
+            if index in self._pending:
+                continue
+            if len(removed) < BULK_REMOVE:
+                for contact_id, values in removed:
+                    index.remove(contact_id, values)
+            else:
+                index.remove_many(removed)
@@ -0,0 +1,229 @@
+'''
+Brief Description of what this code does:
+This code defines the ContactTable class, a compact struct-of-arrays
+alternative to keeping one Contact object (and seven string objects)
+per contact. Each field is a column held in typed arrays: names, towns,
+email domains and picture paths repeat a lot, so they are dictionary
+encoded as 4-byte codes into a pool of distinct strings, while mostly
+unique values such as street addresses and phone numbers are packed as
+UTF-8 bytes into one growing buffer. Rows are numbered by contact id.
+ContactView is a flyweight which reads and writes one row of the table
+through the same attributes as Contact, so the rest of the address book
+can keep using contact.first_name and friends; it holds only the table
+and the row number. ContactStore uses the table when it is created with
+compact=True, which the app's --compact option turns on.
+'''
+
+from array import array
+from Contact import Contact, FIELDS
+
+
+# Class holding a column of strings as codes into a pool of distinct values
+class PooledColumn:
+    # Initialise an empty column; code 0 always means the empty string
+    def __init__(self):
+        self.pool = [""]
+        self._codes_by_value = {"": 0}
+        self.codes = array("I")
+
+    # Return the value of a row
+    def get(self, row):
+        return self.pool[self.codes[row]]
+
+    # Set the value of a row, growing the column if needed
+    def set(self, row, value):
+        code = self._codes_by_value.get(value)
+        if code is None:
+            code = self._codes_by_value[value] = len(self.pool)
+            self.pool.append(value)
+        _grow(self.codes, row)
+        self.codes[row] = code
+
+    # Approximate bytes used by the column's arrays and pooled strings
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes) + sum(len(value) for value in self.pool)
+
+
+# Class holding a column of strings as UTF-8 bytes packed into one buffer
+class BlobColumn:
+    # Initialise an empty column
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.waste = 0  # Bytes of values which have since been replaced
+
+    # Return the value of a row
+    def get(self, row):
+        offset = self.offsets[row]
+        return self.data[offset:offset + self.lengths[row]].decode("utf-8")
+
+    # Set the value of a row, growing the column if needed; replaced bytes are reclaimed by compact
+    def set(self, row, value):
+        encoded = value.encode("utf-8")
+        _grow(self.offsets, row)
+        _grow(self.lengths, row)
+        self.waste += self.lengths[row]
+        if encoded:
+            self.offsets[row] = len(self.data)
+            self.data += encoded
+        else:
+            self.offsets[row] = 0
+        self.lengths[row] = len(encoded)
+        if self.waste > 1024 * 1024 and self.waste * 2 > len(self.data):
+            self.compact()
+
+    # Rewrite the buffer without the bytes of replaced values
+    def compact(self):
+        data = bytearray()
+        for row, length in enumerate(self.lengths):
+            offset = self.offsets[row]
+            self.offsets[row] = len(data) if length else 0
+            data += self.data[offset:offset + length]
+        self.data = data
+        self.waste = 0
+
+    # Approximate bytes used by the column
+    def nbytes(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets) + self.lengths.itemsize * len(self.lengths)
+
+
+# Class holding a column of strings split at the last separator into a packed head and a pooled tail,
+# e.g. "1 High Street, Leicester" into "1 High Street" and the town "Leicester", or an email into its local part and domain
+class SplitColumn:
+    # Initialise an empty column splitting values at separator
+    def __init__(self, separator):
+        self.separator = separator
+        self.head = BlobColumn()
+        self.tail = PooledColumn()
+        self.tail.pool[0] = None  # Code 0 marks a value without the separator
+        self.tail._codes_by_value = {None: 0}
+
+    # Return the value of a row
+    def get(self, row):
+        head = self.head.get(row)
+        tail = self.tail.get(row)
+        return head if tail is None else f"{head}{self.separator}{tail}"
+
+    # Set the value of a row, growing the column if needed
+    def set(self, row, value):
+        head, separator, tail = value.rpartition(self.separator)
+        if not separator:
+            head, tail = value, None
+        self.head.set(row, head)
+        self.tail.set(row, tail)
+
+    # Approximate bytes used by the column
+    def nbytes(self):
+        return self.head.nbytes() + self.tail.codes.itemsize * len(self.tail.codes) + sum(len(value) for value in self.tail.pool[1:])
+
+
+# Function to extend an array with zeros so that it has an entry for row
+def _grow(column, row):
+    missing = row + 1 - len(column)
+    if missing > 0:
+        column.frombytes(bytes(column.itemsize * missing))
+
+
+# Function to return the column used for each field
+def _make_columns():
+    return {
+        "first_name": PooledColumn(),
+        "last_name": PooledColumn(),
+        "address": SplitColumn(", "),
+        "mobile_number": BlobColumn(),
+        "secondary_number": BlobColumn(),
+        "email_address": SplitColumn("@"),
+        "picture_path": PooledColumn(),
+    }
+
+
+# Class representing a contact as a view over one row of a ContactTable, created on demand and holding no field values
+# itself; it is not a Contact subclass, so it does not carry a slot for each field as well
+class ContactView:
+    __slots__ = ("_table", "_row")
+
+    # Initialise a view of a row
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    # Define a string representation matching Contact's
+    def __str__(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+# Function to make a property reading and writing one field of a ContactView's row
+def _field_property(field):
+    def get(view):
+        return view._table.columns[field].get(view._row)
+
+    def set(view, value):
+        view._table.columns[field].set(view._row, value)
+
+    return property(get, set)
+
+
+for _field in FIELDS:
+    setattr(ContactView, _field, _field_property(_field))
+
+# Types of object holding a contact's values as attributes named after FIELDS
+CONTACT_TYPES = (Contact, ContactView)
+
+
+# Class storing contacts as columns of arrays, used by ContactStore like a dict from contact id to Contact
+class ContactTable:
+    # Initialise an empty table
+    def __init__(self):
+        self.columns = _make_columns()
+        self._present = bytearray()  # 1 for each row holding a contact
+        self._count = 0
+
+    # Number of contacts in the table
+    def __len__(self):
+        return self._count
+
+    # Check whether a contact id has a row
+    def __contains__(self, contact_id):
+        return 0 <= contact_id < len(self._present) and self._present[contact_id] == 1
+
+    # Iterate over the contact ids in the table
+    def __iter__(self):
+        present = self._present
+        return (contact_id for contact_id in range(len(present)) if present[contact_id])
+
+    # Return a view of a contact
+    def __getitem__(self, contact_id):
+        if contact_id not in self:
+            raise KeyError(contact_id)
+        return ContactView(self, contact_id)
+
+    # Return a view of a contact, or default if there is no such contact
+    def get(self, contact_id, default=None):
+        return ContactView(self, contact_id) if contact_id in self else default
+
+    # Store a contact (a Contact or a sequence of values in FIELDS order) in the row of its id
+    def __setitem__(self, contact_id, contact):
+        if contact_id < 0:
+            raise KeyError(contact_id)
+        values = [getattr(contact, field) for field in FIELDS] if isinstance(contact, CONTACT_TYPES) else contact
+        for field, value in zip(FIELDS, values):
+            self.columns[field].set(contact_id, str(value))
+        if contact_id >= len(self._present):
+            self._present.extend(bytes(contact_id + 1 - len(self._present)))
+        if not self._present[contact_id]:
+            self._present[contact_id] = 1
+            self._count += 1
+
+    # Remove a contact; its row is left empty
+    def __delitem__(self, contact_id):
+        if contact_id not in self:
+            raise KeyError(contact_id)
+        for column in self.columns.values():
+            column.set(contact_id, "")
+        self._present[contact_id] = 0
+        self._count -= 1
+
+    # Approximate bytes used by the table's arrays and pooled strings
+    def nbytes(self):
+        return len(self._present) + sum(column.nbytes() for column in self.columns.values())
@@ -0,0 +1,206 @@
+'''
+Brief Description of what this code does:
+This code finds and merges duplicate contacts, which pile up after the
+same file has been imported more than once. Instead of comparing every
+pair of contacts, each contact is put into blocks by its normalised
+mobile number, its normalised email address and a phonetic key of its
+name. Contacts sharing a mobile number or email address are joined
+when their names are also alike, as a family or a business often shares
+one number or address, and only contacts in the same small name block
+are compared with each other, so the work grows roughly linearly with
+the size of the address book. Joined contacts are gathered into
+clusters with a union-find structure, and merge_contacts folds a
+cluster into the contact chosen to keep. Run as a script it reports
+(and optionally merges) the duplicates in a contacts file.
+'''
+
+import argparse
+from Contact import FIELDS
+from contact_keys import DEFAULT_COUNTRY_CODE, normalise_email, normalise_phone
+from fuzzy_search import bounded_edit_distance, metaphone, words
+
+# Name blocks larger than this are too common to compare pair by pair; their members are only joined by address
+MAX_BLOCK_SIZE = 50
+
+_FIRST = FIELDS.index("first_name")
+_LAST = FIELDS.index("last_name")
+_ADDRESS = FIELDS.index("address")
+_MOBILE = FIELDS.index("mobile_number")
+_SECONDARY = FIELDS.index("secondary_number")
+_EMAIL = FIELDS.index("email_address")
+
+
+# Class implementing a union-find (disjoint set) structure over the numbers 0 to size - 1
+class UnionFind:
+    # Initialise size separate sets
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    # Return the representative of the set holding item
+    def find(self, item):
+        parent = self.parent
+        root = item
+        while parent[root] != root:
+            root = parent[root]
+        # Point everything on the path straight at the root so later finds are quick
+        while parent[item] != root:
+            parent[item], item = root, parent[item]
+        return root
+
+    # Join the sets holding two items
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # The smaller number becomes the root, so clusters keep the order of the contacts
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+# Function to return the phonetic block key of a contact's name
+def name_key(values):
+    parts = []
+    for position in (_FIRST, _LAST):
+        name = "".join(words(values[position]))
+        parts.append(metaphone(name) or name)
+    return "|".join(parts)
+
+
+# Function to return a contact's address with case, punctuation and spacing removed
+def address_key(values):
+    return " ".join(words(values[_ADDRESS]))
+
+
+# Function to check whether two contacts' full names are the same apart from case, punctuation and one typo
+def similar_names(a, b):
+    name_a = " ".join(words(f"{a[_FIRST]} {a[_LAST]}"))
+    name_b = " ".join(words(f"{b[_FIRST]} {b[_LAST]}"))
+    return bounded_edit_distance(name_a, name_b, 1) <= 1
+
+
+# Function to check whether two contacts in the same name block are probably the same person
+def same_person(a, b, country_code=DEFAULT_COUNTRY_CODE):
+    if not similar_names(a, b):
+        return False
+    # Names are close enough, so they are the same person unless their details disagree
+    phones_a = {normalise_phone(a[position], country_code) for position in (_MOBILE, _SECONDARY)} - {""}
+    phones_b = {normalise_phone(b[position], country_code) for position in (_MOBILE, _SECONDARY)} - {""}
+    if phones_a and phones_b and not phones_a & phones_b:
+        return False
+    email_a, email_b = normalise_email(a[_EMAIL]), normalise_email(b[_EMAIL])
+    if email_a and email_b and email_a != email_b:
+        return False
+    address_a, address_b = address_key(a), address_key(b)
+    return not (address_a and address_b and address_a != address_b)
+
+
+# Function to find clusters of probable duplicates in a store; returns lists of contact ids, each in display order
+def find_duplicates(store, max_block_size=MAX_BLOCK_SIZE, country_code=DEFAULT_COUNTRY_CODE):
+    contact_ids, rows = store.snapshot()
+    clusters = UnionFind(len(rows))
+    # Block key -> positions of the first contact with it under each differently spelt name; a shared mobile number or
+    # email address only joins contacts whose names are alike, so a family sharing a landline stays apart
+    owners = {}
+    name_blocks = {}
+    for position, values in enumerate(rows):
+        keys = [("mobile", normalise_phone(values[_MOBILE], country_code)), ("email", normalise_email(values[_EMAIL]))]
+        name = name_key(values)
+        address = address_key(values)
+        if address:
+            # The same name spelt the same way at the same address is the same person, however common the name is
+            keys.append(("address", " ".join(words(f"{values[_FIRST]} {values[_LAST]}")), address))
+        for key in keys:
+            if key[-1]:
+                sharing = owners.setdefault(key, [])
+                for other in sharing:
+                    if similar_names(rows[other], values):
+                        clusters.union(other, position)
+                        break
+                else:
+                    if len(sharing) < max_block_size:
+                        sharing.append(position)
+        name_blocks.setdefault(name, []).append(position)
+
+    # Compare pairs only inside small name blocks
+    for block in name_blocks.values():
+        if len(block) < 2 or len(block) > max_block_size:
+            continue
+        for i, a in enumerate(block):
+            for b in block[i + 1:]:
+                if clusters.find(a) != clusters.find(b) and same_person(rows[a], rows[b], country_code):
+                    clusters.union(a, b)
+
+    groups = {}
+    for position in range(len(rows)):
+        groups.setdefault(clusters.find(position), []).append(contact_ids[position])
+    return [group for group in groups.values() if len(group) > 1]
+
+
+# Function to merge contacts into the first one, which keeps its names and other fields, filling its empty fields from
+# the others and deleting them; returns the id of the contact which was kept
+def merge_contacts(store, contact_ids, country_code=DEFAULT_COUNTRY_CODE):
+    keep, *others = contact_ids
+    with store.lock:
+        all_values = [store.values(contact_id) for contact_id in contact_ids]
+        merged = list(all_values[0])
+        for position in range(len(FIELDS)):
+            if position in (_MOBILE, _SECONDARY):
+                continue
+            if not merged[position]:
+                merged[position] = next((values[position] for values in all_values if values[position]), "")
+        # Keep up to two distinct phone numbers, preferring the kept contact's own and then mobile numbers
+        numbers = []
+        seen = set()
+        for number in [all_values[0][_MOBILE], all_values[0][_SECONDARY]] + [values[position] for position in (_MOBILE, _SECONDARY) for values in all_values[1:]]:
+            key = normalise_phone(number, country_code) or number.strip()
+            if key and key not in seen:
+                seen.add(key)
+                numbers.append(number)
+        numbers += ["", ""]
+        merged[_MOBILE], merged[_SECONDARY] = numbers[0], numbers[1]
+        store.update(keep, merged)
+        for contact_id in others:
+            store.delete(contact_id)
+    return keep
+
+
+# Function to merge every cluster into its first contact and return how many contacts were removed; contacts deleted
+# since the clusters were found are left out
+def merge_duplicates(store, clusters, country_code=DEFAULT_COUNTRY_CODE):
+    removed = 0
+    for cluster in clusters:
+        cluster = [contact_id for contact_id in cluster if contact_id in store]
+        if len(cluster) > 1:
+            merge_contacts(store, cluster, country_code)
+            removed += len(cluster) - 1
+    return removed
+
+
+# Report the duplicate contacts in a contacts file, and merge them if asked
+def main():
+    from contact_journal import ContactJournal
+    from contact_store import ContactStore
+
+    parser = argparse.ArgumentParser(description="Find duplicate contacts in a contacts file.")
+    parser.add_argument("contacts_file", help="file to check (.txt or .abk)")
+    parser.add_argument("--merge", action="store_true", help="merge each group of duplicates and save the file")
+    args = parser.parse_args()
+
+    # Opened through its journal, as the app does, so edits not yet compacted into the file are included and kept
+    store = ContactStore()
+    journal = ContactJournal(store, args.contacts_file)
+    journal.open()
+    try:
+        clusters = find_duplicates(store)
+        for cluster in clusters:
+            print(" = ".join(store.name(contact_id) for contact_id in cluster))
+        print(f"{len(clusters)} groups of duplicates covering {sum(len(cluster) for cluster in clusters)} contacts")
+        if args.merge and clusters:
+            removed = merge_duplicates(store, clusters)
+            journal.compact()
+            print(f"Merged away {removed} contacts")
+    finally:
+        journal.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
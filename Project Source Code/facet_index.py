@@ -0,0 +1,173 @@
+'''
+Brief Description of what this code does:
+This code defines the FacetIndex class, a secondary index grouping the
+contacts by one facet: the initial of their surname, the domain of
+their email address, or the town at the end of their address. For each
+group it keeps the ids of its contacts sorted by surname, and the group
+names themselves are kept in order, so a grouped view with a count per
+group, the contacts of one group, and jumping to the groups starting
+with a letter are all read straight from the index. Like the other
+indexes it is updated contact by contact by the contact stores as
+contacts are added, edited and deleted, rather than rebuilt. Each facet
+is worked out from a single field, so SqliteContactStore can index the
+same groups inside the database.
+'''
+
+import re
+from bisect import bisect_left, insort
+from Contact import FIELDS
+from sorted_index import sort_key
+
+_LAST_NAME = FIELDS.index("last_name")
+
+# UK postcode at the end of an address, e.g. "LE1 7RH"
+_POSTCODE = re.compile(r"\s*\b[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}$", re.IGNORECASE)
+
+
+# Function to return the group of a surname by its initial: an upper case letter, "#" for other characters, or ""
+def surname_initial(last_name):
+    initial = last_name.strip()[:1].upper()
+    return initial if initial.isalpha() or not initial else "#"
+
+
+# Function to return the group of an email address by its lower-cased domain, or ""
+def email_domain(email):
+    local, at, domain = email.strip().lower().rpartition("@")
+    return domain.strip("<> ") if at and local else ""
+
+
+# Function to return the town of an address: its last part once any postcode is removed, e.g. "Leicester" from
+# "1 High Street, Leicester LE1 7RH"; an address of one part is only taken as a town if it has no house number
+def address_town(address):
+    parts = [part.strip() for part in address.split(",")]
+    parts = [part for part in parts if part]
+    if parts:
+        parts[-1] = _POSTCODE.sub("", parts[-1])
+        if not parts[-1]:
+            parts.pop()
+    if not parts or (len(parts) == 1 and any(char.isdigit() for char in parts[0])):
+        return ""
+    town = " ".join(parts[-1].split())
+    # "leicester" and "LEICESTER" are grouped with "Leicester"
+    return town.title() if town.islower() or town.isupper() else town
+
+
+# Facets contacts can be grouped by: name -> (title shown, function returning the group of a field value, field it reads)
+FACETS = {
+    "surname_initial": ("Surname Initial", surname_initial, "last_name"),
+    "email_domain": ("Email Domain", email_domain, "email_address"),
+    "town": ("Town", address_town, "address"),
+}
+
+# Group of contacts which have no value for a facet, listed after the others
+NO_GROUP = ""
+
+
+# Class keeping contact ids grouped by one facet, sorted by surname within each group
+class FacetIndex:
+    # Initialise an empty index for a facet named in FACETS
+    def __init__(self, facet):
+        self.facet = facet
+        self.title, self._group_of, field = FACETS[facet]
+        self._position = FIELDS.index(field)
+        # Fields the index depends on, as for the other indexes; groups are sorted by surname
+        self.fields = tuple(dict.fromkeys(("last_name", field)))
+        # Group -> sorted list of (surname sort key, contact id)
+        self._groups = {}
+        # Sorted list of (no group, group sort key, group), so NO_GROUP comes last
+        self._names = []
+        # Contact id -> (group, (surname sort key, contact id))
+        self._entries = {}
+
+    # Number of contacts in the index
+    def __len__(self):
+        return len(self._entries)
+
+    # Add a contact's field values (a tuple in FIELDS order) to the index
+    def add(self, contact_id, values):
+        group = self._group_of(values[self._position])
+        entry = (sort_key(values[_LAST_NAME]), contact_id)
+        self._entries[contact_id] = (group, entry)
+        members = self._groups.get(group)
+        if members is None:
+            members = self._groups[group] = []
+            insort(self._names, self._name(group))
+        insort(members, entry)
+
+    # Add many (contact id, values) pairs at once, sorting each group a single time at the end
+    def add_many(self, items):
+        for contact_id, values in items:
+            group = self._group_of(values[self._position])
+            entry = (sort_key(values[_LAST_NAME]), contact_id)
+            self._entries[contact_id] = (group, entry)
+            self._groups.setdefault(group, []).append(entry)
+        for members in self._groups.values():
+            members.sort()
+        self._names = sorted(map(self._name, self._groups))
+
+    # Remove a contact from the index
+    def remove(self, contact_id, values):
+        group, entry = self._entries.pop(contact_id)
+        members = self._groups[group]
+        del members[bisect_left(members, entry)]
+        if not members:
+            del self._groups[group]
+            name = self._name(group)
+            del self._names[bisect_left(self._names, name)]
+
+    # Remove many (contact id, values) pairs at once, filtering each group they were in a single time
+    def remove_many(self, items):
+        removed = {}
+        for contact_id, values in items:
+            group, entry = self._entries.pop(contact_id)
+            removed.setdefault(group, set()).add(contact_id)
+        for group, ids in removed.items():
+            members = [entry for entry in self._groups[group] if entry[1] not in ids]
+            if members:
+                self._groups[group] = members
+            else:
+                del self._groups[group]
+                del self._names[bisect_left(self._names, self._name(group))]
+
+    # Remove everything from the index
+    def clear(self):
+        self._groups = {}
+        self._names = []
+        self._entries = {}
+
+    # Number of groups
+    def group_count(self):
+        return len(self._names)
+
+    # Return (group, number of contacts) for the groups between two positions in order
+    def groups(self, start=0, stop=None):
+        return [(group, len(self._groups[group])) for no_group, key, group in self._names[start:stop]]
+
+    # Return the group at a position in order
+    def group_at(self, position):
+        return self._names[position][2]
+
+    # Return the position of the first group at or after some text alphabetically, e.g. the first town starting with "M";
+    # it is the number of groups when every group comes before the text
+    def find(self, text):
+        return bisect_left(self._names, (False, sort_key(text)))
+
+    # Return the group a contact is in
+    def group_of(self, contact_id):
+        return self._entries[contact_id][0]
+
+    # Number of contacts in a group
+    def count(self, group):
+        return len(self._groups.get(group, ()))
+
+    # Return the ids of a group's contacts between two positions, sorted by surname
+    def ids(self, group, start=0, stop=None):
+        return [contact_id for key, contact_id in self._groups.get(group, [])[start:stop]]
+
+    # Return the id of the contact at a position in a group
+    def id_at(self, group, position):
+        return self._groups[group][position][1]
+
+    # Return the entry ordering a group in the list of group names
+    def _name(self, group):
+        return (group == NO_GROUP, sort_key(group), group)
@@ -0,0 +1,341 @@
+'''
+Brief Description of what this code does:
+This code defines the FuzzyIndex class, which finds contacts by name
+even when the query is misspelt ("Jonh") or spelt another way
+("Smyth"). Names are split into words, and the index works on the
+vocabulary of distinct words rather than on every contact: each word
+is indexed by its trigrams and by its Soundex and Metaphone keys. A
+query word only has to be compared, with a bounded edit distance, to
+the few words which share trigrams or a phonetic key with it, and the
+contacts using the best words are ranked by score with heapq. The index
+is kept up to date by the contact stores whenever contacts change.
+'''
+
+import heapq
+import re
+from collections import Counter
+from Contact import FIELDS
+
+# Fields searched by fuzzy queries
+NAME_FIELDS = ("first_name", "last_name")
+
+# Scores given to words which only match by sound, and the bonus for words which are both spelt and sound alike
+METAPHONE_SCORE = 0.75
+SOUNDEX_SCORE = 0.65
+PHONETIC_BONUS = 0.1
+
+# Words are runs of letters; digits and punctuation separate them
+_WORD = re.compile(r"[^\W\d_]+")
+
+_SOUNDEX_CODES = {}
+for _letters, _code in (("BFPV", "1"), ("CGJKQSXZ", "2"), ("DT", "3"), ("L", "4"), ("MN", "5"), ("R", "6")):
+    for _letter in _letters:
+        _SOUNDEX_CODES[_letter] = _code
+
+_VOWELS = set("AEIOU")
+
+
+# Function to split a value into lower-cased words
+def words(value):
+    return _WORD.findall(str(value).casefold())
+
+
+# Function to return the trigrams of a word, padded so that its first and last letters count as much as the middle ones
+def word_grams(word):
+    padded = f"$${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Function to return the American Soundex code of a word, or "" if it has no ASCII letters
+def soundex(word):
+    letters = [char for char in word.upper() if "A" <= char <= "Z"]
+    if not letters:
+        return ""
+    code = letters[0]
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for char in letters[1:]:
+        digit = _SOUNDEX_CODES.get(char, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W do not separate letters with the same code, vowels do
+        if char not in "HW":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+# Function to return a simplified Metaphone key of a word, or "" if it has no ASCII letters
+def metaphone(word):
+    text = "".join(char for char in word.upper() if "A" <= char <= "Z")
+    if not text:
+        return ""
+    # Silent or changed first letters
+    if text[:2] in ("KN", "GN", "PN", "AE", "WR"):
+        text = text[1:]
+    elif text[0] == "X":
+        text = "S" + text[1:]
+    elif text[:2] == "WH":
+        text = "W" + text[2:]
+
+    key = []
+    for i, char in enumerate(text):
+        before = text[i - 1] if i else ""
+        after = text[i + 1] if i + 1 < len(text) else ""
+        after2 = text[i + 2] if i + 2 < len(text) else ""
+        if char == before and char != "C":
+            continue
+        if char in _VOWELS:
+            if i == 0:
+                key.append(char)
+        elif char == "B":
+            if not (before == "M" and i == len(text) - 1):
+                key.append("B")
+        elif char == "C":
+            if after == "H" or (after == "I" and after2 == "A"):
+                key.append("K" if before == "S" else "X")
+            elif after in "IEY" and after:
+                if before != "S":
+                    key.append("S")
+            else:
+                key.append("K")
+        elif char == "D":
+            key.append("J" if after == "G" and after2 in "EIY" and after2 else "T")
+        elif char == "G":
+            if after == "H" and after2 and after2 not in _VOWELS:
+                continue
+            if after == "N" and (i + 2 == len(text) or text[i + 2:] == "ED"):
+                continue
+            key.append("J" if after in "EIY" and after and before != "G" else "K")
+        elif char == "H":
+            if (not before or before not in "CSPTG") and after in _VOWELS and after:
+                key.append("H")
+        elif char == "K":
+            if before != "C":
+                key.append("K")
+        elif char == "P":
+            key.append("F" if after == "H" else "P")
+        elif char == "Q":
+            key.append("K")
+        elif char == "S":
+            key.append("X" if after == "H" or (after == "I" and after2 in "OA" and after2) else "S")
+        elif char == "T":
+            if after == "I" and after2 in "OA" and after2:
+                key.append("X")
+            elif after == "H":
+                key.append("0")
+            elif not (after == "C" and after2 == "H"):
+                key.append("T")
+        elif char == "V":
+            key.append("F")
+        elif char in "WY":
+            if after in _VOWELS and after:
+                key.append(char)
+        elif char == "X":
+            key.append("KS")
+        elif char == "Z":
+            key.append("S")
+        else:
+            key.append(char)
+    return "".join(key)
+
+
+# Function to return the edit distance between two words, counting a swap of neighbouring letters as one edit
+# (optimal string alignment), or bound + 1 once it is known to exceed bound
+def bounded_edit_distance(a, b, bound):
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    if len(a) > len(b):
+        a, b = b, a
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        # Only cells within bound of the diagonal can lead to a distance within bound; the rest count as bound + 1
+        current = [i] + [bound + 1] * len(b)
+        low = max(1, i - bound)
+        high = min(len(b), i + bound)
+        for j in range(low, high + 1):
+            distance = min(previous[j - 1] + (char_a != b[j - 1]), previous[j] + 1, current[j - 1] + 1)
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, before_previous[j - 2] + 1)
+            current[j] = distance
+        if min(current[low - 1:high + 1]) > bound:
+            return bound + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], bound + 1)
+
+
+# Function to return how many edits a query word of some length may be away from a match
+def edit_bound(length):
+    return 1 if length <= 4 else 2
+
+
+# Class implementing a vocabulary-level fuzzy and phonetic index over contact names
+class FuzzyIndex:
+    # Initialise an empty index over the given fields
+    def __init__(self, fields=NAME_FIELDS, max_candidates=500):
+        self.fields = tuple(fields)
+        self.max_candidates = max_candidates  # Vocabulary words scored per query word
+        self._positions = [FIELDS.index(field) for field in self.fields]
+        self.clear()
+
+    # Add a contact's field values (a tuple in FIELDS order) to the index
+    def add(self, contact_id, values):
+        for word in self._contact_words(values):
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = set()
+                self._add_word(word)
+            ids.add(contact_id)
+
+    # Add many (contact id, values) pairs at once
+    def add_many(self, items):
+        for contact_id, values in items:
+            self.add(contact_id, values)
+
+    # Remove a contact's field values (as they were when added) from the index
+    def remove(self, contact_id, values):
+        for word in self._contact_words(values):
+            ids = self._postings.get(word)
+            if ids is None:
+                continue
+            ids.discard(contact_id)
+            if not ids:
+                del self._postings[word]
+                self._remove_word(word)
+
+    # Remove many (contact id, values) pairs at once
+    def remove_many(self, items):
+        for contact_id, values in items:
+            self.remove(contact_id, values)
+
+    # Remove everything from the index
+    def clear(self):
+        self._postings = {}  # Word -> set of contact ids using it
+        self._grams = {}  # Trigram -> set of words containing it
+        self._phonetic = {}  # Soundex or Metaphone key -> set of words with it
+
+    # Number of distinct words in the index
+    def __len__(self):
+        return len(self._postings)
+
+    # Return up to limit (contact id, score) pairs best matching the text, highest score first. Every word of the text
+    # must match one of a contact's name words with a score of at least min_score; a contact's score is the mean of those.
+    def search(self, text, limit=10, min_score=0.6):
+        query_words = words(text)
+        if not query_words:
+            return []
+        # For each query word: (score, ids of contacts using a word with that score) from the best score down
+        tiers = []
+        for word in query_words:
+            by_score = {}
+            for term, score in self.similar_words(word):
+                if score >= min_score:
+                    by_score.setdefault(score, []).append(self._word_ids(term))
+            if not by_score:
+                return []
+            tiers.append([(score, set().union(*postings)) for score, postings in sorted(by_score.items(), reverse=True)])
+
+        if len(tiers) == 1:
+            # A contact first met in a higher tier cannot score better later, so stop as soon as limit contacts are found
+            results = []
+            seen = set()
+            for score, ids in tiers[0]:
+                new = ids - seen
+                results.extend((contact_id, score) for contact_id in heapq.nsmallest(limit - len(results), new))
+                if len(results) >= limit:
+                    break
+                seen |= new
+            return results
+
+        # Only contacts matching every query word are candidates; intersect starting from the rarest word
+        matched = sorted((set().union(*(ids for score, ids in word_tiers)) for word_tiers in tiers), key=len)
+        candidates = matched[0].intersection(*matched[1:])
+        totals = dict.fromkeys(candidates, 0.0)
+        for word_tiers in tiers:
+            remaining = set(candidates)
+            for score, ids in word_tiers:
+                hits = remaining & ids
+                for contact_id in hits:
+                    totals[contact_id] += score
+                remaining -= hits
+                if not remaining:
+                    break
+        count = len(tiers)
+        return heapq.nlargest(limit, ((contact_id, total / count) for contact_id, total in totals.items()), key=lambda item: (item[1], -item[0]))
+
+    # Return (vocabulary word, score) pairs for the words similar to a query word
+    def similar_words(self, word):
+        grams = word_grams(word)
+        # Count the trigrams each vocabulary word shares with the query word
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        needed = 1 if len(word) <= 3 else 2
+        candidates = heapq.nlargest(self.max_candidates, ((count, term) for term, count in shared.items() if count >= needed))
+        candidate_words = {term for count, term in candidates}
+        metaphone_key = metaphone(word)
+        soundex_key = soundex(word)
+        metaphone_words = self._phonetic.get("M" + metaphone_key, set()) if metaphone_key else set()
+        soundex_words = self._phonetic.get("S" + soundex_key, set()) if soundex_key else set()
+
+        bound = edit_bound(len(word))
+        results = []
+        for term in candidate_words | metaphone_words | soundex_words:
+            if term == word:
+                results.append((term, 1.0))
+                continue
+            phonetic = METAPHONE_SCORE if term in metaphone_words else SOUNDEX_SCORE if term in soundex_words else 0.0
+            distance = bounded_edit_distance(word, term, bound)
+            score = 0.0
+            if distance <= bound:
+                score = 1.0 - distance / max(len(word), len(term)) + (PHONETIC_BONUS if phonetic else 0.0)
+            term_grams = word_grams(term)
+            score = max(score, phonetic, 2 * len(grams & term_grams) / (len(grams) + len(term_grams)))
+            if len(word) >= 3 and term.startswith(word):
+                # Prefixes, so "Jon" still finds "Jonathan"
+                score = max(score, 0.7 + 0.3 * len(word) / len(term))
+            # Only an exact match scores 1, and scores are rounded so that words scoring the same fall into the same tier
+            results.append((term, round(min(0.99, score), 3)))
+        return results
+
+    # Return the set of ids of the contacts using a vocabulary word
+    def _word_ids(self, word):
+        return self._postings[word]
+
+    # Return the set of words in a contact's indexed fields
+    def _contact_words(self, values):
+        return {word for position in self._positions for word in words(values[position])}
+
+    # Index a new vocabulary word by its trigrams and phonetic keys
+    def _add_word(self, word):
+        for gram in word_grams(word):
+            self._grams.setdefault(gram, set()).add(word)
+        for key in self._phonetic_keys(word):
+            self._phonetic.setdefault(key, set()).add(word)
+
+    # Remove a vocabulary word which no contact uses any more
+    def _remove_word(self, word):
+        for gram in word_grams(word):
+            terms = self._grams.get(gram)
+            if terms is not None:
+                terms.discard(word)
+                if not terms:
+                    del self._grams[gram]
+        for key in self._phonetic_keys(word):
+            terms = self._phonetic.get(key)
+            if terms is not None:
+                terms.discard(word)
+                if not terms:
+                    del self._phonetic[key]
+
+    # Return a word's phonetic keys, prefixed so Soundex and Metaphone keys cannot collide
+    def _phonetic_keys(self, word):
+        keys = []
+        metaphone_key = metaphone(word)
+        if metaphone_key:
+            keys.append("M" + metaphone_key)
+        soundex_key = soundex(word)
+        if soundex_key:
+            keys.append("S" + soundex_key)
+        return keys
@@ -0,0 +1,267 @@
+'''
+Brief Description of what this code does:
+This code records how long the address book's main operations take, so
+that a report of "the address book is slow" comes with numbers. Code
+wraps an operation in "with measure('load'):", or decorates it with
+@timed('load'), and bumps counters with count(). While instrumentation
+is off these return straight away without recording anything, and
+nothing is measured per contact, so the cost is one function call per
+operation. Once enable() has been called, either by Main.py --profile
+or by the ADDRESS_BOOK_PROFILE environment variable, every measured
+operation goes into a latency histogram, and the session can also be
+run under cProfile or tracemalloc. dump() writes the histograms,
+counters and profiler results to a JSON file (and cProfile statistics
+to a .prof file beside it) when the app closes, and logs where it went.
+'''
+
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+# Environment variables enabling instrumentation ("1", "cprofile" or "tracemalloc") and naming the report file
+ENVIRONMENT_VARIABLE = "ADDRESS_BOOK_PROFILE"
+OUTPUT_VARIABLE = "ADDRESS_BOOK_PROFILE_OUTPUT"
+
+# Report file written by dump unless another is given
+DEFAULT_OUTPUT = "address_book_profile.json"
+
+# Profilers which can wrap a session
+PROFILERS = ("cprofile", "tracemalloc")
+
+# Histogram buckets grow by this factor from one microsecond up, so each covers a similar relative range
+BUCKET_GROWTH = 2 ** 0.5
+FIRST_BUCKET = 1e-6
+
+# Allocation sites reported by tracemalloc
+TRACEMALLOC_TOP = 25
+
+_session = None  # The recording Session while instrumentation is enabled, otherwise None
+
+logger = logging.getLogger(__name__)
+
+
+# Class holding a histogram of the latencies of one operation
+class LatencyHistogram:
+    # Initialise an empty histogram
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+        self.buckets = {}  # Bucket number -> number of latencies in it
+
+    # Add one latency in seconds
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+        bucket = 0 if seconds <= FIRST_BUCKET else math.ceil(math.log(seconds / FIRST_BUCKET, BUCKET_GROWTH))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    # Return the upper bound in seconds of a bucket
+    @staticmethod
+    def bucket_limit(bucket):
+        return FIRST_BUCKET * BUCKET_GROWTH ** bucket
+
+    # Return an estimate of a percentile (0 to 100) in seconds: the upper bound of the bucket holding it
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.bucket_limit(bucket), self.maximum)
+        return self.maximum
+
+    # Return the histogram as a dictionary for the report
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.minimum if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.maximum,
+            "buckets": {f"<={self.bucket_limit(bucket):.6g}s": number for bucket, number in sorted(self.buckets.items())},
+        }
+
+
+# Class timing one operation into a session's histogram
+class _Timer:
+    __slots__ = ("session", "name", "start")
+
+    # Initialise the timer for a named operation
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+
+    # Start timing
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    # Stop timing and record the latency, whether or not the operation raised
+    def __exit__(self, *exc_info):
+        self.session.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Class standing in for a timer while instrumentation is off; one shared instance does nothing
+class _NotRecording:
+    __slots__ = ()
+
+    # Do nothing on entry
+    def __enter__(self):
+        return self
+
+    # Do nothing on exit
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOT_RECORDING = _NotRecording()
+
+
+# Class holding the histograms, counters and profiler of an instrumented session
+class Session:
+    # Initialise a session, starting a profiler if one is named
+    def __init__(self, profiler=None, output=None):
+        if profiler not in (None, *PROFILERS):
+            raise ValueError(f"Unknown profiler: {profiler}")
+        self.profiler = profiler
+        self.output = output or DEFAULT_OUTPUT
+        self.started = time.time()
+        self.histograms = {}  # Operation name -> LatencyHistogram
+        self.counters = {}  # Counter name -> total
+        self._lock = threading.Lock()  # Operations are measured on worker threads as well as the Tk thread
+        self._profile = None
+        if profiler == "cprofile":
+            import cProfile
+            # cProfile only follows the thread which enabled it, i.e. the Tk main loop
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif profiler == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start()
+
+    # Add a latency in seconds to an operation's histogram
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    # Add an amount to a counter
+    def count(self, name, amount):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Return the report of the session so far as a dictionary
+    def report(self):
+        with self._lock:
+            report = {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "duration": time.time() - self.started,
+                "profiler": self.profiler,
+                "operations": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+        if self.profiler == "tracemalloc":
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                top = tracemalloc.take_snapshot().statistics("lineno")[:TRACEMALLOC_TOP]
+                report["memory"] = {
+                    "current": current,
+                    "peak": peak,
+                    "top": [{"where": str(stat.traceback), "size": stat.size, "count": stat.count} for stat in top],
+                }
+        return report
+
+    # Stop the profiler and write the report, and the cProfile statistics if any; returns the report's path
+    def dump(self, output=None):
+        output = output or self.output
+        if self._profile is not None:
+            self._profile.disable()
+            stats_path = os.path.splitext(output)[0] + ".prof"
+            self._profile.dump_stats(stats_path)
+        report = self.report()
+        if self._profile is not None:
+            report["cprofile_stats"] = stats_path
+        if self.profiler == "tracemalloc":
+            import tracemalloc
+            tracemalloc.stop()
+        temp_path = output + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        os.replace(temp_path, output)
+        return output
+
+
+# Function to check whether instrumentation is on
+def enabled():
+    return _session is not None
+
+
+# Function to turn instrumentation on, optionally under "cprofile" or "tracemalloc", and return the session
+def enable(profiler=None, output=None):
+    global _session
+    if _session is None:
+        _session = Session(profiler, output)
+    return _session
+
+
+# Function to turn instrumentation on if the environment variable asks for it
+def enable_from_environment(environ=os.environ):
+    setting = environ.get(ENVIRONMENT_VARIABLE, "").strip().lower()
+    if setting in ("", "0", "false", "no", "off"):
+        return None
+    return enable(setting if setting in PROFILERS else None, environ.get(OUTPUT_VARIABLE))
+
+
+# Function to return a context manager timing an operation, e.g. "with measure('save'):"; it does nothing when disabled
+def measure(name):
+    if _session is None:
+        return _NOT_RECORDING
+    return _Timer(_session, name)
+
+
+# Function to decorate a function so that every call to it is measured as an operation
+def timed(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with measure(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Function to add an amount to a counter; it does nothing when disabled
+def count(name, amount=1):
+    if _session is not None:
+        _session.count(name, amount)
+
+
+# Function to write the report of the session, if instrumentation is on, and turn it off; returns the report's path or None
+def dump(output=None):
+    global _session
+    if _session is None:
+        return None
+    session, _session = _session, None
+    output = session.dump(output)
+    logger.info("Profile written to %s", os.path.abspath(output))
+    return output
+
+
+enable_from_environment()
@@ -0,0 +1,156 @@
+'''
+Brief Description of what this code does:
+This code defines the LiveFilter class, which drives the search box on
+the main window. Keystrokes are debounced, so a search only starts once
+the user pauses typing. Queries long enough for the trigram index are
+answered from it on a BackgroundWorker thread, as the first one builds
+the index; shorter queries, and queries which only extend the previous
+one (so their matches must be among the previous results), are checked
+a chunk of contacts at a time from Tk's event loop. Results stream into
+the list as each chunk finishes, and a new keystroke cancels the scan in
+progress and makes the filter ignore a search still running on a
+worker, so typing never stalls.
+'''
+
+from Contact import FIELDS, SEARCH_FIELDS
+
+
+# Class running debounced, incremental searches of a contact store for a Tk widget
+class LiveFilter:
+    # Initialise the filter; on_change(ids, done) is called with the growing list of matching ids in display order,
+    # or with None when the search box is empty and every contact should be shown. Without workers, queries for the
+    # trigram index are scanned from the event loop like short ones.
+    def __init__(self, widget, store, on_change, delay=200, chunk_size=2000, fields=SEARCH_FIELDS, workers=None):
+        self.widget = widget  # Any Tk widget, used for its after method
+        self.store = store
+        self.on_change = on_change
+        self.workers = workers  # BackgroundWorker answering queries from the trigram index
+        self.delay = delay  # Milliseconds to wait after a keystroke before searching
+        self.chunk_size = chunk_size  # Contacts checked per step of a scan
+        self.fields = tuple(fields)
+        self.text = ""
+        self.results = None  # Matching ids of the current search, or None when nothing is filtered
+        self._positions = [FIELDS.index(field) for field in self.fields]
+        self._debounce_id = None
+        self._scan_id = None
+        self._scan = None
+        self._job = None  # BackgroundJob of the query running on a worker
+        self._generation = 0  # Counts cancelled searches, so a query finishing after its search was cancelled is ignored
+        self._changes = 0  # Counts changes to the store, so a query which ran while contacts changed is run again
+        if workers is not None:
+            store.subscribe(self._changed)
+        self._previous = None  # (needle, ids) of the last search which ran to completion
+
+    # Whether a search is currently filtering the contacts
+    @property
+    def active(self):
+        return self.results is not None
+
+    # Tell the filter the search box now holds text; the search starts once typing pauses
+    def set_text(self, text):
+        self.text = text
+        self._cancel()
+        self._debounce_id = self.widget.after(self.delay, self._start)
+
+    # Run the current search again from scratch, e.g. after contacts were added, edited or deleted
+    def refresh(self):
+        self._cancel()
+        self._previous = None
+        self._start()
+
+    # Stop any pending or running search
+    def cancel(self):
+        self._cancel()
+
+    # Cancel the debounce timer, any scan in progress and any query running on a worker
+    def _cancel(self):
+        self._generation += 1
+        if self._job is not None:
+            self._job.cancel()
+            self._job = None
+        if self._debounce_id is not None:
+            self.widget.after_cancel(self._debounce_id)
+            self._debounce_id = None
+        if self._scan_id is not None:
+            self.widget.after_cancel(self._scan_id)
+            self._scan_id = None
+        self._scan = None
+
+    # Start searching for the current text
+    def _start(self):
+        self._debounce_id = None
+        needle = self.text.strip().lower()
+        if not needle:
+            self.results = None
+            self._previous = None
+            self.on_change(None, True)
+            return
+
+        previous = self._previous
+        if previous is not None and previous[0] in needle:
+            # The query only grew, so every match is among the previous matches
+            candidates = previous[1]
+        elif len(needle) >= 3 and self.workers is not None:
+            # Long enough for the trigram index, which answers without scanning; on a worker, as the first query builds it
+            generation, changes = self._generation, self._changes
+            self._job = self.workers.submit(self.store.query, needle, self.fields,
+                                            on_done=lambda results: self._found(generation, changes, needle, results))
+            return
+        else:
+            candidates = None
+        self.results = []
+        self._scan = self._matches(needle, candidates)
+        self._step(needle)
+
+    # Check the next chunk of contacts, show what has been found so far and schedule the following chunk
+    def _step(self, needle):
+        self._scan_id = None
+        if self._scan is None:
+            return
+        try:
+            chunk = next(self._scan)
+        except StopIteration:
+            self._scan = None
+            self._finish(needle, self.results)
+            return
+        self.results.extend(chunk)
+        self.on_change(self.results, False)
+        # Let Tk handle keystrokes and redraws before the next chunk
+        self._scan_id = self.widget.after(1, self._step, needle)
+
+    # Report the results of a query run on a worker, unless its search was cancelled while it ran; if contacts were
+    # added, edited or deleted meanwhile the results may be out of date, so the query is run again
+    def _found(self, generation, changes, needle, results):
+        if generation != self._generation:
+            return
+        self._job = None
+        if changes != self._changes:
+            self._start()
+            return
+        self._finish(needle, results)
+
+    # Store listener counting changes, called on whichever thread made the change
+    def _changed(self, action, contact_id, old_values, new_values):
+        self._changes += 1
+
+    # Record a completed search and report it
+    def _finish(self, needle, results):
+        self.results = results
+        self._previous = (needle, results)
+        self.on_change(results, True)
+
+    # Yield lists of matching ids, chunk by chunk, from the candidates or from every contact in display order
+    def _matches(self, needle, candidates):
+        if candidates is None:
+            # Taken once, so contacts added or deleted between chunks cannot shift others past the chunk being checked
+            candidates = self.store.ids()
+        for start in range(0, len(candidates), self.chunk_size):
+            matched = []
+            for contact_id in candidates[start:start + self.chunk_size]:
+                try:
+                    values = self.store.values(contact_id)
+                except KeyError:
+                    continue  # Deleted since the previous search
+                if any(needle in str(values[position]).lower() for position in self._positions):
+                    matched.append(contact_id)
+            yield matched
@@ -0,0 +1,148 @@
+'''
+Brief Description of what this code does:
+This code defines the NgramIndex class, an inverted trigram index over
+the searchable contact fields. It maps each lower-cased n-gram to the
+ids of the contacts containing it, so a case-insensitive substring
+query only has to check the contacts that share the query's rarest
+n-gram instead of scanning the whole address book. Each posting list
+is a sorted array of 32-bit ids rather than a set, and the contacts'
+values are not copied into the index; candidates are checked against
+the store's own values. ContactStore builds the index the first time
+the filter is used and keeps it up to date from then on.
+'''
+
+from array import array
+from bisect import bisect_left, insort
+from Contact import FIELDS, SEARCH_FIELDS
+
+
+# Function to return the set of n-grams of a string
+def ngrams(text, n=3):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+# Function to check whether any of the values at some positions of a contact's values contains a lower-cased needle
+def matches(values, needle, positions):
+    return any(needle in str(values[position]).lower() for position in positions)
+
+
+# Class implementing an inverted n-gram index over contact fields
+class NgramIndex:
+    # Initialise an empty index over the given fields using n-grams of length n; lookup(contact_id) returns a
+    # contact's values (a tuple in FIELDS order) and is used to check candidates
+    def __init__(self, lookup, fields=SEARCH_FIELDS, n=3):
+        self.n = n
+        self.fields = tuple(fields)
+        self._lookup = lookup
+        self._positions = [FIELDS.index(field) for field in self.fields]
+        # n-gram -> sorted array of the ids of contacts with the n-gram in any indexed field
+        self._postings = {}
+
+    # Return the n-grams of a contact's indexed fields
+    def _grams(self, values):
+        grams = set()
+        for position in self._positions:
+            value = str(values[position]).lower()
+            if len(value) >= self.n:
+                grams |= ngrams(value, self.n)
+        return grams
+
+    # Add a contact's field values (a tuple in FIELDS order) to the index
+    def add(self, contact_id, values):
+        postings = self._postings
+        for gram in self._grams(values):
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = array("I", (contact_id,))
+            elif ids[-1] < contact_id:
+                ids.append(contact_id)
+            else:
+                insort(ids, contact_id)
+
+    # Add many (contact id, values) pairs at once, sorting only the posting lists which were appended to out of order
+    def add_many(self, items):
+        postings = self._postings
+        unsorted = set()
+        for contact_id, values in items:
+            for gram in self._grams(values):
+                ids = postings.get(gram)
+                if ids is None:
+                    postings[gram] = array("I", (contact_id,))
+                    continue
+                if ids[-1] > contact_id:
+                    unsorted.add(gram)
+                ids.append(contact_id)
+        for gram in unsorted:
+            postings[gram] = array("I", sorted(postings[gram]))
+
+    # Remove a contact's field values (as they were when added) from the index
+    def remove(self, contact_id, values):
+        postings = self._postings
+        for gram in self._grams(values):
+            ids = postings.get(gram)
+            if ids is None:
+                continue
+            position = bisect_left(ids, contact_id)
+            if position < len(ids) and ids[position] == contact_id:
+                del ids[position]
+                if not ids:
+                    del postings[gram]
+
+    # Remove many (contact id, values) pairs at once, filtering each posting list they were in a single time
+    def remove_many(self, items):
+        removed = {}
+        for contact_id, values in items:
+            for gram in self._grams(values):
+                removed.setdefault(gram, set()).add(contact_id)
+        postings = self._postings
+        for gram, ids in removed.items():
+            if gram in postings:
+                kept = array("I", (contact_id for contact_id in postings[gram] if contact_id not in ids))
+                if kept:
+                    postings[gram] = kept
+                else:
+                    del postings[gram]
+
+    # Remove everything from the index
+    def clear(self):
+        self._postings = {}
+
+    # Return the positions in FIELDS of the fields to search, checking that they are indexed
+    def positions(self, fields=None):
+        if fields is None:
+            return self._positions
+        for field in fields:
+            if field not in self.fields:
+                raise KeyError(f"Field is not indexed: {field}")
+        return [FIELDS.index(field) for field in fields]
+
+    # Return the ids of the contacts having the rarest n-gram of a needle at least n characters long, or None if a
+    # needle's n-gram is missing; this is an upper bound on its matches
+    def candidates(self, needle):
+        rarest = None
+        for gram in ngrams(needle.lower(), self.n):
+            ids = self._postings.get(gram)
+            if ids is None:
+                return None
+            if rarest is None or len(ids) < len(rarest):
+                rarest = ids
+        return rarest
+
+    # Return an upper bound on how many contacts a search for a needle at least n characters long would match
+    def estimate(self, text):
+        ids = self.candidates(text)
+        return 0 if ids is None else len(ids)
+
+    # Return the set of contact ids where any of the fields contains the text, ignoring case; the text must be at
+    # least n characters long, as shorter text has no n-gram to look up
+    def search(self, text, fields=None):
+        needle = text.lower()
+        if len(needle) < self.n:
+            raise ValueError(f"Search text must be at least {self.n} characters long")
+        positions = self.positions(fields)
+        candidates = self.candidates(needle)
+        if candidates is None:
+            return set()
+        # Sharing the rarest n-gram does not make a match, so check each candidate's values
+        lookup = self._lookup
+        return {contact_id for contact_id in candidates if matches(lookup(contact_id), needle, positions)}
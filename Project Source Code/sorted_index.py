@@ -0,0 +1,114 @@
+'''
+Brief Description of what this code does:
+This code defines the SortedIndex class, a secondary index keeping the
+ids of all contacts ordered alphabetically by one field. Each contact's
+case-folded sort key is computed once and cached, new contacts are
+placed with bisect instead of re-sorting the whole book, and sorted
+views, pages and alphabetical ranges (e.g. surnames from "M" to "N")
+are read straight from the index.
+'''
+
+from bisect import bisect_left, bisect_right, insort
+from Contact import FIELDS
+
+# Character sorting after every other, used to make range upper bounds inclusive of prefixes
+_HIGHEST = chr(0x10FFFF)
+
+
+# Function to compute the case-folded sort key of a field value
+def sort_key(value):
+    return str(value).casefold()
+
+
+# Class keeping contact ids sorted by the case-folded value of one field
+class SortedIndex:
+    # Initialise an empty index for a contact field
+    def __init__(self, field):
+        self.field = field
+        self.fields = (field,)  # Fields the index depends on, as for the other indexes
+        self._position = FIELDS.index(field)
+        # Sorted list of (sort key, contact id); the id keeps equal keys in insertion order
+        self._entries = []
+        # Cached sort key of every contact in the index
+        self._keys = {}
+
+    # Number of contacts in the index
+    def __len__(self):
+        return len(self._entries)
+
+    # Add a contact's field values (a tuple in FIELDS order) to the index
+    def add(self, contact_id, values):
+        key = sort_key(values[self._position])
+        self._keys[contact_id] = key
+        insort(self._entries, (key, contact_id))
+
+    # Add many (contact id, values) pairs at once, sorting a single time at the end
+    def add_many(self, items):
+        for contact_id, values in items:
+            key = sort_key(values[self._position])
+            self._keys[contact_id] = key
+            self._entries.append((key, contact_id))
+        self._entries.sort()
+
+    # Add the ids and the matching values of this index's field at once, e.g. a column read from a columnar file
+    def add_column(self, contact_ids, field_values):
+        for contact_id, value in zip(contact_ids, field_values):
+            key = sort_key(value)
+            self._keys[contact_id] = key
+            self._entries.append((key, contact_id))
+        self._entries.sort()
+
+    # Remove a contact from the index
+    def remove(self, contact_id, values):
+        entry = (self._keys.pop(contact_id), contact_id)
+        del self._entries[bisect_left(self._entries, entry)]
+
+    # Remove many (contact id, values) pairs at once, filtering the sorted list a single time
+    def remove_many(self, items):
+        removed = {contact_id for contact_id, values in items}
+        for contact_id in removed:
+            del self._keys[contact_id]
+        self._entries = [entry for entry in self._entries if entry[1] not in removed]
+
+    # Remove everything from the index
+    def clear(self):
+        self._entries = []
+        self._keys = {}
+
+    # Return the (sort key, contact id) pair used to order a contact
+    def entry(self, contact_id):
+        return (self._keys[contact_id], contact_id)
+
+    # Return the id of the contact at a position in sorted order
+    def id_at(self, position):
+        return self._entries[position][1]
+
+    # Return the position of a contact in sorted order
+    def position(self, contact_id):
+        return bisect_left(self._entries, self.entry(contact_id))
+
+    # Return the ids between two positions in sorted order
+    def ids(self, start=0, stop=None):
+        return [contact_id for key, contact_id in self._entries[start:stop]]
+
+    # Return one page of ids in sorted order
+    def page(self, offset, limit):
+        return self.ids(offset, offset + limit)
+
+    # Return the (sort key, contact id) entries between two positions in sorted order
+    def entries(self, start=0, stop=None):
+        return self._entries[start:stop]
+
+    # Return the position just after an entry, which need not be in the index any more; None gives the start
+    def position_after(self, entry):
+        return 0 if entry is None else bisect_right(self._entries, tuple(entry))
+
+    # Return the (start, stop) positions of the keys from low to high, where high also matches keys starting with it
+    def bounds(self, low=None, high=None):
+        start = 0 if low is None else bisect_left(self._entries, (sort_key(low),))
+        stop = len(self._entries) if high is None else bisect_right(self._entries, (sort_key(high) + _HIGHEST,))
+        return start, max(start, stop)
+
+    # Return the ids whose keys fall in a range, e.g. range("M", "N") for every key starting with M or N
+    def range(self, low=None, high=None):
+        return self.ids(*self.bounds(low, high))
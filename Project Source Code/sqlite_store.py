@@ -0,0 +1,830 @@
+'''
+Brief Description of what this code does:
+This code defines SqliteContactStore, an optional backend keeping the
+address book in a local SQLite database (e.g. contacts.db) instead of
+holding every contact in Python memory. It offers the same methods as
+ContactStore, so AddressBookApp can use either one. Sorting is pushed
+down to b-tree indexes on the case-folded first and last names, and a
+window of a sorted list is read by seeking the index from an entry
+already read beside it rather than by counting rows with OFFSET; the
+number of contacts is kept up to date rather than counted. The
+substring filter is answered by an FTS5 trigram index, and every change
+runs in its own transaction with the database in WAL mode. Lookups by
+phone number or email address use indexes on the normalised keys, the
+grouped views use an index on each facet's group, and fuzzy name search
+reads the contacts using each name word from a table of words, so only
+small summaries (the name vocabulary and the group counts) are ever
+held in memory.
+'''
+
+import csv
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+from itertools import islice
+from Contact import Contact, FIELDS, SEARCH_FIELDS
+from columnar_file import ColumnarFile, is_columnar
+from contact_store import ADD_CHUNK, SCAN_CHUNK, SORT_FIELDS, file_encoding, normalise_row, write_rows
+from contact_table import CONTACT_TYPES
+from contact_keys import EMAIL_FIELDS, PHONE_FIELDS, normalise_email, normalise_phone
+from facet_index import FACETS, NO_GROUP
+from fuzzy_search import NAME_FIELDS, FuzzyIndex, words
+from sorted_index import sort_key
+
+# File extensions which select the SQLite backend
+EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# Character sorting after every other, used to make range upper bounds inclusive of prefixes
+_HIGHEST = chr(0x10FFFF)
+
+# Entries remembered per sort order for seeking to a window of a list; past this many they are all forgotten
+CURSOR_LIMIT = 4096
+
+
+# Function to check whether a path names a SQLite contacts database
+def is_sqlite(file_path):
+    return os.path.splitext(file_path)[1].lower() in EXTENSIONS
+
+
+# Function to return the set of words in a contact's names, split as the fuzzy index splits them
+def name_words(values):
+    return {word for field in NAME_FIELDS for word in words(values[FIELDS.index(field)])}
+
+
+# Sorted view of a SqliteContactStore by one field, offering the same reads as SortedIndex
+class SqliteSortedView:
+    # Initialise a view of a store ordered by a field
+    def __init__(self, store, field):
+        self.store = store
+        self.field = field
+
+    # Number of contacts in the view
+    def __len__(self):
+        return len(self.store)
+
+    # Return the ids between two positions in sorted order
+    def ids(self, start=0, stop=None):
+        return self.store.sorted_ids(self.field, start, stop)
+
+    # Return the id of the contact at a position in sorted order
+    def id_at(self, position):
+        ids = self.ids(position, position + 1)
+        if not ids:
+            raise IndexError(position)
+        return ids[0]
+
+    # Return one page of ids in sorted order
+    def page(self, offset, limit):
+        return self.ids(offset, offset + limit)
+
+    # Return the ids whose keys fall in a range, e.g. range("M", "N") for every key starting with M or N
+    def range(self, low=None, high=None):
+        return self.store.range(self.field, low, high)
+
+    # Return the (start, stop) positions of the keys from low to high, as SortedIndex.bounds does, counted on the sort index
+    def bounds(self, low=None, high=None):
+        field = self.field
+        start = 0 if low is None else self.store._scalar(f"SELECT COUNT(*) FROM contacts WHERE casefold({field}) < ?", (sort_key(low),))
+        if high is None:
+            return start, len(self)
+        stop = self.store._scalar(f"SELECT COUNT(*) FROM contacts WHERE casefold({field}) <= ?", (sort_key(high) + _HIGHEST,))
+        return start, max(start, stop)
+
+
+# Grouped view of a SqliteContactStore by a facet, offering the same reads as FacetIndex. A group's contacts are read
+# through an index on the facet's group, surname and id; the groups and their counts are few, so they are read once and
+# then kept up to date from the store's changes like an index.
+class SqliteFacetView:
+    # Initialise a view of a store grouped by a facet named in FACETS, creating its index in the database if needed
+    def __init__(self, store, facet):
+        self.store = store
+        self.facet = facet
+        self.title, self._group_of, field = FACETS[facet]
+        self._position = FIELDS.index(field)
+        self._group = f"facet_group('{facet}', {field})"  # Expression matching the index
+        store._create_index(f"contacts_by_{facet}", f"{self._group}, casefold(last_name), id")
+        self._names = None  # Sorted list of (no group, group sort key, group), or None until the groups are read
+        self._counts = None  # Group -> number of contacts
+
+    # Number of contacts in the view
+    def __len__(self):
+        return len(self.store)
+
+    # Count a contact in its group, once the groups have been read
+    def add(self, contact_id, values):
+        if self._names is not None:
+            group = self._group_of(values[self._position])
+            count = self._counts.get(group, 0)
+            if not count:
+                insort(self._names, (group == NO_GROUP, sort_key(group), group))
+            self._counts[group] = count + 1
+
+    # Stop counting a contact in its group
+    def remove(self, contact_id, values):
+        if self._names is not None:
+            group = self._group_of(values[self._position])
+            count = self._counts.get(group, 0)
+            if count > 1:
+                self._counts[group] = count - 1
+            elif count:
+                del self._counts[group]
+                del self._names[bisect_left(self._names, (group == NO_GROUP, sort_key(group), group))]
+
+    # Forget the groups, so they are read again when next needed
+    def clear(self):
+        self._names = None
+        self._counts = None
+
+    # Number of groups
+    def group_count(self):
+        return len(self._read_groups())
+
+    # Return (group, number of contacts) for the groups between two positions in order
+    def groups(self, start=0, stop=None):
+        return [(group, self._counts[group]) for no_group, key, group in self._read_groups()[start:stop]]
+
+    # Return the group at a position in order
+    def group_at(self, position):
+        return self._read_groups()[position][2]
+
+    # Return the position of the first group at or after some text alphabetically, as FacetIndex.find does
+    def find(self, text):
+        return bisect_left(self._read_groups(), (False, sort_key(text)))
+
+    # Return the group a contact is in
+    def group_of(self, contact_id):
+        return self._group_of(self.store.values(contact_id)[self._position])
+
+    # Number of contacts in a group
+    def count(self, group):
+        self._read_groups()
+        return self._counts.get(group, 0)
+
+    # Return the ids of a group's contacts between two positions, sorted by surname
+    def ids(self, group, start=0, stop=None):
+        limit = -1 if stop is None else max(0, stop - start)
+        rows = self.store._rows(f"SELECT id FROM contacts WHERE {self._group} = ? ORDER BY casefold(last_name), id LIMIT ? OFFSET ?", (group, limit, start))
+        return [contact_id for (contact_id,) in rows]
+
+    # Return the id of the contact at a position in a group
+    def id_at(self, group, position):
+        ids = self.ids(group, position, position + 1)
+        if not ids:
+            raise IndexError(position)
+        return ids[0]
+
+    # Return the sorted groups, reading them and their counts from the facet's index if they are not known
+    def _read_groups(self):
+        with self.store.lock:
+            if self._names is None:
+                self._counts = dict(self.store._rows(f"SELECT {self._group}, COUNT(*) FROM contacts GROUP BY {self._group}"))
+                self._names = sorted((group == NO_GROUP, sort_key(group), group) for group in self._counts)
+            return self._names
+
+
+# Fuzzy name index for a SqliteContactStore: only the vocabulary of distinct name words, with their trigrams and
+# phonetic keys, is held in memory, and the contacts using a word are read from the contact_words table
+class SqliteFuzzyIndex(FuzzyIndex):
+    # Initialise the vocabulary from the words table of a store
+    def __init__(self, store):
+        self.store = store
+        super().__init__()
+
+    # Read the vocabulary again from the words table, e.g. once the book has been erased or put back
+    def clear(self):
+        super().clear()
+        for word, count in self.store._rows("SELECT word, COUNT(*) FROM contact_words GROUP BY word"):
+            self._postings[word] = count
+            self._add_word(word)
+
+    # Count a contact's name words, adding new ones to the vocabulary
+    def add(self, contact_id, values):
+        for word in self._contact_words(values):
+            count = self._postings.get(word, 0)
+            if not count:
+                self._add_word(word)
+            self._postings[word] = count + 1
+
+    # Stop counting a contact's name words, removing those no contact uses any more
+    def remove(self, contact_id, values):
+        for word in self._contact_words(values):
+            count = self._postings.get(word, 0)
+            if count > 1:
+                self._postings[word] = count - 1
+            elif count:
+                del self._postings[word]
+                self._remove_word(word)
+
+    # Return the set of ids of the contacts using a vocabulary word, read from the words table
+    def _word_ids(self, word):
+        return {contact_id for (contact_id,) in self.store._rows("SELECT id FROM contact_words WHERE word = ?", (word,))}
+
+
+# Class holding the contacts of an address book in a SQLite database
+class SqliteContactStore:
+    # Open (or create) the database and make sure its tables and indexes exist
+    def __init__(self, db_path, sort_fields=SORT_FIELDS):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self._listeners = []
+        self._display_field = sort_fields[0]
+        # Entries already read from each sort order, field -> (sorted positions, {position: (sort key, id)}), so a
+        # window of a list is read by seeking the sort index from an entry beside it; forgotten on every change
+        self._cursors = {}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # Python's case folding, so the database orders and matches exactly like the in-memory store
+        self._conn.create_function("casefold", 1, lambda value: sort_key("" if value is None else value), deterministic=True)
+        # Lookup keys and facet groups worked out as the in-memory indexes do, so they can be indexed in the database
+        self._conn.create_function("phone_key", 1, lambda value: normalise_phone("" if value is None else value), deterministic=True)
+        self._conn.create_function("email_key", 1, lambda value: normalise_email("" if value is None else value), deterministic=True)
+        self._conn.create_function("facet_group", 2, lambda facet, value: FACETS[facet][1]("" if value is None else value), deterministic=True)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._drop_cleared()
+        self._cleared = 0  # Number of books erased by clear, which names the tables each one is kept in
+        # Columns -> name of every index on the contacts table, so they can be made again on an emptied table
+        self._indexed = {f"casefold({field}), id": f"contacts_by_{field}" for field in sort_fields}
+        # Indexes on the normalised phone numbers and email addresses, so finding who owns one is an index lookup
+        for field in PHONE_FIELDS:
+            self._indexed[f"phone_key({field})"] = f"contacts_by_{field}_key"
+        for field in EMAIL_FIELDS:
+            self._indexed[f"email_key({field})"] = f"contacts_by_{field}_key"
+        self._create_tables()
+        # Small indexes kept beside the database by class and arguments (the fuzzy name vocabulary, the groups of each
+        # facet), each made when first used and told about every change from then on
+        self._memory_indexes = {}
+
+    # Number of contacts in the database, counted when it is opened and kept up to date by every change
+    def __len__(self):
+        return self._count
+
+    # Iterate over the contacts in display order
+    def __iter__(self):
+        for row in self._rows(f"SELECT * FROM contacts ORDER BY {self._order(self._display_field)}"):
+            yield Contact(*row[1:])
+
+    # Check whether a contact id is present in the database
+    def __contains__(self, contact_id):
+        return self._scalar("SELECT COUNT(*) FROM contacts WHERE id = ?", (contact_id,)) > 0
+
+    # Id which the next added contact will receive
+    @property
+    def next_id(self):
+        return self._scalar("SELECT COALESCE(MAX(id), -1) + 1 FROM contacts")
+
+    # Return the ids of contacts between two positions in display order
+    def ids(self, start=0, stop=None):
+        return self.sorted_ids(self._display_field, start, stop)
+
+    # Return the contact with the given id
+    def get(self, contact_id):
+        return Contact(*self.values(contact_id))
+
+    # Return a contact's field values as a tuple in FIELDS order
+    def values(self, contact_id):
+        rows = self._rows(f"SELECT {', '.join(FIELDS)} FROM contacts WHERE id = ?", (contact_id,))
+        if not rows:
+            raise KeyError(contact_id)
+        return rows[0]
+
+    # Return the text shown for a contact in lists, matching str(Contact)
+    def name(self, contact_id):
+        values = self.values(contact_id)
+        return f"{values[0]} {values[1]}"
+
+    # Return the id of the contact shown at a position in the display order
+    def id_at(self, position):
+        return SqliteSortedView(self, self._display_field).id_at(position)
+
+    # Return the contact shown at a position in the display order
+    def contact_at(self, position):
+        return self.get(self.id_at(position))
+
+    # Return the position of a contact in the display order, counted on the sort index
+    def position(self, contact_id):
+        field = self._display_field
+        key = sort_key(self.values(contact_id)[FIELDS.index(field)])
+        return self._scalar(f"SELECT COUNT(*) FROM contacts WHERE (casefold({field}), id) < (?, ?)", (key, contact_id))
+
+    # Create a b-tree index for sorting by another field and return a sorted view over it
+    def add_sort_index(self, field):
+        self._create_sort_index(field)
+        return SqliteSortedView(self, field)
+
+    # Register a callback told about every change, as for ContactStore.subscribe
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    # Stop telling a callback about changes
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+
+    # Add a contact (a Contact or a sequence of field values) and return its id
+    def add(self, contact, contact_id=None):
+        values = self._row_values(contact)
+        with self.lock, self._conn:
+            cursor = self._conn.execute(f"INSERT INTO contacts (id, {', '.join(FIELDS)}) VALUES (?{', ?' * len(FIELDS)})", (contact_id, *values))
+            contact_id = cursor.lastrowid
+            self._search_insert([(contact_id, *values)])
+            self._changed(1)
+            self._notify("add", contact_id, None, values)
+        return contact_id
+
+    # Update the fields of a contact; values is a sequence in FIELDS order or a dict of field names
+    def update(self, contact_id, values):
+        if not isinstance(values, dict):
+            values = dict(zip(FIELDS, values))
+        for field in values:
+            if field not in FIELDS:
+                raise KeyError(f"Unknown contact field: {field}")
+        with self.lock, self._conn:
+            old_values = self.values(contact_id)
+            new_values = tuple(values.get(field, old) for field, old in zip(FIELDS, old_values))
+            assignments = ", ".join(f"{field} = ?" for field in FIELDS)
+            self._conn.execute(f"UPDATE contacts SET {assignments} WHERE id = ?", (*new_values, contact_id))
+            self._search_delete(contact_id, old_values)
+            self._search_insert([(contact_id, *new_values)])
+            self._changed()
+            self._notify("update", contact_id, old_values, new_values)
+        return Contact(*new_values)
+
+    # Update many contacts from (contact id, values) pairs in one transaction and return how many were updated;
+    # nothing is changed if any id or field is unknown
+    def update_many(self, updates):
+        updates = [(contact_id, values if isinstance(values, dict) else dict(zip(FIELDS, values))) for contact_id, values in updates]
+        for contact_id, values in updates:
+            for field in values:
+                if field not in FIELDS:
+                    raise KeyError(f"Unknown contact field: {field}")
+        with self.lock, self._conn:
+            changes = []
+            for contact_id, values in updates:
+                old_values = self.values(contact_id)
+                changes.append((contact_id, old_values, tuple(values.get(field, old) for field, old in zip(FIELDS, old_values))))
+            assignments = ", ".join(f"{field} = ?" for field in FIELDS)
+            self._conn.executemany(f"UPDATE contacts SET {assignments} WHERE id = ?", [(*new_values, contact_id) for contact_id, old_values, new_values in changes])
+            for contact_id, old_values, new_values in changes:
+                self._search_delete(contact_id, old_values)
+            self._search_insert([(contact_id, *new_values) for contact_id, old_values, new_values in changes])
+            self._changed()
+            for contact_id, old_values, new_values in changes:
+                self._notify("update", contact_id, old_values, new_values)
+        return len(changes)
+
+    # Delete a contact and return it
+    def delete(self, contact_id):
+        with self.lock, self._conn:
+            values = self.values(contact_id)
+            self._conn.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
+            self._search_delete(contact_id, values)
+            self._changed(-1)
+            self._notify("delete", contact_id, values, None)
+        return Contact(*values)
+
+    # Delete many contacts in one transaction and return their values in the same order; nothing is deleted if any id is unknown
+    def delete_many(self, contact_ids):
+        with self.lock, self._conn:
+            removed = [(contact_id, self.values(contact_id)) for contact_id in contact_ids]
+            self._conn.executemany("DELETE FROM contacts WHERE id = ?", [(contact_id,) for contact_id, values in removed])
+            for contact_id, values in removed:
+                self._search_delete(contact_id, values)
+            self._changed(-len(removed))
+            for contact_id, values in removed:
+                self._notify("delete", contact_id, values, None)
+        return [values for contact_id, values in removed]
+
+    # Remove every contact from the database and return the prefix of the tables they are kept in, which restore takes
+    # to put them back. The tables are renamed out of the way and empty ones made in their place, so erasing a whole
+    # book and undoing it take the same time as for a single contact; kept tables are dropped when the database is
+    # next opened.
+    def clear(self):
+        with self.lock, self._conn:
+            self._begin()
+            self._cleared += 1
+            state = f"cleared{self._cleared}_"
+            for table in self._tables():
+                self._conn.execute(f"ALTER TABLE {table} RENAME TO {state}{table}")
+            self._create_tables()
+            self._changed()
+            self._notify("clear", None, state, None)
+        return state
+
+    # Put back the contacts removed by clear, renaming their tables back in place of the empty ones; the store must be
+    # empty again
+    def restore(self, state):
+        with self.lock, self._conn:
+            if len(self):
+                raise ValueError("Cleared contacts can only be restored into an empty contact store")
+            self._begin()
+            for table in reversed(self._tables()):
+                self._conn.execute(f"DROP TABLE {table}")
+                self._conn.execute(f"ALTER TABLE {state}{table} RENAME TO {table}")
+            # Indexes first made while the book was erased are only on the dropped tables
+            for columns, name in list(self._indexed.items()):
+                self._create_index(name, columns)
+            self._changed(self._scalar("SELECT COUNT(*) FROM contacts"))
+            self._notify("restore", None, None, None)
+
+    # Nothing to build ahead of the first filter, as the full-text index is kept up to date by the database
+    def build_search_index(self):
+        pass
+
+    # Close the database connection
+    def close(self):
+        with self.lock:
+            self._conn.close()
+
+    # Return the ids of contacts where any of the fields contains the text, ignoring case, in display order
+    def query(self, text, fields=SEARCH_FIELDS):
+        if not text:
+            return self.ids()
+        for field in fields:
+            if field not in SEARCH_FIELDS:
+                raise KeyError(f"Field is not indexed: {field}")
+        needle = text.lower()
+        select = f"SELECT id, {', '.join(fields)} FROM contacts"
+        order = self._order(self._display_field)
+        if self._fts and len(needle) >= 3:
+            # Trigram full-text match, restricted to the chosen columns
+            match = "{" + " ".join(fields) + "} : " + '"' + needle.replace('"', '""') + '"'
+            rows = self._rows(f"{select} WHERE id IN (SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH ?) ORDER BY {order}", (match,))
+        else:
+            # Queries shorter than a trigram, or databases without FTS5, are checked row by row
+            rows = self._rows(f"{select} ORDER BY {order}")
+        # The trigram tokenizer folds case slightly differently from Python, so confirm each match
+        return [row[0] for row in rows if any(needle in value.lower() for value in row[1:])]
+
+    # Yield the (sort key, contact id) entries of contacts matching a query in display order after a cursor, one list
+    # per chunk, as ContactStore.scan_query does; each chunk is a keyset query continuing from the last entry read
+    def scan_query(self, text, fields=SEARCH_FIELDS, after=None, chunk_size=SCAN_CHUNK):
+        for field in fields:
+            if field not in SEARCH_FIELDS:
+                raise KeyError(f"Field is not indexed: {field}")
+        needle = text.lower()
+        condition, parameters = None, ()
+        if self._fts and len(needle) >= 3:
+            condition = "id IN (SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH ?)"
+            parameters = ("{" + " ".join(fields) + "} : " + '"' + needle.replace('"', '""') + '"',)
+        for rows in self._scan(self._display_field, after, chunk_size, fields, condition, parameters):
+            # As in query, the trigram tokenizer's case folding differs slightly from Python's, so confirm each match
+            yield [(key, contact_id) for key, contact_id, *values in rows if any(needle in value.lower() for value in values)]
+
+    # Yield the (sort key, contact id) entries of every contact sorted by a field after a cursor, chunk_size at a time
+    def scan_sorted(self, field, after=None, chunk_size=SCAN_CHUNK):
+        if field not in FIELDS:
+            raise KeyError(f"Unknown contact field: {field}")
+        yield from self._scan(field, after, chunk_size)
+
+    # Return the contacts matching a query in display order
+    def query_contacts(self, text, fields=SEARCH_FIELDS):
+        return [self.get(contact_id) for contact_id in self.query(text, fields)]
+
+    # Return up to limit (contact id, score) pairs whose names best match the text, allowing typos and spelling variants
+    def fuzzy_query(self, text, limit=10):
+        with self.lock:
+            return self._memory_index(SqliteFuzzyIndex).search(text, limit)
+
+    # Return the view grouping the contacts by a facet named in FACETS, read through an index in the database
+    def facet_index(self, facet):
+        if facet not in FACETS:
+            raise KeyError(f"Unknown facet: {facet}")
+        with self.lock:
+            return self._memory_index(SqliteFacetView, facet)
+
+    # Return the ids of contacts with a phone number, however it was written, in display order
+    def find_by_phone(self, number):
+        key = normalise_phone(number)
+        if not key:
+            return []
+        condition = " OR ".join(f"phone_key({field}) = ?" for field in PHONE_FIELDS)
+        rows = self._rows(f"SELECT id FROM contacts WHERE {condition} ORDER BY {self._order(self._display_field)}", (key,) * len(PHONE_FIELDS))
+        return [contact_id for (contact_id,) in rows]
+
+    # Return the ids of contacts with an email address, ignoring case, in display order
+    def find_by_email(self, email):
+        key = normalise_email(email)
+        if not key:
+            return []
+        condition = " OR ".join(f"email_key({field}) = ?" for field in EMAIL_FIELDS)
+        rows = self._rows(f"SELECT id FROM contacts WHERE {condition} ORDER BY {self._order(self._display_field)}", (key,) * len(EMAIL_FIELDS))
+        return [contact_id for (contact_id,) in rows]
+
+    # Return the ids of contacts between two positions when sorted alphabetically by a field, read from its index. The
+    # index is read as scan_sorted reads it, seeking past the nearest entry already read before the window, or back
+    # from the nearest one after it, so scrolling a long list reads the rows shown rather than every row above them.
+    def sorted_ids(self, field, start=0, stop=None):
+        if field not in FIELDS:
+            raise KeyError(f"Unknown contact field: {field}")
+        with self.lock:
+            stop = self._count if stop is None else min(stop, self._count)
+            if start >= stop:
+                return []
+            positions, entries = self._cursors.setdefault(field, ([], {}))
+            # The entry before the window, or none to read from the start of the list
+            index = bisect_left(positions, start)
+            before = positions[index - 1] if index else -1
+            # The entry after the window, or none to read back from the end of the list
+            index = bisect_left(positions, stop)
+            after = positions[index] if index < len(positions) else self._count
+            if start - before - 1 <= after - stop:
+                rows = self._seek(field, ">", entries.get(before), stop - start, start - before - 1)
+            else:
+                rows = self._seek(field, "<", entries.get(after), stop - start, after - stop)[::-1]
+            if rows:
+                if len(positions) >= CURSOR_LIMIT:
+                    positions.clear()
+                    entries.clear()
+                for position, entry in ((start, rows[0]), (start + len(rows) - 1, rows[-1])):
+                    if position not in entries:
+                        insort(positions, position)
+                        entries[position] = entry
+        return [contact_id for key, contact_id in rows]
+
+    # Return all contacts sorted alphabetically by a field
+    def sort(self, field):
+        return [self.get(contact_id) for contact_id in self.sorted_ids(field)]
+
+    # Return one page of contact ids sorted by a field
+    def page(self, field, offset, limit):
+        return self.sorted_ids(field, offset, offset + limit)
+
+    # Return the ids of contacts whose field falls alphabetically between low and high, e.g. surnames from "M" to "N"
+    def range(self, field, low=None, high=None):
+        if field not in FIELDS:
+            raise KeyError(f"Unknown contact field: {field}")
+        conditions, parameters = [], []
+        if low is not None:
+            conditions.append(f"casefold({field}) >= ?")
+            parameters.append(sort_key(low))
+        if high is not None:
+            conditions.append(f"casefold({field}) <= ?")
+            parameters.append(sort_key(high) + _HIGHEST)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        rows = self._rows(f"SELECT id FROM contacts {where} ORDER BY {self._order(field)}", parameters)
+        return [contact_id for (contact_id,) in rows]
+
+    # Import contacts from a comma separated or columnar (.abk) file and return how many were read; takes the same arguments as ContactStore.load
+    def load(self, file_path="contacts.txt", contact_ids=None, chunk_size=None, progress=None):
+        if os.path.abspath(file_path) == os.path.abspath(self.db_path):
+            return len(self)
+        if not os.path.exists(file_path):
+            return 0
+        if is_columnar(file_path):
+            mapped = ColumnarFile(file_path)
+            try:
+                count = self.add_many((mapped.row(row) for row in range(mapped.count)), contact_ids)
+            finally:
+                mapped.close()
+        else:
+            with open(file_path, "r", newline="", encoding=file_encoding(file_path)) as file:
+                count = self.add_many((row for row in csv.reader(file) if any(row)), contact_ids)
+        # Progress is only reported at the end, as the rows are inserted a chunk per transaction by add_many
+        if progress:
+            total = os.path.getsize(file_path)
+            progress(count, total, total)
+        return count
+
+    # Add many contacts or rows and return how many were added. Rows are read outside the lock and inserted ADD_CHUNK
+    # at a time, each chunk in one transaction, so a slow stream such as an import being parsed does not hold up other threads.
+    def add_many(self, rows, contact_ids=None):
+        rows = iter(rows)
+        contact_ids = iter(contact_ids) if contact_ids is not None else None
+        count = 0
+        insert = f"INSERT INTO contacts (id, {', '.join(FIELDS)}) VALUES (?{', ?' * len(FIELDS)})"
+        while True:
+            batch = [(next(contact_ids) if contact_ids is not None else None, *self._row_values(row)) for row in islice(rows, ADD_CHUNK)]
+            if not batch:
+                return count
+            with self.lock, self._conn:
+                count += self._insert_batch(insert, batch)
+
+    # Return the ids and values of every contact in display order
+    def snapshot(self):
+        with self.lock:
+            rows = self._rows(f"SELECT * FROM contacts ORDER BY {self._order(self._display_field)}")
+        return [row[0] for row in rows], [row[1:] for row in rows]
+
+    # Export all contacts in display order to a comma separated or columnar (.abk) file; the database itself is always saved
+    def save(self, file_path="contacts.txt"):
+        if os.path.abspath(file_path) == os.path.abspath(self.db_path):
+            return
+        with self.lock:
+            cursor = self._conn.execute(f"SELECT {', '.join(FIELDS)} FROM contacts ORDER BY {self._order(self._display_field)}")
+            write_rows(file_path, cursor)
+
+    # Yield rows of (sort key, id, values of columns...) sorted by a field after a cursor, chunk_size rows per query;
+    # each query seeks the sort index past the last row read, so a deep page costs no more than the first
+    def _scan(self, field, after, chunk_size, columns=(), condition=None, parameters=()):
+        while True:
+            rows = self._seek(field, ">", after, chunk_size, 0, columns, condition, parameters)
+            if not rows:
+                return
+            after = rows[-1][:2]
+            yield rows
+
+    # Return up to limit rows of (sort key, id, values of columns...) sorted by a field, after (">") or before ("<") a
+    # (sort key, id) entry if one is given, skipping the first skip of them and keeping only those meeting a condition
+    # if one is given; rows before an entry come nearest first. The rows sharing the entry's key and those beyond its
+    # key are read separately, as SQLite seeks the sort index to either but not to a row value of the key and id.
+    def _seek(self, field, direction, entry, limit, skip=0, columns=(), condition=None, parameters=()):
+        order = self._order(field) if direction == ">" else f"casefold({field}) DESC, id DESC"
+
+        # Run the query for the rows meeting some conditions besides the condition given, selecting some columns
+        def read(select, conditions, values, clauses="", arguments=()):
+            conditions = ([condition] if condition is not None else []) + conditions
+            where = "WHERE " + " AND ".join(conditions) if conditions else ""
+            return self._rows(f"SELECT {select} FROM contacts {where} {clauses}", (*parameters, *values, *arguments))
+
+        select = ", ".join((f"casefold({field})", "id", *columns))
+        page = f"ORDER BY {order} LIMIT ? OFFSET ?"
+        if entry is None:
+            return read(select, [], (), page, (limit, skip))
+        key, contact_id = entry
+        same_key = [f"casefold({field}) = ?", f"id {direction} ?"]
+        with self.lock:
+            # Ordered by id alone, which is the same order within one key, as SQLite would otherwise sort the rows again
+            rows = read(select, same_key, (key, contact_id), f"ORDER BY id {'ASC' if direction == '>' else 'DESC'} LIMIT ? OFFSET ?", (limit, skip))
+            if len(rows) == limit:
+                return rows
+            if rows:
+                skip = 0
+            elif skip:
+                # The rows sharing the key were all skipped, so fewer are left to skip beyond it
+                skip -= read("COUNT(*)", same_key, (key, contact_id))[0][0]
+            return rows + read(select, [f"casefold({field}) {direction} ?"], (key,), page, (limit - len(rows), skip))
+
+    # Note a change to the contacts, count of them added (or removed, if negative): positions in the sort orders move,
+    # so the entries read from them are forgotten
+    def _changed(self, count=0):
+        self._count += count
+        self._cursors.clear()
+
+    # Return the ORDER BY clause sorting by a field's case-folded value, as the sort indexes are built
+    def _order(self, field):
+        return f"casefold({field}), id"
+
+    # Create the b-tree index used to sort by a field
+    def _create_sort_index(self, field):
+        if field not in FIELDS:
+            raise KeyError(f"Unknown contact field: {field}")
+        self._create_index(f"contacts_by_{field}", f"casefold({field}), id")
+
+    # Create an index on some columns of the contacts table unless it has one already. The indexes of a book erased by
+    # clear keep their names, so the next free name after the usual one is taken if it is in use.
+    def _create_index(self, name, columns):
+        with self.lock:
+            self._indexed.setdefault(columns, name)
+            names = set()
+            for index_name, table, sql in self._rows("SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'index'"):
+                if table == "contacts" and sql and sql.endswith(f"({columns})"):
+                    return
+                names.add(index_name)
+            free_name, number = name, 1
+            while free_name in names:
+                number += 1
+                free_name = f"{name}_{number}"
+            self._conn.execute(f"CREATE INDEX {free_name} ON contacts ({columns})")
+
+    # Create the contacts table, its indexes, the full-text index and the table of name words where they do not exist
+    def _create_tables(self):
+        columns = ", ".join(f"{field} TEXT NOT NULL DEFAULT ''" for field in FIELDS)
+        with self.lock:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS contacts (id INTEGER PRIMARY KEY, {columns})")
+            self._count = self._scalar("SELECT COUNT(*) FROM contacts")
+            for indexed, name in list(self._indexed.items()):
+                self._create_index(name, indexed)
+            self._fts = self._create_fts()
+            self._create_words()
+
+    # Return the names of the tables holding the book, the full-text index last
+    def _tables(self):
+        return ["contacts", "contact_words"] + (["contacts_fts"] if self._fts else [])
+
+    # Start a transaction unless one is open, so renaming and creating tables commit or roll back together
+    def _begin(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    # Drop the tables of books erased by clear in an earlier session, which no undo history can restore any more; a
+    # full-text index is dropped first, as that drops its own tables
+    def _drop_cleared(self):
+        with self.lock:
+            for virtual in (1, 0):
+                tables = self._rows("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'cleared[0-9]*_*' AND (sql LIKE 'CREATE VIRTUAL%') = ?", (virtual,))
+                for (table,) in tables:
+                    self._conn.execute(f"DROP TABLE {table}")
+
+    # Create the FTS5 trigram index if SQLite supports it, returning whether it is available
+    def _create_fts(self):
+        columns = ", ".join(SEARCH_FIELDS)
+        try:
+            with self.lock:
+                exists = self._scalar("SELECT COUNT(*) FROM sqlite_master WHERE name = 'contacts_fts'")
+                self._conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5({columns}, content='contacts', content_rowid='id', tokenize='trigram')")
+                # A new index over an empty table, as clear makes, has nothing to fill and must not commit clear's transaction
+                if not exists and len(self):
+                    with self._conn:
+                        self._conn.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError:
+            # SQLite builds without FTS5 or its trigram tokenizer fall back to row by row matching
+            return False
+
+    # Insert rows of (id, values...) and their full-text entries, returning how many were inserted
+    def _insert_batch(self, insert, batch):
+        if not batch:
+            return 0
+        if any(contact_id is None for contact_id, *values in batch):
+            # Ids are assigned by SQLite, so insert one at a time to learn them
+            rows = []
+            for contact_id, *values in batch:
+                rows.append((self._conn.execute(insert, (contact_id, *values)).lastrowid, *values))
+        else:
+            self._conn.executemany(insert, batch)
+            rows = batch
+        self._search_insert(rows)
+        self._changed(len(rows))
+        if self._listeners:
+            for contact_id, *values in rows:
+                self._notify("add", contact_id, None, tuple(values))
+        return len(rows)
+
+    # Create the table of the words in each contact's names, which answers fuzzy searches, filling it if it is new
+    def _create_words(self):
+        with self.lock:
+            exists = self._scalar("SELECT COUNT(*) FROM sqlite_master WHERE name = 'contact_words'")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS contact_words (word TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (word, id)) WITHOUT ROWID")
+            if not exists and len(self):
+                with self._conn:
+                    self._words_insert(self._rows(f"SELECT id, {', '.join(FIELDS)} FROM contacts"))
+
+    # Add rows of (id, values...) to the full-text index and the words table
+    def _search_insert(self, rows):
+        self._fts_insert(rows)
+        self._words_insert(rows)
+
+    # Remove a contact's old values from the full-text index and the words table
+    def _search_delete(self, contact_id, values):
+        self._fts_delete(contact_id, values)
+        self._conn.executemany("DELETE FROM contact_words WHERE word = ? AND id = ?", [(word, contact_id) for word in name_words(values)])
+
+    # Add the name words of rows of (id, values...) to the words table
+    def _words_insert(self, rows):
+        self._conn.executemany("INSERT OR IGNORE INTO contact_words (word, id) VALUES (?, ?)", [(word, row[0]) for row in rows for word in name_words(row[1:])])
+
+    # Add rows of (id, values...) to the full-text index
+    def _fts_insert(self, rows):
+        if self._fts:
+            columns = ", ".join(SEARCH_FIELDS)
+            placeholders = ", ".join("?" * len(SEARCH_FIELDS))
+            self._conn.executemany(f"INSERT INTO contacts_fts (rowid, {columns}) VALUES (?, {placeholders})", [(row[0], *row[1:1 + len(SEARCH_FIELDS)]) for row in rows])
+
+    # Remove a contact's old values from the full-text index
+    def _fts_delete(self, contact_id, values):
+        if self._fts:
+            columns = ", ".join(SEARCH_FIELDS)
+            placeholders = ", ".join("?" * len(SEARCH_FIELDS))
+            self._conn.execute(f"INSERT INTO contacts_fts (contacts_fts, rowid, {columns}) VALUES ('delete', ?, {placeholders})", (contact_id, *values[:len(SEARCH_FIELDS)]))
+
+    # Turn a Contact or a row into a tuple of field values
+    def _row_values(self, row):
+        if isinstance(row, CONTACT_TYPES):
+            return tuple(getattr(row, field) for field in FIELDS)
+        return tuple(normalise_row(row))
+
+    # Run a query and return all of its rows
+    def _rows(self, sql, parameters=()):
+        with self.lock:
+            return self._conn.execute(sql, parameters).fetchall()
+
+    # Run a query returning a single value
+    def _scalar(self, sql, parameters=()):
+        return self._rows(sql, parameters)[0][0]
+
+    # Return the index kept beside the database made by a class from the store and some arguments, making it the first time
+    def _memory_index(self, index_class, *args):
+        index = self._memory_indexes.get((index_class, *args))
+        if index is None:
+            index = index_class(self, *args)
+            if not self._memory_indexes:
+                # Keep the in-memory indexes up to date from then on
+                self.subscribe(self._update_memory_indexes)
+            self._memory_indexes[(index_class, *args)] = index
+        return index
+
+    # Listener applying a change to every in-memory index
+    def _update_memory_indexes(self, action, contact_id, old_values, new_values):
+        for index in self._memory_indexes.values():
+            if action in ("clear", "restore"):
+                index.clear()
+                continue
+            if old_values is not None:
+                index.remove(contact_id, old_values)
+            if new_values is not None:
+                index.add(contact_id, new_values)
+
+    # Tell every listener about a change
+    def _notify(self, action, contact_id, old_values, new_values):
+        for callback in self._listeners:
+            callback(action, contact_id, old_values, new_values)
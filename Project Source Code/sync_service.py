@@ -0,0 +1,461 @@
+'''
+Brief Description of what this code does:
+This code keeps several copies of the address book in step through a
+small sync server, instead of copying the whole contacts file from desk
+to desk. Every contact gets a global id and a hybrid logical clock
+stamp (wall clock milliseconds, a counter and the id of the copy which
+made the change), and a deleted contact leaves a tombstone. A SyncClient
+follows the changes made to its contact store and, on each sync, sends
+the server only the contacts changed since the last sync and receives
+only the contacts other copies changed. Requests and replies are JSON
+compressed with zlib and sent in batches. When two copies change the
+same contact before syncing, the change with the later stamp wins
+everywhere, so every copy ends up the same whatever order they sync in.
+The client's state (global ids, stamps and unsent changes) is kept in a
+.sync file beside the contacts file. On start-up the contacts are
+matched to it by content, so a contact changed while sync was not
+running is sent as a new contact and the old one is deleted. Run as a
+script it starts the server, or syncs a contacts file once.
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+# Address and port the server listens on unless others are given
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Most changed contacts sent in one request or reply
+BATCH_SIZE = 1000
+
+# Seconds to wait for the server before giving up on a sync
+TIMEOUT = 10
+
+# Seconds between saves of the server's state while changes are arriving
+SAVE_INTERVAL = 5.0
+
+
+# Function to return a short digest of a contact's values, used to recognise the contact again on start-up
+def values_digest(values):
+    return hashlib.sha1("\x1f".join(values).encode("utf-8")).hexdigest()[:16]
+
+
+# Function to compress a JSON document for sending
+def encode_message(message):
+    return zlib.compress(json.dumps(message, separators=(",", ":")).encode("utf-8"))
+
+
+# Function to decompress a JSON document received
+def decode_message(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+# Function to write a JSON document through a temporary file, so a crash never leaves it half written
+def write_json(file_path, document):
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(document, file, separators=(",", ":"))
+    os.replace(temp_path, file_path)
+
+
+# Class implementing a hybrid logical clock: stamps follow the wall clock, but always move forward past every stamp seen,
+# and the node id breaks ties, so stamps from different copies are never equal
+class HybridClock:
+    # Initialise the clock of a node, continuing from a saved wall time and counter
+    def __init__(self, node, wall=0, counter=0):
+        self.node = node
+        self.wall = wall
+        self.counter = counter
+
+    # Return a new stamp (wall milliseconds, counter, node) later than every stamp made or seen before
+    def now(self):
+        physical = int(time.time() * 1000)
+        if physical > self.wall:
+            self.wall, self.counter = physical, 0
+        else:
+            self.counter += 1
+        return (self.wall, self.counter, self.node)
+
+    # Move the clock past a stamp received from another node
+    def observe(self, stamp):
+        wall, counter = stamp[0], stamp[1]
+        if wall > self.wall:
+            self.wall, self.counter = wall, counter
+        elif wall == self.wall:
+            self.counter = max(self.counter, counter)
+
+
+# Class keeping a contact store in step with a sync server
+class SyncClient:
+    # Initialise the client of a store; its state is kept in state_path, e.g. "contacts.txt.sync"
+    def __init__(self, store, url, state_path, batch_size=BATCH_SIZE, timeout=TIMEOUT):
+        self.store = store
+        self.url = url.rstrip("/")
+        self.state_path = state_path
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.clock = None
+        self.cursor = 0  # Server sequence number of the last change received
+        self._records = {}  # Global id -> [stamp, values digest, or None for a tombstone]
+        self._dirty = {}  # Global id -> stamp of a change not yet sent
+        self._ids = {}  # Global id -> contact id in the store
+        self._uids = {}  # Contact id -> global id
+        self._cleared = []  # Contact id -> global id maps of the contacts removed by each Erase All, for its undo
+        self._applying = False  # True while applying changes from the server, which are not sent back
+        self._changed = False  # True when the state differs from the state file
+        self._sync_lock = threading.Lock()  # One sync at a time
+
+    # Load the saved state, match it to the contacts in the store and start following changes; returns how many
+    # contacts are waiting to be sent
+    def open(self):
+        state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        self.clock = HybridClock(state.get("node") or uuid.uuid4().hex[:12], *state.get("clock", (0, 0)))
+        self.cursor = state.get("cursor", 0)
+        self._records = {uid: [tuple(stamp), digest] for uid, (stamp, digest) in state.get("records", {}).items()}
+        self._dirty = {uid: self._records[uid][0] for uid in state.get("dirty", ()) if uid in self._records}
+        with self.store.lock:
+            self._match_contacts()
+            self.store.subscribe(self.record)
+        self._changed = True
+        self.save()
+        return len(self._dirty)
+
+    # Stop following changes and save the state
+    def close(self):
+        self.store.unsubscribe(self.record)
+        self.save()
+
+    # Write the state file if anything changed since it was last written
+    def save(self):
+        with self.store.lock:
+            if not self._changed:
+                return
+            state = {
+                "node": self.clock.node,
+                "clock": [self.clock.wall, self.clock.counter],
+                "cursor": self.cursor,
+                "records": {uid: [list(stamp), digest] for uid, (stamp, digest) in self._records.items()},
+                "dirty": list(self._dirty),
+            }
+            self._changed = False
+        write_json(self.state_path, state)
+
+    # Send the changed contacts to the server and apply the changes other copies made, in batches, and return how many
+    # contacts were changed here. apply_context, if given, is a function returning a context manager wrapped around
+    # applying each batch, e.g. to make it one step of the undo history.
+    def sync(self, apply_context=None):
+        with self._sync_lock:
+            received = 0
+            while True:
+                with self.store.lock:
+                    batch = sorted(self._dirty.items(), key=lambda item: item[1])[:self.batch_size]
+                    changes = [[uid, list(stamp), self._values(uid)] for uid, stamp in batch]
+                reply = self._post({"node": self.clock.node, "since": self.cursor, "changes": changes, "limit": self.batch_size})
+                with self.store.lock, (apply_context() if apply_context else nullcontext()):
+                    for uid, stamp in batch:
+                        if self._dirty.get(uid) == stamp:
+                            del self._dirty[uid]  # Unless it changed again while the request was on its way
+                    received += self._apply(reply["changes"])
+                    if batch or reply["cursor"] != self.cursor:
+                        self.cursor = reply["cursor"]
+                        self._changed = True  # Otherwise nothing happened, so the state file is not rewritten
+                if not self._dirty and not reply["more"]:
+                    break
+            self.save()
+            return received
+
+    # Store listener turning each change into a stamped change waiting to be sent
+    def record(self, action, contact_id, old_values, new_values):
+        if self._applying:
+            return
+        if action == "add":
+            uid = self._revived(contact_id, new_values) or uuid.uuid4().hex
+            self._map(contact_id, uid)
+            self._stamp(uid, values_digest(new_values))
+        elif action == "update":
+            self._stamp(self._uids[contact_id], values_digest(new_values))
+        elif action == "delete":
+            uid = self._uids.pop(contact_id)
+            del self._ids[uid]
+            self._stamp(uid, None)
+        elif action == "clear":
+            self._cleared.append(self._uids)
+            for uid in self._uids.values():
+                self._stamp(uid, None)
+            self._uids, self._ids = {}, {}
+        elif action == "restore" and self._cleared:
+            # Contacts restored by undoing Erase All come back under their global ids
+            for contact_id, uid in self._cleared.pop().items():
+                if contact_id in self.store and contact_id not in self._uids:
+                    self._map(contact_id, uid)
+                    self._stamp(uid, values_digest(self.store.values(contact_id)))
+
+    # Match the store's contacts to the saved records by their values; unmatched contacts become new records, named by
+    # their content so that the same contact on two copies syncing for the first time does not end up twice
+    def _match_contacts(self):
+        by_digest = {}
+        for uid, (stamp, digest) in self._records.items():
+            if digest is not None:
+                by_digest.setdefault(digest, []).append(uid)
+        unmatched = []
+        for contact_id in self.store.ids():
+            digest = values_digest(self.store.values(contact_id))
+            uids = by_digest.get(digest)
+            if uids:
+                self._map(contact_id, uids.pop())
+            else:
+                unmatched.append((contact_id, digest))
+        for uids in by_digest.values():
+            for uid in uids:
+                self._stamp(uid, None)  # Deleted while sync was not running
+        for contact_id, digest in unmatched:
+            uid = digest
+            copy = 1
+            while uid in self._ids:
+                uid = f"{digest}-{copy}"
+                copy += 1
+            self._map(contact_id, uid)
+            self._stamp(uid, digest)
+
+    # Return the global id of a tombstoned contact coming back with the same id and values, e.g. a SQLite store
+    # restoring the rows removed by Erase All, otherwise None
+    def _revived(self, contact_id, values):
+        uid = self._cleared[-1].get(contact_id) if self._cleared else None
+        if uid is not None and uid not in self._ids:
+            return uid
+        return None
+
+    # Give a contact id a global id
+    def _map(self, contact_id, uid):
+        self._uids[contact_id] = uid
+        self._ids[uid] = contact_id
+
+    # Record a local change to a contact with a new stamp, to be sent on the next sync
+    def _stamp(self, uid, digest):
+        stamp = self.clock.now()
+        self._records[uid] = [stamp, digest]
+        self._dirty[uid] = stamp
+        self._changed = True
+
+    # Return the values of a contact to send, or None for a deleted contact
+    def _values(self, uid):
+        contact_id = self._ids.get(uid)
+        return list(self.store.values(contact_id)) if contact_id is not None else None
+
+    # Apply changes received from the server, each [global id, stamp, values or None], where they are later than the
+    # copy held here; returns how many were applied. Called with the store's lock held.
+    def _apply(self, changes):
+        applied = 0
+        self._applying = True
+        try:
+            for uid, stamp, values in changes:
+                stamp = tuple(stamp)
+                record = self._records.get(uid)
+                if record is not None and record[0] >= stamp:
+                    continue  # The change made here is later and will win on the server too
+                self.clock.observe(stamp)
+                contact_id = self._ids.get(uid)
+                digest = values_digest(values) if values is not None else None
+                if record is not None and record[1] == digest:
+                    record[0] = stamp  # Already the same here, e.g. a contact both copies had before they first synced
+                    self._dirty.pop(uid, None)
+                    continue
+                if values is None:
+                    if contact_id is not None:
+                        self.store.delete(contact_id)
+                        del self._uids[contact_id], self._ids[uid]
+                elif contact_id is not None:
+                    self.store.update(contact_id, values)
+                else:
+                    self._map(self.store.add(values), uid)
+                self._records[uid] = [stamp, digest]
+                self._dirty.pop(uid, None)
+                applied += 1
+        finally:
+            self._applying = False
+        return applied
+
+    # Send a request to the server and return its reply
+    def _post(self, message):
+        request = Request(f"{self.url}/sync", data=encode_message(message), method="POST",
+                          headers={"Content-Type": "application/json", "Content-Encoding": "deflate"})
+        with urlopen(request, timeout=self.timeout) as response:
+            return decode_message(response.read())
+
+
+# Class holding the server's copy of every contact, as the last change received for each global id
+class SyncState:
+    # Initialise the state, loading it from state_path if the file exists
+    def __init__(self, state_path=None):
+        self.state_path = state_path
+        self.sequence = 0  # Number of the last change stored
+        self._records = {}  # Global id -> [sequence number, stamp, values or None]
+        self._log = {}  # Sequence number -> global id, in sequence order, holding only each contact's latest change
+        self._lock = threading.Lock()
+        self._changed = False
+        if state_path and os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+            self.sequence = state["sequence"]
+            for uid, (sequence, stamp, values) in sorted(state["records"].items(), key=lambda item: item[1][0]):
+                self._records[uid] = [sequence, tuple(stamp), values]
+                self._log[sequence] = uid
+
+    # Merge the changes from a node and return the changes it has not seen since its cursor, leaving out its own:
+    # {"cursor": new cursor, "changes": [[global id, stamp, values], ...], "more": whether more are waiting}
+    def exchange(self, node, since, changes, limit=BATCH_SIZE):
+        with self._lock:
+            for uid, stamp, values in changes:
+                stamp = tuple(stamp)
+                record = self._records.get(uid)
+                if record is not None:
+                    if record[1] >= stamp:
+                        continue
+                    del self._log[record[0]]
+                self.sequence += 1
+                self._records[uid] = [self.sequence, stamp, values]
+                self._log[self.sequence] = uid
+                self._changed = True
+            reply = []
+            cursor = since
+            more = False
+            for sequence, uid in self._log.items():
+                if sequence <= since:
+                    continue
+                if len(reply) >= limit:
+                    more = True
+                    break
+                cursor = sequence
+                record = self._records[uid]
+                if record[1][2] != node:
+                    reply.append([uid, list(record[1]), record[2]])
+            return {"cursor": cursor, "changes": reply, "more": more}
+
+    # Write the state file if anything changed since it was last written
+    def save(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            if not self._changed:
+                return
+            state = {"sequence": self.sequence, "records": {uid: [sequence, list(stamp), values] for uid, (sequence, stamp, values) in self._records.items()}}
+            self._changed = False
+        write_json(self.state_path, state)
+
+
+# Class handling the requests of sync clients
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    # Handle POST /sync
+    def do_POST(self):
+        if self.path != "/sync":
+            self.send_error(404)
+            return
+        try:
+            message = decode_message(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            reply = self.server.state.exchange(message["node"], message["since"], message["changes"], min(message.get("limit", BATCH_SIZE), BATCH_SIZE))
+        except (ValueError, KeyError, TypeError, zlib.error) as e:
+            self.send_error(400, str(e))
+            return
+        data = encode_message(reply)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "deflate")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # Keep the console quiet
+    def log_message(self, format, *args):
+        pass
+
+
+# Class running the sync server on its own threads, saving its state every few seconds while changes arrive
+class SyncServer:
+    # Initialise the server; port 0 picks a free port, which is then in self.port
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, state_path=None):
+        self.state = SyncState(state_path)
+        self._http = ThreadingHTTPServer((host, port), SyncRequestHandler)
+        self._http.state = self.state
+        self.host, self.port = self._http.server_address[:2]
+        self._stop = threading.Event()
+        self._threads = []
+
+    # URL clients use to reach the server
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    # Start serving in the background
+    def start(self):
+        self._threads = [threading.Thread(target=self._http.serve_forever, name="sync-server", daemon=True),
+                         threading.Thread(target=self._save_loop, name="sync-server-save", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    # Stop serving and save the state
+    def close(self):
+        self._stop.set()
+        self._http.shutdown()
+        self._http.server_close()
+        for thread in self._threads:
+            thread.join()
+        self.state.save()
+
+    # Background loop saving the state while changes arrive
+    def _save_loop(self):
+        while not self._stop.wait(SAVE_INTERVAL):
+            self.state.save()
+
+
+# Run the sync server, or sync a contacts file once
+def main():
+    parser = argparse.ArgumentParser(description="Sync copies of the address book through a small local server.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the sync server")
+    serve.add_argument("--host", default=DEFAULT_HOST, help="address to listen on")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    serve.add_argument("--state", default="sync_server.json", help="file keeping the server's copy of the contacts")
+    sync = commands.add_parser("sync", help="sync a contacts file once and save it")
+    sync.add_argument("contacts_file", help="contacts file to sync (.txt)")
+    sync.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", help="address of the sync server")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = SyncServer(args.host, args.port, args.state).start()
+        print(f"Sync server listening on {server.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.close()
+        return
+
+    from contact_journal import ContactJournal
+    from contact_store import ContactStore
+    store = ContactStore()
+    journal = ContactJournal(store, args.contacts_file)
+    journal.open()
+    client = SyncClient(store, args.url, args.contacts_file + ".sync")
+    sent = client.open()
+    received = client.sync()
+    client.close()
+    journal.compact()
+    journal.close()
+    print(f"Sent {sent} changed contacts and received {received}; {len(store)} contacts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+'''
+Brief Description of what this code does:
+This code makes the sample contacts used by the tests: rows of field
+values in FIELDS order, drawn from small lists of names, streets and
+towns with a fixed random seed, so every run sees the same book. Names
+repeat and some fields are left empty, and a few values hold commas,
+quotes and non-ASCII characters, as real address books do.
+'''
+
+import os
+import random
+
+FIRST_NAMES = ("John", "Mary", "Aisha", "Zoë", "Chloé", "Oliver", "Amelia", "Raj", "Siobhan", "Tom")
+LAST_NAMES = ("Smith", "Jones", "Müller", "O'Brien", "Patel", "Nguyen", "Smyth", "Brown", "de Souza", "Taylor")
+STREETS = ("High Street", "Station Road", "Church Lane", 'The "Old" Mill')
+TOWNS = ("Leicester", "Leeds", "Bristol", "Milton Keynes")
+DOMAINS = ("example.com", "mail.example.org", "example.net")
+
+# Contacts file saved as cp1252 by the original app on Windows, and the rows it holds
+LEGACY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "contacts_cp1252.txt")
+LEGACY_ROWS = [("Zoë", "Müller", "1 Crème Brûlée Lane, Leicester", "07700 900001", "", "zoe@example.com", ""),
+               ("Chloé", "Señor", "", "07700 900002", "", "", ""),
+               ("Ada", "Lovelace", "£5 Road", "07700 900003", "", "", "")]
+
+
+# Function to return count rows of sample contact values, the same on every call with the same seed
+def sample_rows(count, seed=1):
+    generator = random.Random(seed)
+    rows = []
+    for number in range(count):
+        first = generator.choice(FIRST_NAMES)
+        last = generator.choice(LAST_NAMES)
+        address = f"{generator.randint(1, 99)} {generator.choice(STREETS)}, {generator.choice(TOWNS)}" if number % 7 else ""
+        mobile = f"07700 9{number:05d}"
+        secondary = f"0116 496 {number:04d}" if number % 3 == 0 else ""
+        email = f"{first.lower()}.{number}@{generator.choice(DOMAINS)}" if number % 5 else ""
+        picture = f"pictures/{number}.png" if number % 11 == 0 else ""
+        rows.append((first, last, address, mobile, secondary, email, picture))
+    return rows
@@ -0,0 +1,189 @@
+'''
+Brief Description of what this code does:
+This code tests the asyncio query API and PagedResults. Streamed
+queries give the same ids as store.query, stop reading the store as soon
+as the caller stops asking, and pages carry on from their cursor even
+when contacts are added or deleted between them. PagedResults is run
+with a stand-in for Tk's after timers, and must read only the pages the
+list asks for, report each one, and close the scan when cancelled.
+'''
+
+import asyncio
+import unittest
+from contextlib import aclosing
+from async_query import PagedResults, _stream, query_page, sorted_page, stream_query, stream_sorted
+from contact_store import ContactStore
+from tests.sample_contacts import sample_rows
+
+
+# Class standing in for a Tk widget, running its after callbacks only when asked
+class FakeWidget:
+    # Initialise the widget with no callbacks waiting
+    def __init__(self):
+        self.pending = {}
+        self.count = 0
+
+    # Schedule a callback, ignoring the delay
+    def after(self, delay, callback, *args):
+        self.count += 1
+        self.pending[self.count] = (callback, args)
+        return self.count
+
+    # Forget a scheduled callback
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+    # Run callbacks until none are left
+    def run(self):
+        while self.pending:
+            callback, args = self.pending.pop(min(self.pending))
+            callback(*args)
+
+
+# Class wrapping a store scan to count the chunks read from it and notice when it is closed
+class CountingScan:
+    # Initialise the wrapper around a generator of chunks
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+        self.closed = False
+
+    # Return the wrapper itself as its iterator
+    def __iter__(self):
+        return self
+
+    # Read the next chunk
+    def __next__(self):
+        entries = next(self.chunks)
+        self.read += 1
+        return entries
+
+    # Close the scan
+    def close(self):
+        self.chunks.close()
+        self.closed = True
+
+
+# Function to yield the ids found by a CountingScan, through the same stream the query API uses
+async def stream_ids(scan):
+    async with aclosing(_stream(scan)) as entries:
+        async for key, contact_id in entries:
+            yield contact_id
+
+
+# Class testing the asyncio query API
+class AsyncQueryTest(unittest.TestCase):
+    # Make a store holding the sample contacts
+    def setUp(self):
+        self.store = ContactStore()
+        self.store.add_many(sample_rows(500))
+
+    # Streamed ids match the store's query and sort, and a limit keeps the first of them
+    def test_stream(self):
+        async def collect(stream):
+            return [contact_id async for contact_id in stream]
+
+        self.assertEqual(asyncio.run(collect(stream_query(self.store, "s"))), self.store.query("s"))
+        self.assertEqual(asyncio.run(collect(stream_query(self.store, "s", limit=7))), self.store.query("s")[:7])
+        self.assertEqual(asyncio.run(collect(stream_sorted(self.store, "last_name"))), self.store.sorted_ids("last_name"))
+
+    # Breaking out of a stream closes the store scan after the chunk it was reading
+    def test_early_stop(self):
+        scan = CountingScan(self.store.scan_query("a", chunk_size=20))
+
+        async def first_five():
+            found = []
+            async with aclosing(stream_ids(scan)) as stream:
+                async for contact_id in stream:
+                    found.append(contact_id)
+                    if len(found) == 5:
+                        break
+            return found
+
+        self.assertEqual(asyncio.run(first_five()), self.store.query("a")[:5])
+        self.assertEqual(scan.read, 1)
+        self.assertTrue(scan.closed)
+
+    # A stream with a limit stops reading the store scan once it has reached it
+    def test_limit(self):
+        scan = CountingScan(self.store.scan_sorted("first_name", chunk_size=20))
+
+        async def first_25():
+            return [contact_id async for key, contact_id in _stream(scan, 25)]
+
+        self.assertEqual(asyncio.run(first_25()), self.store.ids()[:25])
+        self.assertEqual(scan.read, 2)
+        self.assertTrue(scan.closed)
+
+    # Paging through a query gives every match once, even with contacts added and deleted between pages
+    def test_pages(self):
+        expected = self.store.query("smith")
+        page = asyncio.run(query_page(self.store, "smith", limit=10))
+        found = list(page.ids)
+        self.store.delete(expected[-1])
+        self.store.add(("Aaron", "Aasmith", "", "", "", "", ""))  # Sorts before the cursor, so is not reached
+        while page.after is not None:
+            page = asyncio.run(query_page(self.store, "smith", limit=10, after=page.after))
+            self.assertLessEqual(len(page), 10)
+            found.extend(page.ids)
+        self.assertEqual(found, expected[:-1])
+
+    # The last page has no cursor, and an exact final page is not followed by an empty one
+    def test_last_page(self):
+        count = len(self.store)
+        page = asyncio.run(sorted_page(self.store, "first_name", limit=count))
+        self.assertEqual(page.ids, self.store.ids())
+        self.assertIsNone(page.after)
+        page = asyncio.run(sorted_page(self.store, "first_name", limit=count - 1))
+        self.assertEqual(asyncio.run(sorted_page(self.store, "first_name", after=page.after)).ids, self.store.ids()[-1:])
+
+
+# Class testing the list of results read from Tk's event loop
+class PagedResultsTest(unittest.TestCase):
+    # Make a store holding the sample contacts and a list of them in display order, read 50 at a time
+    def setUp(self):
+        self.store = ContactStore()
+        self.store.add_many(sample_rows(500))
+        self.widget = FakeWidget()
+        self.scan = CountingScan(self.store.scan_sorted("first_name", chunk_size=50))
+        self.changes = []
+        self.results = PagedResults(self.widget, self.scan, lambda: self.changes.append(len(self.results)), page_size=100)
+
+    # Only the first page is read until the list asks for more, and nothing is read before Tk runs
+    def test_first_page(self):
+        self.assertEqual(len(self.results), 0)
+        self.widget.run()
+        self.assertEqual(len(self.results), 100)
+        self.assertEqual(self.scan.read, 2)
+        self.assertEqual(self.changes, [50, 100])
+        self.assertEqual(self.results.ids, self.store.ids()[:100])
+        self.assertFalse(self.results.done)
+
+    # Showing rows near the end of those read asks for another page, until the scan ends
+    def test_scrolling(self):
+        self.widget.run()
+        self.assertEqual(self.results.ids_between(80, 120), self.store.ids()[80:100])
+        self.widget.run()
+        self.assertEqual(len(self.results), 250)
+        self.assertEqual(self.scan.read, 5)
+        self.results.ids_between(0, len(self.store))
+        self.widget.run()
+        self.assertTrue(self.results.done)
+        self.assertEqual(self.results.ids, self.store.ids())
+        self.assertEqual(self.results.id_at(3), self.store.ids()[3])
+        self.assertEqual(self.changes[-1], len(self.results))
+
+    # Cancelling stops the reading and closes the scan
+    def test_cancel(self):
+        self.results.request(400)
+        self.results.cancel()
+        self.widget.run()
+        self.assertEqual(len(self.results), 0)
+        self.assertTrue(self.results.done)
+        self.assertTrue(self.scan.closed)
+        self.results.request(500)
+        self.assertEqual(self.widget.pending, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+'''
+Brief Description of what this code does:
+This code tests the bulk jobs: tidying addresses and checking phone
+numbers and email addresses, run over the whole book both in this
+process and in a pool of worker processes, which must give the same
+result. Changes are applied in one step at the end, a contact edited
+while the job ran is left alone, and run as a script with --apply the
+job keeps the edits which were only in the contacts file's journal.
+'''
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+import batch_operations
+from batch_operations import apply_updates, run_batch, stream_batch, tidy_address
+from contact_journal import ContactJournal
+from contact_store import ContactStore, write_rows
+from tests.sample_contacts import sample_rows
+
+
+# Function to return rows with untidy addresses and some invalid phone numbers and email addresses
+def untidy_rows(count):
+    rows = []
+    for number, values in enumerate(sample_rows(count)):
+        values = list(values)
+        values[2] = values[2].lower().replace(", ", " ,") if number % 2 else values[2]
+        if number % 10 == 0:
+            values[3] = "call me"
+        if number % 15 == 0:
+            values[5] = "not an address"
+        rows.append(tuple(values))
+    return rows
+
+
+# Class testing bulk jobs over the whole book
+class BatchOperationsTest(unittest.TestCase):
+    # Make a store holding contacts for the jobs to change
+    def setUp(self):
+        self.store = ContactStore()
+        self.store.add_many(untidy_rows(300))
+
+    # Addresses are given one layout
+    def test_tidy_address(self):
+        self.assertEqual(tidy_address("1 high  street ,leicester le1 7rh"), "1 High Street, Leicester LE1 7RH")
+        self.assertEqual(tidy_address("the old mill, stratford upon avon"), "The Old Mill, Stratford upon Avon")
+        self.assertEqual(tidy_address(" , "), "")
+
+    # Tidying applies every change at once and reports each contact it read
+    def test_apply(self):
+        changes = []
+        self.store.subscribe(lambda *change: changes.append(change))
+        progress = []
+        result = run_batch(self.store, "normalise_address", shard_size=64, progress=lambda *report: progress.append(report))
+        self.assertEqual(result.processed, 300)
+        self.assertEqual(progress[-1], (300, 300, 300))
+        self.assertGreater(result.applied, 0)
+        self.assertEqual(result.applied, len(result.updates))
+        self.assertEqual(len(changes), result.applied)
+        for contact_id in self.store.ids():
+            address = self.store.values(contact_id)[2]
+            self.assertEqual(tidy_address(address), address)
+        self.assertEqual(run_batch(self.store, "normalise_address").applied, 0)
+
+    # Checking reports the invalid numbers and email addresses and changes nothing
+    def test_validate(self):
+        before = self.store.snapshot()
+        result = run_batch(self.store, "validate")
+        self.assertEqual(self.store.snapshot(), before)
+        self.assertEqual(sum(problem.startswith("Invalid mobile number") for contact_id, problem in result.problems), 30)
+        self.assertEqual(sum(problem.startswith("Invalid email address") for contact_id, problem in result.problems), 20)
+
+    # A pool of worker processes finds the same changes and problems as running in this process
+    def test_pool(self):
+        in_process = list(stream_batch(self.store, "validate", workers=1))
+        pooled = list(stream_batch(self.store, "validate", workers=2, shard_size=64, min_pool_size=0))
+        self.assertEqual(sorted(pooled), sorted(in_process))
+
+    # A contact edited or deleted after the job read it is left as it is
+    def test_conflicts(self):
+        result = run_batch(self.store, "normalise_address", apply=False)
+        edited, deleted, *others = list(result.updates)
+        self.store.update(edited, {"address": "kept as typed"})
+        self.store.delete(deleted)
+        self.assertEqual(apply_updates(self.store, result), len(others))
+        self.assertEqual(sorted(result.conflicts), sorted([edited, deleted]))
+        self.assertEqual(self.store.values(edited)[2], "kept as typed")
+
+    # Unknown jobs are refused
+    def test_unknown_job(self):
+        with self.assertRaises(ValueError):
+            run_batch(self.store, "shred")
+
+    # Run as a script with --apply, edits which are only in the journal are kept
+    def test_script_keeps_journal(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(directory, "contacts.txt")
+            write_rows(file_path, [("Ada", "Lovelace", "1 mill road ,leeds", "", "", "", "")])
+            store = ContactStore()
+            journal = ContactJournal(store, file_path, flush_interval=60)
+            journal.open()
+            store.add(("Alan", "Turing", "2 high street", "", "", "", ""))
+            journal.close()
+            with mock.patch("sys.argv", ["batch_operations.py", file_path, "normalise_address", "--apply"]), redirect_stdout(io.StringIO()):
+                batch_operations.main()
+            reopened = ContactStore()
+            journal = ContactJournal(reopened, file_path, flush_interval=60)
+            journal.open()
+            journal.close()
+            self.assertEqual([values[2] for values in reopened.snapshot()[1]], ["1 Mill Road, Leeds", "2 High Street"])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
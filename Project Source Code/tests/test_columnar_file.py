@@ -0,0 +1,97 @@
+'''
+Brief Description of what this code does:
+This code tests the columnar contacts format (.abk): rows written with
+write_columnar are read back value by value, row by row and column by
+column, empty values and non-ASCII text included; searching a column in
+place finds the same rows as decoding it; and a store which maps a
+columnar file answers queries, edits and saves like one holding the
+same contacts in memory.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from Contact import FIELDS
+from columnar_file import ColumnarFile, is_columnar, write_columnar
+from contact_store import ContactStore
+from tests.sample_contacts import sample_rows
+
+
+# Class testing reading and writing columnar contacts files
+class ColumnarFileTest(unittest.TestCase):
+    # Write the sample contacts to a columnar file
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, "contacts.abk")
+        self.rows = sample_rows(200)
+        write_columnar(self.file_path, self.rows)
+
+    # Remove the directory
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Every value, row and column is read back as it was written
+    def test_round_trip(self):
+        mapped = ColumnarFile(self.file_path)
+        try:
+            self.assertEqual(len(mapped), len(self.rows))
+            self.assertEqual([mapped.row(row) for row in range(len(mapped))], self.rows)
+            for column in range(len(FIELDS)):
+                self.assertEqual(mapped.column(column), [values[column] for values in self.rows])
+            self.assertEqual(mapped.value(3, 0), self.rows[3][0])
+        finally:
+            mapped.close()
+
+    # An empty book is written and read back too
+    def test_empty(self):
+        write_columnar(self.file_path, iter([]))
+        mapped = ColumnarFile(self.file_path)
+        self.assertEqual(len(mapped), 0)
+        self.assertEqual(mapped.column(0), [])
+        self.assertEqual(mapped.search(0, "a"), [])
+        mapped.close()
+
+    # Files which are empty or in another format are refused
+    def test_not_columnar(self):
+        self.assertTrue(is_columnar("contacts.ABK"))
+        self.assertFalse(is_columnar("contacts.txt"))
+        for content in (b"", b"First,Last,,,,,\n" * 10):
+            with open(self.file_path, "wb") as file:
+                file.write(content)
+            with self.assertRaises(ValueError):
+                ColumnarFile(self.file_path)
+
+    # Searching a column in place, ignoring case, finds the same rows as decoding every value
+    def test_search(self):
+        mapped = ColumnarFile(self.file_path)
+        try:
+            for column, needle in ((0, "zoë"), (1, "müll"), (1, "smi"), (2, "road, leeds"), (5, "example.org"), (0, "x")):
+                expected = [row for row, values in enumerate(self.rows) if needle in values[column].lower()]
+                self.assertEqual(mapped.search(column, needle), expected, needle)
+            self.assertEqual(mapped.search(0, ""), list(range(len(self.rows))))
+        finally:
+            mapped.close()
+
+    # A store mapping the file gives the same results as one holding the contacts, before and after edits and a save
+    def test_mapped_store(self):
+        mapped = ContactStore()
+        self.assertEqual(mapped.load(self.file_path), len(self.rows))
+        memory = ContactStore()
+        memory.add_many(self.rows)
+        for text in ("a", "smi", "müll", "road, lee"):
+            self.assertEqual(mapped.query(text), memory.query(text), text)
+        for store in (mapped, memory):
+            store.update(store.id_at(0), {"first_name": "Zed"})
+            store.delete(store.id_at(1))
+        self.assertEqual(mapped.snapshot(), memory.snapshot())
+        mapped.save(self.file_path)
+        self.assertIsNone(mapped._mapped)
+        reloaded = ContactStore()
+        reloaded.load(self.file_path)
+        self.assertEqual(reloaded.snapshot()[1], memory.snapshot()[1])
+        reloaded.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
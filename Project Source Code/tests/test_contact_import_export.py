@@ -0,0 +1,82 @@
+'''
+Brief Description of what this code does:
+This code tests the CSV and vCard import and export: contacts exported
+from a store and imported into another come back with the same values,
+commas, quotes, escaped vCard characters and non-ASCII names included,
+whether the file is read in one chunk or many. Hand-written files with
+folded vCard lines, a heading row or no heading row are read too.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from contact_import_export import export_contacts, import_contacts, read_csv, read_vcards, write_csv, write_vcards
+from contact_store import ContactStore
+from tests.sample_contacts import LEGACY_FILE, LEGACY_ROWS, sample_rows
+
+
+# Class testing reading and writing CSV and vCard files
+class ImportExportTest(unittest.TestCase):
+    # Make a directory for the files and a store holding the sample contacts
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rows = sample_rows(250)
+        self.rows.append(("Semi;colon", "Back\\slash", "Flat 2, 3 Comma Road; Leeds", "+44 7700 900999", "", "x@example.com", ""))
+        self.store = ContactStore()
+        self.store.add_many(self.rows)
+
+    # Remove the directory
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Return the path of a file in the directory
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    # Exporting and importing again gives back the same contacts, in files of either format
+    def test_round_trip(self):
+        for name in ("contacts.csv", "contacts.vcf"):
+            file_path = self.path(name)
+            self.assertEqual(export_contacts(self.store, file_path), len(self.rows))
+            for chunk_size in (7, 10000):
+                imported = ContactStore()
+                progress = []
+                self.assertEqual(import_contacts(imported, file_path, chunk_size, lambda *report: progress.append(report)), len(self.rows))
+                self.assertEqual(imported.snapshot()[1], self.store.snapshot()[1], (name, chunk_size))
+                self.assertEqual(progress[-1][0], len(self.rows))
+
+    # Rows are read back in chunks of the size asked for
+    def test_chunks(self):
+        write_csv(self.path("contacts.csv"), self.rows)
+        write_vcards(self.path("contacts.vcf"), self.rows)
+        for chunks in (read_csv(self.path("contacts.csv"), 100), read_vcards(self.path("contacts.vcf"), 100)):
+            self.assertEqual([len(chunk) for chunk in chunks], [100, 100, len(self.rows) - 200])
+
+    # A CSV file without a heading row is read from its first row, and one with other headings is read too
+    def test_csv_headings(self):
+        with open(self.path("plain.csv"), "w", encoding="utf-8") as file:
+            file.write('Ada,Lovelace,"1 Mill Road, Leeds",07700 900001,,ada@example.com,\n\nAlan,Turing,,,,,\n')
+        rows = [row for chunk in read_csv(self.path("plain.csv")) for row in chunk]
+        self.assertEqual(rows[0], ["Ada", "Lovelace", "1 Mill Road, Leeds", "07700 900001", "", "ada@example.com", ""])
+        self.assertEqual(len(rows), 2)
+        with open(self.path("headed.csv"), "w", encoding="utf-8") as file:
+            file.write("first_name,last_name\nAda,Lovelace\n")
+        self.assertEqual([row for chunk in read_csv(self.path("headed.csv")) for row in chunk], [["Ada", "Lovelace"]])
+
+    # A CSV file in the Windows encoding rather than UTF-8 is read too
+    def test_csv_legacy_encoding(self):
+        self.assertEqual([tuple(row) for chunk in read_csv(LEGACY_FILE) for row in chunk], LEGACY_ROWS)
+
+    # vCards written by other programs, with folded lines and embedded photos, are read
+    def test_read_vcard(self):
+        with open(self.path("other.vcf"), "w", encoding="utf-8", newline="\r\n") as file:
+            file.write("BEGIN:VCARD\nVERSION:3.0\nN:Lovelace;Ada;;;\nFN:Ada Lovelace\nADR;TYPE=HOME:;;1 Mill Road\\, \n Leeds;;;;\n"
+                       "TEL;TYPE=HOME:0116 496 0000\nTEL;TYPE=CELL:07700 900001\nEMAIL:ada@example.com\n"
+                       "PHOTO;ENCODING=b;TYPE=JPEG:AAAA\nEND:VCARD\n")
+        rows = [row for chunk in read_vcards(self.path("other.vcf")) for row in chunk]
+        self.assertEqual(rows, [("Ada", "Lovelace", "1 Mill Road, Leeds", "07700 900001", "0116 496 0000", "ada@example.com", "")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+'''
+Brief Description of what this code does:
+This code tests ContactJournal: changes made to a store are replayed
+onto the contacts file when it is opened again, an Erase All and its
+undo are replayed from two short lines, and compaction folds the
+journal into the contacts file. A compaction which stops after the new
+contacts file is in place, or which cannot replace the contacts file,
+must still leave a journal matching the file on disk. Each test runs for
+both the comma separated and the columnar contacts file.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import contact_journal
+from contact_journal import ContactJournal, decode_ranges, encode_ranges
+from contact_store import ContactStore, write_rows
+from tests.sample_contacts import LEGACY_FILE, LEGACY_ROWS, sample_rows
+
+# Contacts files the journal is tested with
+FILE_NAMES = ("contacts.txt", "contacts.abk")
+
+
+# Class testing the journal of changes kept beside a contacts file
+class ContactJournalTest(unittest.TestCase):
+    # Make a directory for the contacts files
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journals = []
+
+    # Close any journal still open and remove the directory
+    def tearDown(self):
+        for journal in self.journals:
+            journal.close()
+        shutil.rmtree(self.directory)
+
+    # Write the sample contacts to a contacts file and return its path
+    def contacts_file(self, name):
+        file_path = os.path.join(self.directory, name)
+        write_rows(file_path, sample_rows(100))
+        return file_path
+
+    # Open a store through a journal on a contacts file; the background thread is left idle so tests flush and compact
+    def open_store(self, file_path):
+        store = ContactStore()
+        journal = ContactJournal(store, file_path, flush_interval=60)
+        journal.open()
+        self.journals.append(journal)
+        return store, journal
+
+    # Close a journal opened by open_store
+    def close(self, journal):
+        journal.close()
+        self.journals.remove(journal)
+
+    # Make some changes of every kind to a store
+    def make_changes(self, store):
+        contact_ids = store.ids()
+        store.update(contact_ids[0], {"first_name": "Zed"})
+        store.delete(contact_ids[1])
+        store.add(("New", "Contact", "1 Mill Road, Leeds", "07700 123456", "", "new@example.com", ""))
+        store.delete_many(contact_ids[2:40])
+
+    # Return the values of every contact of a store in display order
+    def contents(self, store):
+        return store.snapshot()[1]
+
+    # Runs of consecutive ids are encoded as [start, stop] pairs
+    def test_encode_ranges(self):
+        self.assertEqual(encode_ranges([0, 1, 2, 5, 6, 9]), [[0, 3], [5, 7], [9, 10]])
+        self.assertEqual(decode_ranges([[0, 3], [5, 7], [9, 10]]), [0, 1, 2, 5, 6, 9])
+        self.assertEqual(decode_ranges(encode_ranges(range(4, 8))), range(4, 8))
+
+    # Changes are replayed onto the contacts file, which is left as it was
+    def test_replay(self):
+        for name in FILE_NAMES:
+            file_path = self.contacts_file(name)
+            store, journal = self.open_store(file_path)
+            self.make_changes(store)
+            self.close(journal)
+            self.assertEqual(ContactStore().load(file_path), 100)
+            reopened, journal = self.open_store(file_path)
+            self.assertEqual(self.contents(reopened), self.contents(store), name)
+            # Replayed contacts keep their ids, so later journal lines still refer to the right contacts
+            self.assertEqual(reopened.ids(), store.ids(), name)
+            # New changes carry on from the replayed ones
+            reopened.add(("Another", "Contact", "", "", "", "", ""))
+            self.close(journal)
+            again, journal = self.open_store(file_path)
+            self.assertEqual(self.contents(again), self.contents(reopened), name)
+            self.close(journal)
+
+    # An erase and its undo are replayed, and the erase alone is too
+    def test_replay_clear_and_restore(self):
+        for name in FILE_NAMES:
+            file_path = self.contacts_file(name)
+            store, journal = self.open_store(file_path)
+            store.restore(store.clear())
+            store.add(("After", "Undo", "", "", "", "", ""))
+            self.close(journal)
+            reopened, journal = self.open_store(file_path)
+            self.assertEqual(len(reopened), 101, name)
+            self.assertEqual(self.contents(reopened), self.contents(store), name)
+            reopened.clear()
+            self.close(journal)
+            erased, journal = self.open_store(file_path)
+            self.assertEqual(len(erased), 0, name)
+            self.close(journal)
+
+    # Compacting writes the contacts to the contacts file and starts an empty journal
+    def test_compact(self):
+        for name in FILE_NAMES:
+            file_path = self.contacts_file(name)
+            store, journal = self.open_store(file_path)
+            self.make_changes(store)
+            journal.compact()
+            self.assertEqual(ContactStore().load(file_path), len(store))
+            with open(journal.journal_path, encoding="utf-8") as file:
+                self.assertEqual(len(file.readlines()), 1)
+            store.add(("After", "Compact", "", "", "", "", ""))
+            self.close(journal)
+            reopened, journal = self.open_store(file_path)
+            self.assertEqual(self.contents(reopened), self.contents(store), name)
+            self.close(journal)
+
+    # A compaction stopped between putting the new contacts file in place and the new journal loses nothing
+    def test_crash_during_compact(self):
+        replace = os.replace
+        for name in FILE_NAMES:
+            file_path = self.contacts_file(name)
+            store, journal = self.open_store(file_path)
+            self.make_changes(store)
+
+            def crash(source, destination):
+                replace(source, destination)
+                if destination == file_path:
+                    raise KeyboardInterrupt
+
+            with mock.patch.object(contact_journal.os, "replace", crash):
+                with self.assertRaises(KeyboardInterrupt):
+                    journal.compact()
+            self.assertTrue(os.path.exists(journal.journal_path + ".tmp"))
+            self.close(journal)
+            reopened, journal = self.open_store(file_path)
+            self.assertEqual(self.contents(reopened), self.contents(store), name)
+            self.close(journal)
+
+    # A contacts file which cannot be replaced, e.g. open in another program, leaves the old file and journal in use
+    def test_failed_compact(self):
+        replace = os.replace
+        for name in FILE_NAMES:
+            file_path = self.contacts_file(name)
+            store, journal = self.open_store(file_path)
+            self.make_changes(store)
+
+            def locked(source, destination):
+                if destination == file_path:
+                    raise PermissionError("locked")
+                replace(source, destination)
+
+            with mock.patch.object(contact_journal.os, "replace", locked):
+                with self.assertRaises(PermissionError):
+                    journal.compact()
+            self.assertFalse(os.path.exists(journal.journal_path + ".tmp"))
+            store.add(("After", "Failure", "", "", "", "", ""))
+            self.close(journal)
+            reopened, journal = self.open_store(file_path)
+            self.assertEqual(self.contents(reopened), self.contents(store), name)
+            self.close(journal)
+
+    # A torn last line, left by a crash in the middle of a write, is dropped
+    def test_torn_line(self):
+        file_path = self.contacts_file("contacts.txt")
+        store, journal = self.open_store(file_path)
+        store.update(store.id_at(0), {"first_name": "Zed"})
+        expected = self.contents(store)
+        self.close(journal)
+        with open(journal.journal_path, "a", encoding="utf-8") as file:
+            file.write('{"op": "add", "id": 500, "val')
+        reopened, journal = self.open_store(file_path)
+        self.assertEqual(self.contents(reopened), expected)
+
+    # Edits to a contacts file saved in cp1252 by an older version of the app are replayed, and compacting saves it as UTF-8
+    def test_legacy_encoding(self):
+        file_path = os.path.join(self.directory, "contacts.txt")
+        shutil.copyfile(LEGACY_FILE, file_path)
+        store, journal = self.open_store(file_path)
+        self.assertEqual(self.contents(store), sorted(LEGACY_ROWS))
+        store.update(store.id_at(0), {"last_name": "Byron"})
+        self.close(journal)
+        reopened, journal = self.open_store(file_path)
+        self.assertEqual(self.contents(reopened), self.contents(store))
+        journal.compact()
+        with open(file_path, encoding="utf-8") as file:
+            self.assertIn("Zoë", file.read())
+
+    # A contacts file which cannot be read leaves the journal closable, without recording changes or touching the file
+    def test_failed_open(self):
+        file_path = os.path.join(self.directory, "contacts.abk")
+        with open(file_path, "wb") as file:
+            file.write(b"not a columnar file")
+        store = ContactStore()
+        journal = ContactJournal(store, file_path, flush_interval=60)
+        with self.assertRaises(ValueError):
+            journal.open()
+        journal.close()
+        store.add(("After", "Failure", "", "", "", "", ""))
+        self.assertFalse(os.path.exists(journal.journal_path))
+        with open(file_path, "rb") as file:
+            self.assertEqual(file.read(), b"not a columnar file")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+'''
+Brief Description of what this code does:
+This code tests the phone and email keys: numbers written in different
+ways give the same E.164-style key, email addresses are compared without
+case, and KeyIndex finds contacts by those keys as they are added,
+edited and deleted. It also checks that the store's first lookup, which
+builds the index, is safe while another thread is adding contacts.
+'''
+
+import threading
+import unittest
+from contact_keys import KeyIndex, normalise_email, normalise_phone
+from contact_store import ContactStore
+from tests.sample_contacts import sample_rows
+
+
+# Class testing normalised phone and email keys
+class ContactKeysTest(unittest.TestCase):
+    # National, international and spaced-out numbers give the same key, and text which is not a number gives none
+    def test_normalise_phone(self):
+        for number in ("07700 900123", "+44 7700 900123", "0044 7700 900123", "+44 (0)7700-900123", "07700 900123 ext. 12"):
+            self.assertEqual(normalise_phone(number), "+447700900123", number)
+        self.assertEqual(normalise_phone("020 7946 0000", "33"), "+332079460000")
+        for number in ("", "call me", "123", "+1234567890123456"):
+            self.assertEqual(normalise_phone(number), "", number)
+
+    # Email addresses are trimmed and lower-cased, and text which is not an address gives no key
+    def test_normalise_email(self):
+        self.assertEqual(normalise_email("  Ada@Example.COM "), "ada@example.com")
+        self.assertEqual(normalise_email("mailto:<ada@example.com>"), "ada@example.com")
+        for email in ("", "ada", "ada@localhost", "@example.com", "ada lovelace@example.com"):
+            self.assertEqual(normalise_email(email), "", email)
+
+    # The index follows contacts as they are added, edited and removed
+    def test_index(self):
+        index = KeyIndex()
+        ada = ("Ada", "Lovelace", "", "07700 900123", "0116 496 0000", "ADA@example.com", "")
+        index.add(1, ada)
+        index.add(2, ("Byron", "Lovelace", "", "", "+44 116 496 0000", "", ""))
+        self.assertEqual(index.find_by_phone("+447700900123"), {1})
+        self.assertEqual(index.find_by_phone("01164960000"), {1, 2})
+        self.assertEqual(index.find_by_email("ada@example.com "), {1})
+        index.remove(1, ada)
+        self.assertEqual(index.find_by_phone("01164960000"), {2})
+        self.assertEqual(index.find_by_email("ada@example.com"), set())
+        self.assertEqual(index.find_by_phone("not a number"), set())
+
+    # The store's first lookup builds the index while another thread adds contacts, and the index misses none of them
+    def test_build_while_adding(self):
+        store = ContactStore()
+        store.add_many(sample_rows(2000))
+        rows = [(f"Added{number}", "", "", "", "0116 496 9999", "", "") for number in range(2000)]
+
+        def add():
+            for values in rows:
+                store.add(values)
+
+        adder = threading.Thread(target=add)
+        adder.start()
+        while adder.is_alive():
+            store.find_by_email("nobody@example.com")
+        adder.join()
+        self.assertEqual(len(store.find_by_phone("+441164969999")), len(rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
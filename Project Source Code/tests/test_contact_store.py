@@ -0,0 +1,306 @@
+'''
+Brief Description of what this code does:
+This code tests ContactStore: adding, editing, deleting and querying
+contacts, and that every index the store keeps (the sorted display
+order, the trigram filter, the phone and email keys and the facet
+groups) still agrees with a plain scan of the contacts after a mix of
+single and bulk changes. Erase All and its undo are tested through clear
+and restore, and SqliteContactStore is checked against ContactStore by
+making the same changes to both.
+'''
+
+import os
+import random
+import tempfile
+import threading
+import unittest
+from collections import Counter
+from Contact import FIELDS, Contact
+from contact_store import BULK_REMOVE, ContactStore
+from facet_index import FACETS
+from sorted_index import sort_key
+from sqlite_store import SqliteContactStore
+from tests.sample_contacts import LEGACY_FILE, LEGACY_ROWS, sample_rows
+
+# Filter texts checked against a scan of the contacts: short, trigram, non-ASCII, across a comma and matching nothing
+NEEDLES = ("a", "sm", "smi", "MÜLL", "zoë", "road, lee", "example.org", "07700 900", "no such contact")
+
+
+# Function to return the ids of a store's contacts sorted by a field as a scan would sort them
+def scan_sorted(store, field):
+    position = FIELDS.index(field)
+    return sorted(store._all_ids(), key=lambda contact_id: (sort_key(store.values(contact_id)[position]), contact_id))
+
+
+# Function to return the ids, in display order, of a store's contacts with a field containing the text, ignoring case
+def scan_query(store, text):
+    needle = text.lower()
+    return [contact_id for contact_id in store.ids() if any(needle in value.lower() for value in store.values(contact_id)[:6])]
+
+
+# Class testing the in-memory contact store and its indexes
+class ContactStoreTest(unittest.TestCase):
+    # Make a store holding the sample contacts
+    def setUp(self):
+        self.rows = sample_rows(300)
+        self.store = ContactStore()
+        self.store.add_many(self.rows)
+
+    # Check that every index of the store agrees with a scan of its contacts
+    def assert_indexes_match(self, store):
+        self.assertEqual(store.ids(), scan_sorted(store, "first_name"))
+        self.assertEqual(store.sorted_ids("last_name"), scan_sorted(store, "last_name"))
+        for text in NEEDLES:
+            self.assertEqual(store.query(text), scan_query(store, text), text)
+            self.assertEqual([contact_id for chunk in store.scan_query(text, chunk_size=50) for key, contact_id in chunk],
+                             scan_query(store, text), text)
+        for contact_id in store.ids():
+            values = store.values(contact_id)
+            self.assertIn(contact_id, store.find_by_phone(values[3]))
+            if values[5]:
+                self.assertIn(contact_id, store.find_by_email(values[5].upper()))
+        for facet, (title, group_of, field) in FACETS.items():
+            index = store.facet_index(facet)
+            position = FIELDS.index(field)
+            groups = Counter(group_of(store.values(contact_id)[position]) for contact_id in store.ids())
+            self.assertEqual(dict(index.groups()), dict(groups), facet)
+            for group in groups:
+                members = [contact_id for contact_id in scan_sorted(store, "last_name")
+                           if group_of(store.values(contact_id)[position]) == group]
+                self.assertEqual(index.ids(group), members, (facet, group))
+
+    # Added contacts get ids in order, keep their values and are shown sorted by first name
+    def test_add(self):
+        store = self.store
+        self.assertEqual(len(store), len(self.rows))
+        self.assertEqual([store.values(contact_id) for contact_id in range(len(self.rows))], self.rows)
+        contact_id = store.add(Contact("Ada", "Lovelace", "", "07700 123456", "", "ada@example.com"))
+        self.assertEqual(contact_id, len(self.rows))
+        self.assertEqual(store.name(contact_id), "Ada Lovelace")
+        self.assertEqual(store.id_at(0), contact_id)
+        self.assertEqual(store.position(contact_id), 0)
+        self.assert_indexes_match(store)
+
+    # Editing a contact moves it in every index, and unknown fields are refused
+    def test_update(self):
+        store = self.store
+        store.query("smi")  # Build the trigram index first, so it has to be kept up to date
+        contact_id = store.id_at(10)
+        store.update(contact_id, {"first_name": "Aaron", "email_address": "AARON@Example.com"})
+        self.assertEqual(store.id_at(0), contact_id)
+        self.assertEqual(store.find_by_email("aaron@example.com"), [contact_id])
+        self.assertEqual(store.query("aaron"), [contact_id])
+        with self.assertRaises(KeyError):
+            store.update(contact_id, {"nickname": "Ron"})
+        self.assert_indexes_match(store)
+
+    # Deleting a contact removes it from the store and from every index
+    def test_delete(self):
+        store = self.store
+        store.query("smi")
+        contact_id = store.id_at(0)
+        values = store.values(contact_id)
+        self.assertEqual(store.delete(contact_id).mobile_number, values[3])
+        self.assertNotIn(contact_id, store)
+        self.assertEqual(len(store), len(self.rows) - 1)
+        self.assertEqual(store.find_by_phone(values[3]), [])
+        with self.assertRaises(KeyError):
+            store.delete(contact_id)
+        self.assert_indexes_match(store)
+
+    # A mix of single and bulk changes, with the indexes built before them, leaves every index matching the contacts
+    def test_indexes_after_changes(self):
+        store = self.store
+        self.assert_indexes_match(store)
+        generator = random.Random(2)
+        new_rows = sample_rows(50, seed=3)
+        for values in new_rows[:25]:
+            store.add(values)
+        store.add_many(new_rows[25:])
+        for contact_id in generator.sample(store.ids(), 40):
+            store.update(contact_id, {"last_name": generator.choice(("Smith", "Zed", "")),
+                                      "address": generator.choice(("2 Mill Road, Leeds", "", "Flat 1"))})
+        store.update_many([(contact_id, {"first_name": "Bulk"}) for contact_id in generator.sample(store.ids(), 30)])
+        for contact_id in generator.sample(store.ids(), 20):
+            store.delete(contact_id)
+        # Fewer than BULK_REMOVE contacts are removed one by one, more are filtered out of each index at once
+        self.assertEqual(len(store.delete_many(generator.sample(store.ids(), BULK_REMOVE // 2))), BULK_REMOVE // 2)
+        self.assertEqual(len(store.delete_many(generator.sample(store.ids(), BULK_REMOVE * 2))), BULK_REMOVE * 2)
+        self.assertEqual(len(store), len(self.rows) + len(new_rows) - 20 - BULK_REMOVE // 2 - BULK_REMOVE * 2)
+        self.assert_indexes_match(store)
+
+    # delete_many returns the values of the contacts in order, and deletes nothing if any id is unknown
+    def test_delete_many(self):
+        store = self.store
+        contact_ids = store.ids(0, 5)
+        with self.assertRaises(KeyError):
+            store.delete_many(contact_ids + [len(self.rows) + 1])
+        self.assertEqual(len(store), len(self.rows))
+        expected = [store.values(contact_id) for contact_id in contact_ids]
+        self.assertEqual(store.delete_many(contact_ids), expected)
+        self.assertFalse(any(contact_id in store for contact_id in contact_ids))
+
+    # Listeners are told about every change
+    def test_listeners(self):
+        store = self.store
+        changes = []
+        store.subscribe(lambda *change: changes.append(change))
+        contact_id = store.add(("Ada", "Lovelace", "", "", "", "", ""))
+        store.update(contact_id, {"last_name": "King"})
+        store.delete(contact_id)
+        self.assertEqual([change[:2] for change in changes], [("add", contact_id), ("update", contact_id), ("delete", contact_id)])
+        self.assertEqual(changes[1][2][1], "Lovelace")
+        self.assertEqual(changes[1][3][1], "King")
+
+    # Clearing empties the store and every index, and restoring puts back the same contacts under the same ids
+    def test_clear_and_restore(self):
+        store = self.store
+        self.assert_indexes_match(store)
+        before = store.snapshot()
+        state = store.clear()
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.query("smi"), [])
+        self.assertEqual(store.facet_index("town").group_count(), 0)
+        store.add(("Ada", "Lovelace", "", "", "", "", ""))
+        with self.assertRaises(ValueError):
+            store.restore(state)
+        store.clear()
+        store.restore(state)
+        self.assertEqual(store.snapshot(), before)
+        self.assert_indexes_match(store)
+
+    # Contacts are found by phone number however it was written, and the fuzzy search allows a typo
+    def test_keys_and_fuzzy_search(self):
+        store = self.store
+        contact_id = store.add(("Bartholomew", "Featherstonehaugh", "", "+44 7700 123456", "", "", ""))
+        self.assertEqual(store.find_by_phone("07700123456"), [contact_id])
+        self.assertEqual(store.fuzzy_query("Bartholomew Featherstonhaugh", 1)[0][0], contact_id)
+
+    # Sort indexes built, and fields sorted on demand, while another thread adds contacts miss none of them
+    def test_sort_while_adding(self):
+        store = self.store
+        rows = sample_rows(3000, seed=2)
+        fields = ["address", "mobile_number", "secondary_number", "picture_path"]
+
+        def add():
+            for values in rows:
+                store.add(values)
+
+        adder = threading.Thread(target=add)
+        adder.start()
+        while adder.is_alive():
+            store.sorted_ids("email_address", 0, 10)
+            if fields:
+                store.add_sort_index(fields.pop())
+        adder.join()
+        for field in store.sort_indexes:
+            self.assertEqual(store.sorted_ids(field), scan_sorted(store, field), field)
+
+    # Loading a contacts file keeps its rows, commas and non-ASCII characters included
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ("contacts.txt", "contacts.abk"):
+                file_path = os.path.join(directory, name)
+                self.store.save(file_path)
+                loaded = ContactStore()
+                self.assertEqual(loaded.load(file_path), len(self.rows))
+                self.assertEqual(loaded.snapshot()[1], self.store.snapshot()[1], name)
+                loaded.close()
+
+    # A contacts file saved by an older version of the app in cp1252 is still read, and saved again as UTF-8
+    def test_legacy_encoding(self):
+        store = ContactStore()
+        self.assertEqual(store.load(LEGACY_FILE), len(LEGACY_ROWS))
+        self.assertEqual([store.values(contact_id) for contact_id in range(len(LEGACY_ROWS))], LEGACY_ROWS)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "contacts.txt")
+            store.save(file_path)
+            with open(file_path, encoding="utf-8") as file:
+                self.assertIn("Zoë", file.read())
+            sqlite = SqliteContactStore(os.path.join(directory, "contacts.db"))
+            self.assertEqual(sqlite.load(LEGACY_FILE), len(LEGACY_ROWS))
+            self.assertEqual(sqlite.snapshot()[1], store.snapshot()[1])
+            sqlite.close()
+
+
+# Class testing that SqliteContactStore gives the same results as ContactStore for the same changes
+class SqliteContactStoreTest(unittest.TestCase):
+    # Make both stores holding the sample contacts under the same ids
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        rows = sample_rows(300)
+        self.memory = ContactStore()
+        self.memory.add_many(rows)
+        self.sqlite = SqliteContactStore(os.path.join(self.directory.name, "contacts.db"))
+        self.sqlite.add_many(rows, range(len(rows)))
+
+    # Close the database and remove its files
+    def tearDown(self):
+        self.sqlite.close()
+        self.directory.cleanup()
+
+    # Check that both stores return the same results
+    def assert_same(self):
+        memory, sqlite = self.memory, self.sqlite
+        self.assertEqual(sqlite.ids(), memory.ids())
+        self.assertEqual([sqlite.values(contact_id) for contact_id in sqlite.ids()], [memory.values(contact_id) for contact_id in memory.ids()])
+        for text in NEEDLES:
+            self.assertEqual(sqlite.query(text), memory.query(text), text)
+            self.assertEqual([contact_id for chunk in sqlite.scan_query(text, chunk_size=7) for key, contact_id in chunk], memory.query(text), text)
+        self.assertEqual([contact_id for chunk in sqlite.scan_sorted("last_name", chunk_size=7) for key, contact_id in chunk], memory.sorted_ids("last_name"))
+        for facet in FACETS:
+            self.assertEqual(sqlite.facet_index(facet).groups(), memory.facet_index(facet).groups(), facet)
+        self.assertEqual(sqlite.fuzzy_query("smyth", 20), memory.fuzzy_query("smyth", 20))
+
+    # The same adds, edits, deletes and Erase All give the same contacts and query results
+    def test_same_results(self):
+        self.assert_same()
+        for store in (self.memory, self.sqlite):
+            store.add(("Ada", "Lovelace", "1 Mill Road, Leeds", "07700 123456", "", "ada@example.com", ""))
+            for contact_id in random.Random(5).sample(store.ids(), 20):
+                store.update(contact_id, {"last_name": "Smith", "address": "2 Mill Road, Leeds"})
+            store.delete_many(random.Random(6).sample(store.ids(), BULK_REMOVE * 2))
+        self.assert_same()
+        self.assertEqual(self.sqlite.find_by_phone("+44 7700 123456"), self.memory.find_by_phone("07700123456"))
+        for store in (self.memory, self.sqlite):
+            store.restore(store.clear())
+        self.assert_same()
+
+    # Windows of the sort orders, read while scrolling down and up, jumping and changing contacts, match the in-memory
+    # store, and neither they nor the number of contacts count the table again
+    def test_windows(self):
+        memory, sqlite = self.memory, self.sqlite
+        shuffle = random.Random(7)
+        statements = []
+        sqlite._conn.set_trace_callback(statements.append)
+        for step in range(200):
+            if step % 25 == 24:
+                deleted, edited = memory.id_at(shuffle.randrange(len(memory))), memory.id_at(shuffle.randrange(len(memory)))
+                for store in (memory, sqlite):
+                    store.add(("Aaron", f"Zz{step}", "", "", "", "", ""), 1000 + step)
+                    store.update(edited, {"first_name": f"Zz{step}", "last_name": "Aa"})
+                    store.delete(deleted)
+            field = shuffle.choice(("first_name", "last_name"))
+            start = shuffle.choice((0, 5, 150, 290, shuffle.randrange(len(memory))))
+            stop = start + shuffle.choice((1, 20, 50))
+            self.assertEqual(len(sqlite), len(memory))
+            self.assertEqual(sqlite.sorted_ids(field, start, stop), memory.sorted_ids(field, start, stop), (field, start, stop))
+        self.assertEqual(sqlite.add_sort_index("last_name").ids(280), memory.sorted_ids("last_name", 280))
+        # An edit moving the first contact to the end shifts every window read before it
+        first = memory.id_at(0)
+        for update in (False, True):
+            if update:
+                for store in (memory, sqlite):
+                    store.update(first, {"first_name": "Zzz"})
+            for start in range(0, len(memory), 20):
+                self.assertEqual(sqlite.ids(start, start + 20), memory.ids(start, start + 20), (update, start))
+        sqlite._conn.set_trace_callback(None)
+        self.assertNotIn("SELECT COUNT(*) FROM contacts", statements)
+        for store in (memory, sqlite):
+            store.clear()
+        self.assertEqual(len(sqlite), 0)
+        self.assertEqual(sqlite.ids(0, 20), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
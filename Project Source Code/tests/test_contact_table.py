@@ -0,0 +1,133 @@
+'''
+Brief Description of what this code does:
+This code tests ContactTable, the columns of arrays a compact contact
+store keeps its contacts in: values read back from pooled, packed and
+split columns are the values written, including empty ones and ones
+which only partly look like an address or email address, views read and
+write their row, and a deleted row is empty. It also checks that a
+compact ContactStore lists, sorts, searches and groups its contacts
+exactly as an ordinary one after the same loads, edits and deletes.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from Contact import Contact, FIELDS
+from contact_store import ContactStore, write_rows
+from contact_table import BlobColumn, ContactTable, ContactView, SplitColumn
+from facet_index import FACETS
+from tests.sample_contacts import sample_rows
+
+# Search texts compared between the stores
+NEEDLES = ("smith", "road", "0116", "example", "zz")
+
+
+# Class testing the table and its columns
+class ContactTableTest(unittest.TestCase):
+    # Values are read back as written, whether or not they contain the column's separator
+    def test_split_column(self):
+        column = SplitColumn(", ")
+        values = ["1 High Street, Leicester", "Leicester", "", ", ", "a, b, c", "Flat 2, , Leeds"]
+        for row, value in enumerate(values):
+            column.set(row, value)
+        self.assertEqual([column.get(row) for row in range(len(values))], values)
+        self.assertEqual(column.tail.pool.count("Leicester"), 1)
+
+    # Replaced values are reclaimed without moving the others
+    def test_blob_compact(self):
+        column = BlobColumn()
+        for row in range(10):
+            column.set(row, f"0770090{row:04}")
+        column.set(3, "")
+        column.set(5, "ünïcode")
+        column.compact()
+        self.assertEqual(column.waste, 0)
+        self.assertEqual(len(column.data), 9 * 11 - 11 + len("ünïcode".encode("utf-8")))
+        self.assertEqual([column.get(row) for row in (2, 3, 5, 9)], ["07700900002", "", "ünïcode", "07700900009"])
+
+    # Contacts are stored by id, read and written through views, and deleted rows are left empty
+    def test_rows(self):
+        table = ContactTable()
+        table[2] = Contact("Ada", "Lovelace", "12 St James's Square, London", "07700 900123", "", "ada@example.com", "")
+        table[0] = ("Alan", "Turing", "", "", "", "", "")
+        self.assertEqual(len(table), 2)
+        self.assertEqual(list(table), [0, 2])
+        self.assertNotIn(1, table)
+        self.assertIsNone(table.get(1))
+        self.assertRaises(KeyError, table.__getitem__, 1)
+        view = table[2]
+        self.assertIsInstance(view, ContactView)
+        self.assertEqual(str(view), "Ada Lovelace")
+        view.email_address = "ada@analytical.example"
+        self.assertEqual(table[2].email_address, "ada@analytical.example")
+        table[0] = view
+        self.assertEqual([getattr(table[0], field) for field in FIELDS], [getattr(view, field) for field in FIELDS])
+        del table[2]
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table.columns["address"].get(2), "")
+        self.assertRaises(KeyError, table.__delitem__, 2)
+        self.assertRaises(KeyError, table.__setitem__, -1, ("", "", "", "", "", "", ""))
+
+    # The table takes less room than a Contact object and seven strings per contact would
+    def test_nbytes(self):
+        table = ContactTable()
+        for contact_id, values in enumerate(sample_rows(1000)):
+            table[contact_id] = values
+        self.assertLess(table.nbytes(), 1000 * 7 * 60)
+
+
+# Class testing a compact contact store against an ordinary one
+class CompactStoreTest(unittest.TestCase):
+    # Make an ordinary and a compact store, each loaded from the same contacts file
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        file_path = os.path.join(self.directory, "contacts.txt")
+        write_rows(file_path, sample_rows(300))
+        self.stores = [ContactStore(), ContactStore(compact=True)]
+        for store in self.stores:
+            store.load(file_path)
+
+    # Release the stores' files and remove the directory
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.directory)
+
+    # Check the compact store lists, sorts, searches and groups its contacts as the ordinary one does
+    def assert_stores_match(self):
+        ordinary, compact = self.stores
+        self.assertEqual(compact.snapshot(), ordinary.snapshot())
+        self.assertEqual(compact.sorted_ids("last_name"), ordinary.sorted_ids("last_name"))
+        for text in NEEDLES:
+            self.assertEqual(compact.query(text), ordinary.query(text), text)
+        for facet in FACETS:
+            self.assertEqual(compact.facet_index(facet).groups(), ordinary.facet_index(facet).groups(), facet)
+
+    # The stores match after the same adds, edits and deletes, and the compact store's contacts are views of its table
+    def test_same_changes(self):
+        self.assert_stores_match()
+        for store in self.stores:
+            store.add(Contact("Ada", "Lovelace", "12 St James's Square, London", "07700 900123", "", "ada@example.com", ""))
+            store.add_many(sample_rows(50))
+            store.update(0, {"last_name": "Aardvark", "address": "9 Mill Lane"})
+            store.update_many([(contact_id, {"email_address": ""}) for contact_id in store.ids(10, 30)])
+            store.delete(1)
+            store.delete_many(store.ids(100, 140))
+        self.assert_stores_match()
+        ordinary, compact = self.stores
+        self.assertIsInstance(compact.get(0), ContactView)
+        self.assertEqual(compact.get(0).last_name, "Aardvark")
+        self.assertRaises(KeyError, compact.get, 1)
+
+    # The stores match after being cleared and restored
+    def test_clear_and_restore(self):
+        for store in self.stores:
+            state = store.clear()
+            self.assertEqual(len(store), 0)
+            store.restore(state)
+        self.assert_stores_match()
+
+
+if __name__ == "__main__":
+    unittest.main()
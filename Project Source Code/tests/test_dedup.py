@@ -0,0 +1,109 @@
+'''
+Brief Description of what this code does:
+This code tests the duplicate finder: the union-find structure, which
+names count as alike, and the clusters found in a book where the same
+people were imported more than once with their names, numbers and
+email addresses written differently. Family members sharing a number,
+and people who share a name but nothing else, must stay apart. Merging
+a cluster keeps the first contact and fills its empty fields from the
+others.
+'''
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+import dedup
+from contact_journal import ContactJournal
+from contact_store import ContactStore, write_rows
+from dedup import UnionFind, find_duplicates, merge_duplicates, similar_names
+
+
+# Class testing finding and merging duplicate contacts
+class DedupTest(unittest.TestCase):
+    # Make a store holding groups of duplicates among contacts which are not duplicates
+    def setUp(self):
+        self.store = ContactStore()
+        add = self.store.add
+        self.ada = [add(("Ada", "Lovelace", "", "07700 900001", "", "ada@example.com", "")),
+                    add(("ada", "LOVELACE", "1 Mill Road, Leeds", "+44 7700 900001", "", "", "")),
+                    add(("Ada", "Lovelac", "", "", "0116 496 0001", "ADA@example.com", "pictures/ada.png"))]
+        self.alan = [add(("Alan", "Turing", "2 High Street, Leicester", "", "", "", "")),
+                     add(("Alan", "Turing", "2 High Street,  LEICESTER", "07700 900002", "", "", ""))]
+        # Same surname and landline as the Lovelaces but a different person
+        self.byron = add(("Byron", "Lovelace", "", "", "07700 900001", "", ""))
+        # Same name as Alan Turing but nothing else in common
+        self.other_alan = add(("Alan", "Turing", "9 Station Road, Bristol", "07700 900099", "", "alan@example.net", ""))
+        self.loners = [add((f"Person{number}", "Smith", "", f"07700 91{number:04d}", "", "", "")) for number in range(20)]
+
+    # Sets are joined and the smallest member is the representative
+    def test_union_find(self):
+        sets = UnionFind(6)
+        sets.union(4, 2)
+        sets.union(2, 5)
+        sets.union(0, 1)
+        self.assertEqual([sets.find(item) for item in range(6)], [0, 0, 2, 3, 2, 2])
+
+    # Names alike apart from case, punctuation and one typo are similar
+    def test_similar_names(self):
+        self.assertTrue(similar_names(("Ada", "Lovelace"), ("ADA", "love-lace")))
+        self.assertTrue(similar_names(("Ada", "Lovelace"), ("Ada", "Lovelac")))
+        self.assertFalse(similar_names(("Ada", "Lovelace"), ("Ada", "Lovelock")))
+
+    # Duplicates are clustered, in display order, and everyone else is left alone
+    def test_find_duplicates(self):
+        clusters = find_duplicates(self.store)
+        self.assertEqual(sorted(map(sorted, clusters)), sorted([self.ada, self.alan]))
+        for cluster in clusters:
+            self.assertEqual(cluster, sorted(cluster, key=self.store.position))
+
+    # Name blocks larger than the limit are not compared pair by pair, but contacts are still joined by address
+    def test_block_size(self):
+        for number in range(3):
+            self.store.add(("Alan", "Turing", "", f"07700 92{number:04d}", "", "", ""))
+        clusters = find_duplicates(self.store, max_block_size=2)
+        self.assertEqual(sorted(map(sorted, clusters)), sorted([self.ada, self.alan]))
+
+    # Merging keeps the first contact of each cluster, filling its empty fields and keeping both phone numbers
+    def test_merge(self):
+        clusters = find_duplicates(self.store)
+        size = len(self.store)
+        self.assertEqual(merge_duplicates(self.store, clusters), 3)
+        self.assertEqual(len(self.store), size - 3)
+        keep = next(cluster[0] for cluster in clusters if cluster[0] in self.ada)
+        self.assertEqual(self.store.values(keep), ("Ada", "Lovelace", "1 Mill Road, Leeds", "07700 900001", "0116 496 0001",
+                                                   "ada@example.com", "pictures/ada.png"))
+        self.assertEqual(find_duplicates(self.store), [])
+        # Contacts deleted since the clusters were found are left out
+        self.assertEqual(merge_duplicates(self.store, clusters), 0)
+
+    # Run as a script with --merge, edits which are only in the journal are merged and kept
+    def test_script_keeps_journal(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(directory, "contacts.txt")
+            write_rows(file_path, [("Ada", "Lovelace", "", "07700 900001", "", "", ""), ("Alan", "Turing", "", "", "", "", "")])
+            store = ContactStore()
+            journal = ContactJournal(store, file_path, flush_interval=60)
+            journal.open()
+            store.add(("ada", "LOVELACE", "1 Mill Road, Leeds", "+44 7700 900001", "", "", ""))
+            store.update(1, {"address": "2 High Street"})
+            journal.close()
+            with mock.patch("sys.argv", ["dedup.py", file_path, "--merge"]), redirect_stdout(io.StringIO()) as output:
+                dedup.main()
+            self.assertIn("Merged away 1 contacts", output.getvalue())
+            reopened = ContactStore()
+            journal = ContactJournal(reopened, file_path, flush_interval=60)
+            journal.open()
+            journal.close()
+            self.assertEqual(reopened.snapshot()[1], [("Ada", "Lovelace", "1 Mill Road, Leeds", "07700 900001", "", "", ""),
+                                                      ("Alan", "Turing", "2 High Street", "", "", "", "")])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
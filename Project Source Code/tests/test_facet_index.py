@@ -0,0 +1,110 @@
+'''
+Brief Description of what this code does:
+This code tests the facets contacts can be grouped by: the initial of a
+surname, the domain of an email address and the town of an address, and
+FacetIndex, which keeps each group's contacts sorted by surname. It
+checks that the counts and members of every group, read from the
+store's indexes, still match a scan of the contacts after they are
+added, edited and deleted one at a time and in batches.
+'''
+
+import unittest
+from collections import Counter
+from Contact import FIELDS
+from contact_store import ContactStore
+from facet_index import FACETS, NO_GROUP, FacetIndex, address_town, email_domain, surname_initial
+from tests.sample_contacts import sample_rows
+
+
+# Class testing the facet functions and FacetIndex
+class FacetIndexTest(unittest.TestCase):
+    # Surnames are grouped by their upper-cased initial, with "#" for other characters and "" for no surname
+    def test_surname_initial(self):
+        self.assertEqual(surname_initial(" smith"), "S")
+        self.assertEqual(surname_initial("Ölund"), "Ö")
+        self.assertEqual(surname_initial("123"), "#")
+        self.assertEqual(surname_initial(""), NO_GROUP)
+
+    # Email addresses are grouped by their lower-cased domain
+    def test_email_domain(self):
+        self.assertEqual(email_domain("Ada@Example.COM "), "example.com")
+        self.assertEqual(email_domain("<ada@example.com>"), "example.com")
+        self.assertEqual(email_domain("not an address"), NO_GROUP)
+
+    # Addresses are grouped by their last part once the postcode is removed, in title case when typed in one case
+    def test_address_town(self):
+        self.assertEqual(address_town("1 High Street, leicester LE1 7RH"), "Leicester")
+        self.assertEqual(address_town("The Old Mill, Stratford upon Avon"), "Stratford upon Avon")
+        self.assertEqual(address_town("Leeds"), "Leeds")
+        self.assertEqual(address_town("12 Road"), NO_GROUP)
+
+    # Groups are listed in order with their counts, contacts with no group last, and members sorted by surname
+    def test_groups(self):
+        index = FacetIndex("surname_initial")
+        index.add(0, ("Ada", "lovelace", "", "", "", "", ""))
+        index.add_many([(1, ("Alan", "Turing", "", "", "", "", "")), (2, ("Ben", "", "", "", "", "", "")),
+                        (3, ("Grace", "Hopper", "", "", "", "", "")), (4, ("Ida", "Lamb", "", "", "", "", ""))])
+        self.assertEqual(index.groups(), [("H", 1), ("L", 2), ("T", 1), (NO_GROUP, 1)])
+        self.assertEqual(index.ids("L"), [4, 0])
+        self.assertEqual(index.group_of(0), "L")
+        self.assertEqual(index.find("m"), 2)
+        self.assertEqual(index.find("Z"), 3)
+        index.remove(3, ("Grace", "Hopper", "", "", "", "", ""))
+        index.remove_many([(0, ()), (4, ())])
+        self.assertEqual(index.groups(), [("T", 1), (NO_GROUP, 1)])
+        self.assertEqual(index.count("L"), 0)
+        self.assertEqual(len(index), 2)
+
+
+# Class testing the facet indexes of a contact store as contacts change
+class StoreFacetTest(unittest.TestCase):
+    # Make a store holding the sample contacts, and build its facet indexes
+    def setUp(self):
+        self.store = ContactStore()
+        self.store.add_many(sample_rows(300))
+        for facet in FACETS:
+            self.store.facet_index(facet)
+
+    # Check every facet index's groups and members against a scan of the contacts
+    def assert_facets_match(self):
+        by_surname = sorted(self.store.ids(), key=lambda contact_id: (self.store.values(contact_id)[1].casefold(), contact_id))
+        for facet, (title, group_of, field) in FACETS.items():
+            index = self.store.facet_index(facet)
+            position = FIELDS.index(field)
+            groups = Counter(group_of(self.store.values(contact_id)[position]) for contact_id in self.store.ids())
+            self.assertEqual(dict(index.groups()), dict(groups), facet)
+            self.assertEqual(index.group_count(), len(groups), facet)
+            for group, count in groups.items():
+                self.assertEqual(index.count(group), count, (facet, group))
+                members = [contact_id for contact_id in by_surname if group_of(self.store.values(contact_id)[position]) == group]
+                self.assertEqual(index.ids(group), members, (facet, group))
+
+    # Counts follow contacts added, edited and deleted one at a time
+    def test_single_edits(self):
+        self.assert_facets_match()
+        added = self.store.add(("Zed", "Quayle", "4 Quay Street, Zennor TR26 3AA", "07700 900001", "", "zed@quayle.example", ""))
+        self.assertEqual(self.store.facet_index("town").ids("Zennor"), [added])
+        self.store.update(0, {"last_name": "Aardvark", "email_address": "", "address": "9 Mill Lane, Zennor"})
+        self.assertEqual(self.store.facet_index("town").count("Zennor"), 2)
+        self.store.delete(1)
+        self.assert_facets_match()
+        self.store.delete(added)
+        self.assertEqual(self.store.facet_index("email_domain").count("quayle.example"), 0)
+        self.assert_facets_match()
+
+    # Counts follow contacts added, edited and deleted in batches, and cleared and restored
+    def test_batch_edits(self):
+        self.store.add_many(sample_rows(50))
+        self.store.update_many([(contact_id, {"address": ""}) for contact_id in self.store.ids(0, 40)])
+        self.store.delete_many(self.store.ids(100, 160))
+        self.assert_facets_match()
+        groups = self.store.facet_index("town").groups()
+        state = self.store.clear()
+        self.assertEqual(self.store.facet_index("town").groups(), [])
+        self.store.restore(state)
+        self.assertEqual(self.store.facet_index("town").groups(), groups)
+        self.assert_facets_match()
+
+
+if __name__ == "__main__":
+    unittest.main()
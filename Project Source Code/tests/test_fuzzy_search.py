@@ -0,0 +1,123 @@
+'''
+Brief Description of what this code does:
+This code tests the fuzzy and phonetic name search: the Soundex and
+Metaphone keys and the bounded edit distance it is built on, and the
+ranking of FuzzyIndex results, where an exact name comes before a typo
+or a name spelt another way, every word of the query must match, and
+the index follows contacts as they are edited and deleted. It also
+checks that the store's first fuzzy search, which builds the index, is
+safe while another thread is adding contacts.
+'''
+
+import threading
+import unittest
+from contact_store import ContactStore
+from fuzzy_search import FuzzyIndex, bounded_edit_distance, metaphone, soundex, words
+from tests.sample_contacts import sample_rows
+
+
+# Function to return the values of a contact with only a first and last name
+def name(first, last):
+    return (first, last, "", "", "", "", "")
+
+
+# Class testing the fuzzy name index
+class FuzzySearchTest(unittest.TestCase):
+    # Make an index over a few names which are spelt alike or sound alike
+    def setUp(self):
+        self.index = FuzzyIndex()
+        self.names = {0: name("John", "Smith"), 1: name("Jon", "Smyth"), 2: name("Joan", "Smithers"), 3: name("Mary", "Jones"),
+                      4: name("Jonathan", "Smith"), 5: name("Aisha", "Patel")}
+        self.index.add_many(self.names.items())
+
+    # Words are case-folded and split on anything but letters
+    def test_words(self):
+        self.assertEqual(words("O'Brien-Smith  ZOË"), ["o", "brien", "smith", "zoë"])
+
+    # Names which sound alike share their phonetic keys
+    def test_phonetic_keys(self):
+        self.assertEqual(soundex("Robert"), "R163")
+        self.assertEqual(soundex("Rupert"), "R163")
+        self.assertEqual(soundex("Tymczak"), "T522")
+        self.assertEqual(metaphone("Smith"), metaphone("Smyth"))
+        self.assertEqual(soundex("Zoë"), "Z000")
+        self.assertEqual(metaphone("123"), "")
+
+    # The edit distance counts a swap as one edit and stops once it exceeds the bound
+    def test_edit_distance(self):
+        self.assertEqual(bounded_edit_distance("jonh", "john", 2), 1)
+        self.assertEqual(bounded_edit_distance("smith", "smyth", 2), 1)
+        self.assertEqual(bounded_edit_distance("kitten", "sitting", 3), 3)
+        self.assertEqual(bounded_edit_distance("kitten", "sitting", 1), 2)
+        self.assertEqual(bounded_edit_distance("a", "abcdef", 2), 3)
+
+    # An exact match ranks first, then typos and names which sound the same, and unrelated names are left out
+    def test_ranking(self):
+        results = self.index.search("smith", limit=10)
+        ids = [contact_id for contact_id, score in results]
+        self.assertEqual(ids[:2], [0, 4])
+        self.assertEqual(results[0][1], 1.0)
+        self.assertIn(1, ids)
+        self.assertLess(dict(results)[1], 1.0)
+        self.assertNotIn(5, ids)
+        self.assertEqual([score for contact_id, score in results], sorted((score for contact_id, score in results), reverse=True))
+
+    # A typo in a first name still finds the contact, and every query word has to match
+    def test_several_words(self):
+        results = self.index.search("Jonh Smith")
+        self.assertEqual(results[0][0], 0)
+        self.assertNotIn(3, [contact_id for contact_id, score in results])
+        self.assertEqual(self.index.search("Aisha Smith"), [])
+        self.assertEqual(self.index.search("   "), [])
+
+    # The start of a long name finds it
+    def test_prefix(self):
+        self.assertIn(4, [contact_id for contact_id, score in self.index.search("Jonat")])
+
+    # The limit keeps the best results
+    def test_limit(self):
+        self.assertEqual([contact_id for contact_id, score in self.index.search("smith", limit=2)], [0, 4])
+
+    # Edited and deleted contacts are found by their new names only
+    def test_changes(self):
+        self.index.remove(0, self.names[0])
+        self.index.add(0, name("John", "Brown"))
+        self.index.remove(5, self.names[5])
+        self.assertNotIn(0, [contact_id for contact_id, score in self.index.search("smith")])
+        self.assertEqual(self.index.search("brown")[0], (0, 1.0))
+        self.assertEqual(self.index.search("patel"), [])
+        self.assertNotIn("patel", self.index._postings)
+
+
+# Class testing fuzzy searches through the contact store
+class StoreFuzzySearchTest(unittest.TestCase):
+    # The store's fuzzy search follows edits made after the index was built
+    def test_store(self):
+        store = ContactStore()
+        store.add_many(sample_rows(200))
+        self.assertTrue(store.fuzzy_query("Smyth", 5))
+        contact_id = store.add(name("Bartholomew", "Featherstonehaugh"))
+        self.assertEqual(store.fuzzy_query("Featherstonhaugh", 1)[0][0], contact_id)
+        store.delete(contact_id)
+        self.assertEqual(store.fuzzy_query("Featherstonhaugh"), [])
+
+    # The first fuzzy search builds the index while another thread adds contacts, and the index misses none of them
+    def test_build_while_adding(self):
+        store = ContactStore()
+        store.add_many(sample_rows(2000))
+        rows = [name(f"Added{number}", "Quixote") for number in range(2000)]
+
+        def add():
+            for values in rows:
+                store.add(values)
+
+        adder = threading.Thread(target=add)
+        adder.start()
+        while adder.is_alive():
+            store.fuzzy_query("Smith")
+        adder.join()
+        self.assertEqual(len(store.fuzzy_query("Quixote", 5000)), len(rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+'''
+Brief Description of what this code does:
+This code tests LiveFilter, the search box behind the main list, with a
+stand-in for Tk's after timers. It checks that a search waits for typing
+to pause, that short queries stream in chunk by chunk and a query which
+only grew narrows the previous results, that queries for the trigram
+index run on a BackgroundWorker, and that a new keystroke cancels a scan
+or makes the filter ignore a query still running, so only the results of
+the latest text are ever shown.
+'''
+
+import time
+import unittest
+from background import BackgroundWorker
+from contact_store import ContactStore
+from live_filter import LiveFilter
+from tests.sample_contacts import sample_rows
+
+
+# Class standing in for a Tk widget, running its after callbacks only when asked
+class FakeWidget:
+    # Initialise the widget with no callbacks waiting
+    def __init__(self):
+        self.pending = {}
+        self.count = 0
+
+    # Schedule a callback, ignoring the delay
+    def after(self, delay, callback, *args):
+        self.count += 1
+        self.pending[self.count] = (callback, args)
+        return self.count
+
+    # Forget a scheduled callback
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+    # Run the callback scheduled first, if there is one
+    def step(self):
+        if not self.pending:
+            return False
+        callback, args = self.pending.pop(min(self.pending))
+        callback(*args)
+        return True
+
+    # Run callbacks until none are left, giving worker threads time to finish
+    def run(self):
+        while self.step():
+            time.sleep(0.001)
+
+
+# Class testing the live filter of the search box
+class LiveFilterTest(unittest.TestCase):
+    # Make a store holding the sample contacts and a filter reporting into a list, with a worker for trigram queries
+    def setUp(self):
+        self.store = ContactStore()
+        self.store.add_many(sample_rows(500))
+        self.widget = FakeWidget()
+        self.workers = BackgroundWorker(self.widget, max_workers=1)
+        self.reports = []
+        self.filter = LiveFilter(self.widget, self.store, lambda ids, done: self.reports.append((list(ids) if ids is not None else None, done)),
+                                 chunk_size=100, workers=self.workers)
+
+    # Stop the worker
+    def tearDown(self):
+        self.workers.shutdown()
+
+    # Return the ids, in display order, of the contacts with a searched field containing the text, ignoring case
+    def scan(self, text):
+        return [contact_id for contact_id in self.store.ids() if any(text in value.lower() for value in self.store.values(contact_id)[:6])]
+
+    # A short query waits for typing to pause, then streams its matches a chunk at a time
+    def test_short_query(self):
+        self.filter.set_text("s")
+        self.filter.set_text("sm")
+        self.assertEqual(self.reports, [])
+        self.widget.run()
+        self.assertEqual(len(self.reports), 6)
+        self.assertEqual([done for ids, done in self.reports], [False] * 5 + [True])
+        self.assertEqual(self.reports[-1][0], self.scan("sm"))
+        self.assertEqual(self.filter.results, self.scan("sm"))
+
+    # A query which only grew is checked against the previous results rather than every contact
+    def test_narrowing(self):
+        self.filter.set_text("sm")
+        self.widget.run()
+        self.reports.clear()
+        self.filter.set_text("smi")
+        self.widget.run()
+        self.assertEqual(len(self.reports), -(-len(self.scan("sm")) // 100) + 1)
+        self.assertEqual(self.filter.results, self.scan("smi"))
+        self.filter.set_text("")
+        self.widget.run()
+        self.assertEqual(self.reports[-1], (None, True))
+        self.assertFalse(self.filter.active)
+
+    # A query long enough for the trigram index is answered on the worker, in one report
+    def test_trigram_query(self):
+        self.filter.set_text("smith")
+        self.widget.run()
+        self.assertEqual(self.reports, [(self.scan("smith"), True)])
+        self.assertNotIn(self.store.ngram_index, self.store._pending)
+
+    # A keystroke during a scan stops it, and only the latest text is reported afterwards
+    def test_cancel_scan(self):
+        self.filter.set_text("a")
+        self.widget.step()
+        self.widget.step()
+        self.assertEqual(self.reports[-1][1], False)
+        self.filter.set_text("zz")
+        self.reports.clear()
+        self.widget.run()
+        self.assertEqual(self.reports[-1], ([], True))
+        self.assertTrue(all(ids == [] for ids, done in self.reports))
+
+    # A keystroke while a query runs on the worker makes the filter ignore its results
+    def test_cancel_query(self):
+        self.filter.set_text("smith")
+        self.widget.step()  # Submit the query to the worker
+        self.filter.set_text("sm")
+        self.widget.run()
+        self.assertTrue(self.reports)
+        self.assertTrue(all(ids != self.scan("smith") for ids, done in self.reports))
+        self.assertEqual(self.filter.results, self.scan("sm"))
+
+    # A contact changed while a query runs on the worker is reflected once the query is run again
+    def test_change_during_query(self):
+        self.filter.set_text("smith")
+        self.widget.step()
+        contact_id = self.store.add(("Ada", "Smith", "", "", "", "", ""))
+        self.widget.run()
+        self.assertIn(contact_id, self.filter.results)
+        self.assertEqual(self.filter.results, self.scan("smith"))
+
+    # Contacts deleted and added during a scan neither shift other contacts out of it nor are reported once deleted
+    def test_change_during_scan(self):
+        self.filter.set_text("s")
+        self.widget.step()
+        self.widget.step()
+        deleted = self.store.ids(300, 320)
+        self.store.delete_many(deleted)
+        self.store.add_many([("Aaron", "Smith", "", "", "", "", "")] * 50)
+        expected = [contact_id for contact_id in self.scan("s") if contact_id < 500]
+        self.widget.run()
+        self.assertEqual(self.filter.results, expected)
+        self.assertTrue(set(deleted).isdisjoint(self.filter.results))
+
+
+if __name__ == "__main__":
+    unittest.main()
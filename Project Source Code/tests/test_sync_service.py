@@ -0,0 +1,193 @@
+'''
+Brief Description of what this code does:
+This code tests the sync service: the hybrid logical clock only moves
+forward and orders stamps from different copies, the server's state
+keeps the change with the later stamp for each contact and hands each
+copy only the changes it has not seen, and two address books syncing
+through a server on a free local port end up the same, deletes and
+Erase All included, whichever copy changed a contact last.
+'''
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from contact_store import ContactStore
+from sync_service import HybridClock, SyncClient, SyncServer, SyncState, decode_message, encode_message
+from tests.sample_contacts import sample_rows
+
+
+# Class testing the hybrid logical clock
+class HybridClockTest(unittest.TestCase):
+    # Stamps move forward even when the wall clock stands still or goes back
+    def test_now(self):
+        clock = HybridClock("a")
+        with mock.patch("sync_service.time.time", return_value=1000.0):
+            first = clock.now()
+            second = clock.now()
+        with mock.patch("sync_service.time.time", return_value=999.0):
+            third = clock.now()
+        self.assertEqual(first, (1000000, 0, "a"))
+        self.assertLess(first, second)
+        self.assertLess(second, third)
+
+    # Observing a later stamp from another node moves the clock past it
+    def test_observe(self):
+        clock = HybridClock("a")
+        with mock.patch("sync_service.time.time", return_value=1000.0):
+            clock.observe((2000000, 5, "b"))
+            stamp = clock.now()
+        self.assertEqual(stamp, (2000000, 6, "a"))
+        self.assertGreater(stamp, (2000000, 5, "b"))
+        clock.observe((1500000, 9, "c"))
+        self.assertEqual((clock.wall, clock.counter), (2000000, 6))
+
+    # Messages survive compressing and decompressing
+    def test_messages(self):
+        message = {"node": "a", "since": 0, "changes": [["uid", [1, 0, "a"], ["Zoë", "Müller"]]], "limit": 10}
+        self.assertEqual(decode_message(encode_message(message)), message)
+
+
+# Class testing the server's state
+class SyncStateTest(unittest.TestCase):
+    # The later stamp wins whichever order changes arrive in, and a tombstone is kept like any other change
+    def test_last_writer_wins(self):
+        state = SyncState()
+        state.exchange("a", 0, [["x", [5, 0, "a"], ["Ada"]]])
+        state.exchange("b", 0, [["x", [4, 0, "b"], ["Old"]]])
+        self.assertEqual(state.exchange("c", 0, [])["changes"], [["x", [5, 0, "a"], ["Ada"]]])
+        state.exchange("b", 0, [["x", [6, 0, "b"], None]])
+        self.assertEqual(state.exchange("c", 0, [])["changes"], [["x", [6, 0, "b"], None]])
+
+    # Each node is sent the changes since its cursor, without its own, in batches
+    def test_cursor_and_batches(self):
+        state = SyncState()
+        reply = state.exchange("a", 0, [[f"a{number}", [number, 0, "a"], ["A"]] for number in range(5)])
+        self.assertEqual(reply["changes"], [])
+        cursor = reply["cursor"]
+        state.exchange("b", 0, [[f"b{number}", [number, 0, "b"], ["B"]] for number in range(5)])
+        first = state.exchange("a", cursor, [], limit=3)
+        self.assertTrue(first["more"])
+        second = state.exchange("a", first["cursor"], [], limit=3)
+        self.assertFalse(second["more"])
+        self.assertEqual([change[0] for change in first["changes"] + second["changes"]], [f"b{number}" for number in range(5)])
+        self.assertEqual(state.exchange("a", second["cursor"], [])["changes"], [])
+
+    # The state is saved and loaded again
+    def test_save(self):
+        directory = tempfile.mkdtemp()
+        try:
+            state_path = os.path.join(directory, "server.json")
+            state = SyncState(state_path)
+            state.exchange("a", 0, [["x", [5, 0, "a"], ["Ada"]], ["y", [6, 0, "a"], None]])
+            state.save()
+            loaded = SyncState(state_path)
+            self.assertEqual(loaded.sequence, 2)
+            self.assertEqual(loaded.exchange("b", 0, [])["changes"], state.exchange("b", 0, [])["changes"])
+        finally:
+            shutil.rmtree(directory)
+
+
+# Class testing two address books kept in step through a server
+class SyncClientTest(unittest.TestCase):
+    # Start a server on a free port and open two empty books syncing through it
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = SyncServer(port=0).start()
+        self.clients = []
+        self.first = self.open_client("first")
+        self.second = self.open_client("second")
+
+    # Close the books and the server and remove the directory
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+    # Open a client for a new empty store, keeping its state in the directory
+    def open_client(self, name):
+        client = SyncClient(ContactStore(), self.server.url, os.path.join(self.directory, name + ".sync"), batch_size=50)
+        client.open()
+        self.clients.append(client)
+        return client
+
+    # Sync both books, then the first again so it receives the second's changes
+    def sync_all(self):
+        self.first.sync()
+        self.second.sync()
+        self.first.sync()
+
+    # Check that both books hold the same contacts
+    def assert_same(self):
+        self.assertEqual(self.first.store.snapshot()[1], self.second.store.snapshot()[1])
+
+    # Contacts added, edited and deleted on either book reach the other, in several batches
+    def test_changes(self):
+        first, second = self.first.store, self.second.store
+        first.add_many(sample_rows(120))
+        self.sync_all()
+        self.assertEqual(len(second), 120)
+        self.assert_same()
+        second.update(second.id_at(0), {"first_name": "Zed"})
+        first.delete(first.id_at(5))
+        first.add(("Ada", "Lovelace", "", "", "", "", ""))
+        self.sync_all()
+        self.assertEqual(len(first), 120)
+        self.assertEqual(len(first.query("zed")), 1)
+        self.assert_same()
+
+    # When both books change the same contact, the later change wins on both, and a later delete wins over an edit
+    def test_conflicts(self):
+        first, second = self.first.store, self.second.store
+        first.add(("Ada", "Lovelace", "", "", "", "", ""))
+        self.sync_all()
+        first.update(first.id_at(0), {"last_name": "Byron"})
+        time.sleep(0.01)
+        second.update(second.id_at(0), {"last_name": "King"})
+        self.sync_all()
+        self.second.sync()
+        self.assertEqual(first.name(first.id_at(0)), "Ada King")
+        self.assert_same()
+        second.update(second.id_at(0), {"address": "1 Mill Road"})
+        time.sleep(0.01)
+        first.delete(first.id_at(0))
+        self.sync_all()
+        self.second.sync()
+        self.assertEqual(len(first), 0)
+        self.assertEqual(len(second), 0)
+
+    # Erase All deletes the contacts everywhere, and undoing it brings them back everywhere under the same global ids
+    def test_erase_all(self):
+        first, second = self.first.store, self.second.store
+        first.add_many(sample_rows(30))
+        self.sync_all()
+        state = second.clear()
+        self.sync_all()
+        self.assertEqual(len(first), 0)
+        second.restore(state)
+        self.sync_all()
+        self.assertEqual(len(first), 30)
+        self.assert_same()
+        self.assertEqual(sorted(self.first._ids), sorted(self.second._ids))
+
+    # A book reopened with contacts changed while sync was not running sends those as changes
+    def test_reopen(self):
+        first = self.first.store
+        first.add_many(sample_rows(10))
+        self.sync_all()
+        self.first.close()
+        self.clients.remove(self.first)
+        first.update(first.id_at(0), {"first_name": "Offline"})
+        self.first = SyncClient(first, self.server.url, self.first.state_path)
+        self.assertEqual(self.first.open(), 2)  # The changed contact, and the tombstone of the contact it was
+        self.clients.append(self.first)
+        self.sync_all()
+        self.assertEqual(len(self.second.store), 10)
+        self.assert_same()
+
+
+if __name__ == "__main__":
+    unittest.main()
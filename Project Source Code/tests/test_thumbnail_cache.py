@@ -0,0 +1,116 @@
+'''
+Brief Description of what this code does:
+This code tests the on-disk tier of ThumbnailCache: a picture is scaled
+down once, identical pictures share one thumbnail, and changing a
+picture makes a new one. It also checks that choosing a picture in the
+contact dialog hands the thumbnail to a worker, and that a file which is
+not a picture, or is too large to decode safely, is ignored there
+rather than raising. The tests need PIL and are skipped without it.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from thumbnail_cache import ThumbnailCache
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# Class standing in for a BackgroundWorker, running each job straight away
+class ImmediateWorker:
+    # Initialise the worker with no jobs run
+    def __init__(self):
+        self.jobs = []
+
+    # Run a job and hand its result or error to the callbacks
+    def submit(self, function, *args, on_done=None, on_error=None):
+        self.jobs.append(args)
+        try:
+            result = function(*args)
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(e)
+        else:
+            if on_done is not None:
+                on_done(result)
+
+
+# Class testing the thumbnails kept on disk
+@unittest.skipIf(Image is None, "PIL is not installed")
+class ThumbnailCacheTest(unittest.TestCase):
+    # Make a directory with a picture in it and a cache beside it
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ThumbnailCache(os.path.join(self.directory, ".thumbnails"), size=(50, 50))
+        self.picture = self.save_picture("ada.png", "red")
+
+    # Remove the directory
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Save a picture of one colour and return its path
+    def save_picture(self, name, colour, size=(400, 200)):
+        file_path = os.path.join(self.directory, name)
+        Image.new("RGB", size, colour).save(file_path)
+        return file_path
+
+    # A picture is scaled to fit the thumbnail size, keeping its shape, and loaded from disk afterwards
+    def test_generate(self):
+        thumbnail_path = self.cache.generate(self.picture)
+        with Image.open(thumbnail_path) as thumbnail:
+            self.assertEqual(thumbnail.size, (50, 25))
+        self.assertEqual(self.cache.generate(self.picture), thumbnail_path)
+        self.assertEqual(self.cache.load(self.picture).size, (50, 25))
+
+    # Identical pictures share a thumbnail, and a changed picture gets a new one
+    def test_shared_and_changed(self):
+        copy = os.path.join(self.directory, "copy.png")
+        shutil.copyfile(self.picture, copy)
+        first = self.cache.generate(self.picture)
+        self.assertEqual(self.cache.generate(copy), first)
+        self.save_picture("ada.png", "blue", size=(100, 100))
+        self.assertNotEqual(self.cache.generate(self.picture), first)
+
+    # Choosing a picture in the contact dialog makes its thumbnail on the worker
+    def test_choose_picture(self):
+        dialog, workers = self.dialog()
+        with mock.patch("contact_entry_dialog.filedialog.askopenfilename", return_value=self.picture):
+            dialog.choose_picture()
+        self.assertEqual(workers.jobs, [(self.picture,)])
+        dialog.picture_path_var.set.assert_called_with(self.picture)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, ".thumbnails", "sources")))
+
+    # A file which is not a picture, or a picture too large to decode safely, is ignored when chosen
+    def test_choose_unreadable_picture(self):
+        not_picture = os.path.join(self.directory, "notes.png")
+        with open(not_picture, "w", encoding="utf-8") as file:
+            file.write("not a picture")
+        bomb = self.save_picture("bomb.png", "green", size=(200, 200))
+        dialog, workers = self.dialog()
+        for picture_path in (not_picture, bomb, os.path.join(self.directory, "missing.png")):
+            with mock.patch("contact_entry_dialog.filedialog.askopenfilename", return_value=picture_path), \
+                    mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+                dialog.choose_picture()
+            dialog.picture_path_var.set.assert_called_with(picture_path)
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            self.assertRaises(Image.DecompressionBombError, self.cache.generate, bomb)
+        self.assertEqual(len(workers.jobs), 3)
+
+    # Return a contact dialog, without its window, whose thumbnails are made on an ImmediateWorker
+    def dialog(self):
+        from contact_entry_dialog import ContactEntryDialog
+        dialog = ContactEntryDialog.__new__(ContactEntryDialog)
+        workers = ImmediateWorker()
+        dialog.thumbnail_cache, dialog.workers = self.cache, workers
+        dialog.picture_path_var, dialog.picture_entry, dialog.lift = mock.Mock(), mock.Mock(), mock.Mock()
+        return dialog, workers
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+'''
+Brief Description of what this code does:
+This code tests UndoHistory: adding, editing and deleting a contact can
+be undone and redone, an import grouped into one command is undone in
+one step and comes back under the same ids, and Erase All is undone and
+redone without losing a contact. An undo or redo which the store refuses
+part way through leaves the store and the command as they were. After
+every step the store, its indexes and its undo and redo labels are
+checked.
+'''
+
+import unittest
+from unittest import mock
+from contact_store import ContactStore
+from undo_history import LABELS, UndoHistory
+from tests.sample_contacts import sample_rows
+
+
+# Class testing the undo history of a store
+class UndoHistoryTest(unittest.TestCase):
+    # Make a store holding the sample contacts, with an empty history
+    def setUp(self):
+        self.store = ContactStore()
+        self.store.add_many(sample_rows(200))
+        self.history = UndoHistory(self.store, depth=10)
+        self.store.query("smi")  # Build the trigram index, so undoing has to keep it up to date too
+
+    # Stop recording changes
+    def tearDown(self):
+        self.history.close()
+
+    # Return every contact of the store with its id, in display order
+    def contents(self):
+        return [(contact_id, self.store.values(contact_id)) for contact_id in self.store.ids()]
+
+    # Adding, editing and deleting are each undone and redone
+    def test_add_edit_delete(self):
+        store, history = self.store, self.history
+        states = [self.contents()]
+        contact_id = store.add(("Ada", "Lovelace", "", "07700 123456", "", "", ""))
+        states.append(self.contents())
+        store.update(contact_id, {"last_name": "King"})
+        states.append(self.contents())
+        store.delete(store.id_at(5))
+        states.append(self.contents())
+        self.assertEqual(history.undo_label(), LABELS["delete"])
+        for state in reversed(states[:-1]):
+            self.assertIsNotNone(history.undo())
+            self.assertEqual(self.contents(), state)
+        self.assertFalse(history.can_undo())
+        self.assertIsNone(history.undo())
+        self.assertEqual(store.query("lovelace"), [])
+        for state in states[1:]:
+            self.assertIsNotNone(history.redo())
+            self.assertEqual(self.contents(), state)
+        self.assertFalse(history.can_redo())
+        self.assertEqual(store.query("king"), [contact_id])
+        self.assertEqual(store.find_by_phone("07700123456"), [contact_id])
+
+    # A new change after an undo cannot be redone past
+    def test_new_change_clears_redo(self):
+        store, history = self.store, self.history
+        store.update(store.id_at(0), {"first_name": "Zed"})
+        history.undo()
+        self.assertTrue(history.can_redo())
+        store.update(store.id_at(1), {"first_name": "Yve"})
+        self.assertFalse(history.can_redo())
+
+    # Only the last depth commands are kept
+    def test_depth(self):
+        store, history = self.store, self.history
+        for number in range(15):
+            store.update(store.id_at(0), {"address": f"{number} Mill Road"})
+        undone = 0
+        while history.undo():
+            undone += 1
+        self.assertEqual(undone, 10)
+        self.assertEqual(store.values(store.id_at(0))[2], "4 Mill Road")
+
+    # An import grouped into one command, with edits and deletes made as part of it, is undone and redone in one step
+    def test_grouped_import(self):
+        store, history = self.store, self.history
+        before = self.contents()
+        with history.group("Import Contacts"):
+            added = store.next_id
+            store.add_many(sample_rows(100, seed=2))
+            store.update(added, {"first_name": "Merged"})
+            store.delete_many(store.ids(0, 40))
+        after = self.contents()
+        self.assertEqual(history.undo_label(), "Import Contacts")
+        self.assertEqual(history.undo(), "Import Contacts")
+        self.assertEqual(self.contents(), before)
+        self.assertEqual(store.query("merged"), [])
+        self.assertEqual(history.redo(), "Import Contacts")
+        self.assertEqual(self.contents(), after)
+        self.assertEqual(store.query("merged"), [added])
+
+    # Erase All is undone and redone, and contacts added after it are undone first
+    def test_erase_all(self):
+        store, history = self.store, self.history
+        before = self.contents()
+        store.clear()
+        store.add(("Ada", "Lovelace", "", "", "", "", ""))
+        self.assertEqual(history.undo(), LABELS["add"])
+        self.assertEqual(len(store), 0)
+        self.assertEqual(history.undo_label(), LABELS["clear"])
+        history.undo()
+        self.assertEqual(self.contents(), before)
+        self.assertEqual(store.query("smi"), [contact_id for contact_id, values in before if "smi" in " ".join(values[:6]).lower()])
+        history.redo()
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.query("smi"), [])
+        history.redo()
+        self.assertEqual(store.name(store.id_at(0)), "Ada Lovelace")
+        history.undo()
+        history.undo()
+        self.assertEqual(self.contents(), before)
+
+    # An undo or redo which fails part way through turns back what it had done and can be tried again
+    def test_failed_undo(self):
+        store, history = self.store, self.history
+        first, second = store.id_at(0), store.id_at(1)
+        before = self.contents()
+        with history.group("Rename"):
+            store.update(second, {"first_name": "Yve"})
+            store.update(first, {"first_name": "Zed"})
+        after = self.contents()
+        update = store.update
+
+        # Refuse any change to the second contact, as if it had been deleted by another copy of the book
+        def refuse_second(contact_id, values):
+            if contact_id == second:
+                raise KeyError(contact_id)
+            return update(contact_id, values)
+
+        with mock.patch.object(store, "update", refuse_second):
+            self.assertRaises(KeyError, history.undo)
+        self.assertEqual(self.contents(), after)
+        self.assertEqual(store.query("zed"), [first])
+        self.assertEqual(history.undo_label(), "Rename")
+        self.assertFalse(history.can_redo())
+        self.assertEqual(history.undo(), "Rename")
+        self.assertEqual(self.contents(), before)
+        with mock.patch.object(store, "update", refuse_second):
+            self.assertRaises(KeyError, history.redo)
+        self.assertEqual(self.contents(), before)
+        self.assertEqual(history.redo_label(), "Rename")
+        self.assertEqual(history.redo(), "Rename")
+        self.assertEqual(self.contents(), after)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+'''
+Brief Description of what this code does:
+This code defines the ThumbnailCache class, which saves the address book
+from decoding full-size photos every time a contact is viewed. It has
+two tiers: an in-memory LRU of decoded PhotoImages bounded by a byte
+budget, and an on-disk store of pre-scaled PNG thumbnails named by the
+SHA-256 of the source picture's bytes, so identical photos share one
+thumbnail. A small reference file per source path records the source's
+size and modification time, and any change to either invalidates the
+cached thumbnail. PIL is only imported when the first picture is
+decoded, so it does not slow down starting the app.
+'''
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from instrumentation import measure
+
+# Size which contact pictures are scaled down to
+THUMBNAIL_SIZE = (150, 150)
+
+
+# Function to describe a picture file by size and modification time
+def source_signature(picture_path):
+    stat = os.stat(picture_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# Class caching scaled contact pictures in memory and on disk
+class ThumbnailCache:
+    # Initialise the cache with its directory, thumbnail size and in-memory byte budget
+    def __init__(self, cache_dir=".thumbnails", size=THUMBNAIL_SIZE, memory_budget=32 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.size = tuple(size)
+        self.memory_budget = memory_budget
+        self._photos = OrderedDict()  # Source path -> (signature, PhotoImage, bytes), least recently used first
+        self._memory_used = 0
+
+    # Return a PhotoImage of a picture's thumbnail, from memory if possible; must be called on the Tk thread
+    def photo(self, picture_path):
+        cached = self.cached(picture_path)
+        if cached is not None:
+            return cached
+        return self.remember(picture_path, self.load(picture_path))
+
+    # Return the PhotoImage held in memory for a picture if it is still up to date, otherwise None; must be called on the Tk thread
+    def cached(self, picture_path):
+        key = os.path.abspath(picture_path)
+        cached = self._photos.get(key)
+        try:
+            if cached is None or cached[0] != source_signature(key):
+                return None
+        except OSError:
+            return None
+        self._photos.move_to_end(key)
+        return cached[1]
+
+    # Turn a decoded thumbnail into a PhotoImage kept in the memory tier; must be called on the Tk thread
+    def remember(self, picture_path, image, signature=None):
+        from PIL import ImageTk
+        key = os.path.abspath(picture_path)
+        photo = ImageTk.PhotoImage(image)
+        cost = image.width * image.height * 4
+        self._forget(key)
+        self._photos[key] = (signature or source_signature(key), photo, cost)
+        self._memory_used += cost
+        # Evict the least recently used pictures until the budget is met again
+        while self._memory_used > self.memory_budget and len(self._photos) > 1:
+            self._forget(next(iter(self._photos)))
+        return photo
+
+    # Return a picture's thumbnail as a PIL image, from the disk tier or by generating it; safe to call from any thread
+    def load(self, picture_path):
+        from PIL import Image
+        with measure("image_decode"):
+            thumbnail_path = self.generate(picture_path)
+            with Image.open(thumbnail_path) as image:
+                image.load()
+                return image
+
+    # Make sure a picture has an up-to-date thumbnail on disk and return the thumbnail's path
+    def generate(self, picture_path):
+        key = os.path.abspath(picture_path)
+        signature = source_signature(key)
+        reference_path = self._reference_path(key)
+        try:
+            with open(reference_path, "r", encoding="utf-8") as file:
+                reference = json.load(file)
+            if reference["source"] == signature and os.path.exists(self._thumbnail_path(reference["digest"])):
+                return self._thumbnail_path(reference["digest"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        # Missing or stale: hash the source bytes, and only scale the picture if no identical picture was cached before
+        with open(key, "rb") as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        thumbnail_path = self._thumbnail_path(digest)
+        if not os.path.exists(thumbnail_path):
+            from PIL import Image
+            with Image.open(key) as picture:
+                picture.thumbnail(self.size)
+                if picture.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+                    picture = picture.convert("RGBA")
+                self._write_atomically(thumbnail_path, lambda temp_path: picture.save(temp_path, "PNG"))
+        self._write_atomically(reference_path, lambda temp_path: self._write_reference(temp_path, signature, digest))
+        return thumbnail_path
+
+    # Drop every picture from the memory tier
+    def clear_memory(self):
+        self._photos.clear()
+        self._memory_used = 0
+
+    # Remove one picture from the memory tier
+    def _forget(self, key):
+        cached = self._photos.pop(key, None)
+        if cached is not None:
+            self._memory_used -= cached[2]
+
+    # Path of the thumbnail with a given content digest, spread over subdirectories by its first two characters
+    def _thumbnail_path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.png")
+
+    # Path of the reference file recording which thumbnail belongs to a source path
+    def _reference_path(self, source_path):
+        name = hashlib.sha1(source_path.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "sources", f"{name}.json")
+
+    # Write a reference file
+    def _write_reference(self, file_path, signature, digest):
+        with open(file_path, "w", encoding="utf-8") as file:
+            json.dump({"source": signature, "digest": digest}, file)
+
+    # Write a file through a temporary name, so readers never see it half written
+    def _write_atomically(self, file_path, write):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        write(temp_path)
+        os.replace(temp_path, file_path)
@@ -0,0 +1,211 @@
+'''
+Brief Description of what this code does:
+This code defines the UndoHistory class, which gives the address book
+Undo and Redo. It listens to the contact store and records every change
+as a small command rather than as a copy of the address book: an edit
+keeps only the fields which changed, an add keeps only the new contact
+ids, and a delete keeps the deleted contact. Erase All keeps the
+contacts and indexes which the store swapped out, so undoing it is as
+quick as undoing a single edit however large the address book is.
+Changes made together (merging duplicates, importing a file) can be
+grouped so that one Undo reverses all of them. Groups belong to the
+thread which opened them, so changes made meanwhile on other threads,
+such as a background sync, are never folded into them. Only the last few
+commands are kept, so the history cannot grow without limit.
+'''
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from Contact import FIELDS
+
+# Commands kept for Undo unless another depth is given
+DEFAULT_DEPTH = 100
+
+# Names shown for a command made of a single change
+LABELS = {
+    "add": "Add Contact",
+    "update": "Edit Contact",
+    "delete": "Delete Contact",
+    "clear": "Erase All Entries",
+}
+
+
+# Class holding one recorded change: the contacts it touched and just enough data to reverse and repeat it
+class Change:
+    __slots__ = ("action", "contact_ids", "data")
+
+    # Initialise a change; data is the changed fields of an update, the values of deleted contacts, or the state removed by a clear
+    def __init__(self, action, contact_ids, data):
+        self.action = action
+        self.contact_ids = contact_ids
+        self.data = data
+
+
+# Class holding the changes undone or redone together by one Undo or Redo
+class Command:
+    __slots__ = ("label", "changes")
+
+    # Initialise an empty command
+    def __init__(self, label):
+        self.label = label
+        self.changes = []
+
+
+# Class recording the changes made to a contact store so they can be undone and redone
+class UndoHistory:
+    # Initialise the history of a store, keeping at most depth commands
+    def __init__(self, store, depth=DEFAULT_DEPTH):
+        self.store = store
+        self.depth = depth
+        self._undo = deque(maxlen=depth)  # Oldest commands fall off the end
+        self._redo = []
+        # Per thread: the command collecting the changes of an open group, and how deeply groups are nested
+        self._local = threading.local()
+        self._applying = False  # True while undoing or redoing, whose own changes are not recorded
+        store.subscribe(self.record)
+
+    # Stop recording changes
+    def close(self):
+        self.store.unsubscribe(self.record)
+
+    # Check whether there is a command to undo
+    def can_undo(self):
+        return bool(self._undo)
+
+    # Check whether there is a command to redo
+    def can_redo(self):
+        return bool(self._redo)
+
+    # Return the name of the command Undo would reverse, or None
+    def undo_label(self):
+        return self._undo[-1].label if self._undo else None
+
+    # Return the name of the command Redo would repeat, or None
+    def redo_label(self):
+        return self._redo[-1].label if self._redo else None
+
+    # Forget every command
+    def reset(self):
+        with self.store.lock:
+            self._undo.clear()
+            self._redo.clear()
+
+    # Context manager recording every change the current thread makes inside it as one command, e.g.
+    # "with history.group('Import Contacts'):"; groups opened inside another group are part of the outer one
+    @contextmanager
+    def group(self, label):
+        local = self._local
+        if getattr(local, "depth", 0) == 0:
+            local.group = Command(label)
+            local.depth = 0
+        local.depth += 1
+        try:
+            yield
+        finally:
+            local.depth -= 1
+            if not local.depth:
+                command, local.group = local.group, None
+                if command.changes:
+                    with self.store.lock:
+                        self._push(command)
+
+    # Store listener recording one change; it is called with the store's lock held
+    def record(self, action, contact_id, old_values, new_values):
+        if self._applying or action not in LABELS:
+            return
+        group = getattr(self._local, "group", None)
+        command = group
+        if command is None:
+            command = Command(LABELS[action])
+        last = command.changes[-1] if command.changes else None
+        if action == "update":
+            # Keep only the fields which changed: position -> (old value, new value)
+            diff = {position: (old, new) for position, (old, new) in enumerate(zip(old_values, new_values)) if old != new}
+            if not diff:
+                return
+            change = Change(action, [contact_id], diff)
+        elif action == "add":
+            if last is not None and last.action == "add":
+                last.contact_ids.append(contact_id)  # A run of adds, e.g. an import, is kept as a single list of ids
+                change = None
+            else:
+                change = Change(action, [contact_id], None)
+        elif action == "delete":
+            if last is not None and last.action == "delete":
+                last.contact_ids.append(contact_id)
+                last.data.append(old_values)
+                change = None
+            else:
+                change = Change(action, [contact_id], [old_values])
+        else:
+            change = Change(action, None, old_values)  # The contacts and indexes swapped out by the clear
+        if change is not None:
+            command.changes.append(change)
+        if command is not group:
+            self._push(command)
+        elif self._redo:
+            self._redo.clear()
+
+    # Reverse the last command and return its name, or None if there is nothing to undo. If the store refuses one of
+    # its changes, the error is raised with the store as it was and the command still waiting to be undone.
+    def undo(self):
+        with self.store.lock:
+            if not self._undo:
+                return None
+            command = self._undo[-1]
+            self._apply(command.changes[::-1], undo=True)
+            self._redo.append(self._undo.pop())
+            return command.label
+
+    # Repeat the last undone command and return its name, or None if there is nothing to redo; a failure leaves the
+    # store and the command as they were, as for undo
+    def redo(self):
+        with self.store.lock:
+            if not self._redo:
+                return None
+            command = self._redo[-1]
+            self._apply(command.changes, undo=False)
+            self._undo.append(self._redo.pop())
+            return command.label
+
+    # Add a newly recorded command; a new change makes the undone commands impossible to redo
+    def _push(self, command):
+        self._undo.append(command)
+        self._redo.clear()
+
+    # Reverse (undo=True) or repeat changes on the store without recording them; if one fails, those already made
+    # are turned back before the error is raised
+    def _apply(self, changes, undo):
+        self._applying = True
+        applied = []
+        try:
+            for change in changes:
+                self._apply_change(change, undo)
+                applied.append(change)
+        except Exception:
+            for change in reversed(applied):
+                self._apply_change(change, not undo)
+            raise
+        finally:
+            self._applying = False
+
+    # Reverse (undo=True) or repeat one change on the store
+    def _apply_change(self, change, undo):
+        store = self.store
+        action = change.action
+        if action == "update":
+            side = 0 if undo else 1
+            store.update(change.contact_ids[0], {FIELDS[position]: values[side] for position, values in change.data.items()})
+        elif action == "clear":
+            if undo:
+                store.restore(change.data)
+            else:
+                change.data = store.clear()
+        elif (action == "add") == undo:
+            # Undoing an add or repeating a delete: keep the values so the contacts can be put back with the same ids
+            change.data = store.delete_many(change.contact_ids)
+        else:
+            store.add_many(change.data, change.contact_ids)
+            if action == "add":
+                change.data = None
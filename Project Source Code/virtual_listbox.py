@@ -0,0 +1,191 @@
+'''
+Brief Description of what this code does:
+This code defines the VirtualListbox widget, a drop-in replacement for
+the tk.Listbox used to show contacts. Instead of holding one Tk item per
+contact it only materialises the rows currently visible, asking a data
+source for the row count and the text of a slice of rows. Insertions,
+deletions and updates of single rows are applied as incremental diffs,
+so scrolling and editing stay fast even with a million contacts.
+'''
+
+import tkinter as tk
+from instrumentation import measure
+
+
+# Scrollable list which only creates the visible rows of a large data source
+class VirtualListbox(tk.Frame):
+    # Initialise the widget; row_count() returns the number of rows and row_text(start, stop) the text of a slice of rows
+    def __init__(self, master, row_count, row_text, width=25, height=20):
+        super().__init__(master)
+        self.row_count = row_count
+        self.row_text = row_text
+        self._top = 0  # Index of the first visible row
+        self._visible = height  # Number of rows which fit in the listbox
+        self._total = 0
+        self._selected = None  # Absolute index of the selected row
+
+        self.listbox = tk.Listbox(self, width=width, height=height, exportselection=False)
+        self.listbox.pack(side="left", fill="both", expand=True)
+
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="left", fill="y")
+
+        # Replace the listbox's own scrolling and keyboard navigation with row based versions
+        self.listbox.bind("<<ListboxSelect>>", self._on_select)
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-1))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(1))
+        self.listbox.bind("<Up>", lambda event: self._move_selection(-1))
+        self.listbox.bind("<Down>", lambda event: self._move_selection(1))
+        self.listbox.bind("<Prior>", lambda event: self._move_selection(-self._visible))
+        self.listbox.bind("<Next>", lambda event: self._move_selection(self._visible))
+        self.listbox.bind("<Home>", lambda event: self._move_selection(-self._total))
+        self.listbox.bind("<End>", lambda event: self._move_selection(self._total))
+        self.listbox.bind("<Configure>", self._on_resize)
+
+        self.refresh()
+
+    # Bind an event on the inner listbox, so callers can bind e.g. double clicks as on a tk.Listbox
+    def bind(self, sequence=None, func=None, add=None):
+        return self.listbox.bind(sequence, func, add)
+
+    # Return a tuple holding the absolute index of the selected row, or an empty tuple
+    def curselection(self):
+        return () if self._selected is None else (self._selected,)
+
+    # Select a row by absolute index and scroll it into view
+    def selection_set(self, index):
+        self._selected = index
+        self.see(index)
+
+    # Clear the selection
+    def selection_clear(self):
+        self._selected = None
+        self.listbox.selection_clear(0, tk.END)
+
+    # Scroll so the row at an absolute index is visible
+    def see(self, index):
+        if index < self._top:
+            self._top = index
+        elif index >= self._top + self._visible:
+            self._top = index - self._visible + 1
+        self.refresh()
+
+    # Select a row by absolute index and scroll it to the top of the view, e.g. to jump to the first name starting with a letter
+    def jump_to(self, index):
+        self._selected = index
+        self._top = index
+        self.refresh()
+
+    # Scroll by a number of rows
+    def scroll(self, rows):
+        self._top += rows
+        self.refresh()
+        return "break"
+
+    # Re-read the row count and redraw the visible rows
+    def refresh(self):
+        self._total = self.row_count()
+        self._top = max(0, min(self._top, self._total - self._visible))
+        if self._selected is not None and self._selected >= self._total:
+            self._selected = None
+        self._redraw()
+
+    # Apply a row inserted at an absolute index
+    def insert_row(self, index):
+        if self._selected is not None and self._selected >= index:
+            self._selected += 1
+        if index < self._top:
+            # Keep the same rows on screen when something is inserted above them
+            self._top += 1
+            self._total += 1
+            self._update_scrollbar()
+        else:
+            self.refresh()
+
+    # Apply a row deleted at an absolute index
+    def delete_row(self, index):
+        if self._selected == index:
+            self._selected = None
+        elif self._selected is not None and self._selected > index:
+            self._selected -= 1
+        if index < self._top:
+            self._top -= 1
+            self._total -= 1
+            self._update_scrollbar()
+        else:
+            self.refresh()
+
+    # Apply a change to the text of the row at an absolute index
+    def update_row(self, index):
+        if self._top <= index < self._top + self._visible:
+            offset = index - self._top
+            self.listbox.delete(offset)
+            self.listbox.insert(offset, *self.row_text(index, index + 1))
+            if self._selected == index:
+                self.listbox.selection_set(offset)
+
+    # Apply a row moved from one absolute index to another, e.g. after its sort key was edited
+    def move_row(self, old_index, new_index):
+        if old_index == new_index:
+            self.update_row(new_index)
+            return
+        selected = self._selected == old_index
+        self.delete_row(old_index)
+        self.insert_row(new_index)
+        if selected:
+            self.selection_set(new_index)
+
+    # Replace the listbox items with the rows currently in view
+    def _redraw(self):
+        with measure("listbox_redraw"):
+            self._draw_rows()
+
+    # Put the text of the rows in view into the listbox
+    def _draw_rows(self):
+        self.listbox.delete(0, tk.END)
+        rows = self.row_text(self._top, min(self._top + self._visible, self._total))
+        if rows:
+            self.listbox.insert(0, *rows)
+        if self._selected is not None and self._top <= self._selected < self._top + self._visible:
+            self.listbox.selection_set(self._selected - self._top)
+            self.listbox.activate(self._selected - self._top)
+        self._update_scrollbar()
+
+    # Size the scrollbar slider to the visible part of the whole data source
+    def _update_scrollbar(self):
+        if self._total <= self._visible:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self._top / self._total, (self._top + self._visible) / self._total)
+
+    # Handle dragging the slider or clicking the scrollbar arrows and trough
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._top = int(float(amount) * self._total)
+            self.refresh()
+        elif action == "scroll":
+            self.scroll(int(amount) * (self._visible if unit == "pages" else 1))
+
+    # Remember the absolute index of a row clicked in the listbox
+    def _on_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self._selected = self._top + selection[0]
+
+    # Move the selection with the keyboard, scrolling when it leaves the view
+    def _move_selection(self, rows):
+        if self._total:
+            current = self._top if self._selected is None else self._selected
+            self.selection_set(max(0, min(current + rows, self._total - 1)))
+            self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    # Show more or fewer rows when the widget is resized
+    def _on_resize(self, event):
+        row_height = self.listbox.bbox(0)[3] + 1 if self.listbox.size() else 0
+        if row_height:
+            visible = max(1, event.height // row_height)
+            if visible != self._visible:
+                self._visible = visible
+                self.refresh()